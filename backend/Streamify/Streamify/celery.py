@@ -1,6 +1,7 @@
 
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Streamify.settings')
@@ -16,6 +17,20 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+@worker_init.connect
+def preload_whisper_models(**kwargs):
+    """Optionally load Whisper in the parent so prefork children share its pages"""
+    from django.conf import settings
+    from video import whisper_models
+    if settings.WHISPER_PRELOAD_IN_PARENT:
+        whisper_models.warm()
+
+@worker_process_init.connect
+def warm_whisper_models(**kwargs):
+    """Load Whisper once per worker process instead of once per task"""
+    from video import whisper_models
+    whisper_models.warm()
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
@@ -0,0 +1,39 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def weak_etag(*parts):
+    """Weak validator for a response identified by ``parts`` (versions, ids, digests)"""
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def respond_conditionally(request, etag, last_modified, render):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 from validators computed
+    up front, calling ``render()`` only when the client's copy is stale.
+
+    ``last_modified`` is a Unix timestamp or None. Successful responses carry
+    the validators and must be revalidated before reuse; they vary with the
+    Authorization header because they include per-user fields. ``render()``
+    sets its own ETag and Last-Modified when it sends an older copy than the
+    validators describe.
+    """
+    if last_modified is not None:
+        last_modified = int(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render()
+    if response.status_code not in (200, 304):
+        return response
+
+    if not response.has_header('ETag'):
+        response['ETag'] = etag
+    if last_modified is not None and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(last_modified)
+    scope = 'private' if request.user.is_authenticated else 'public'
+    response['Cache-Control'] = f'{scope}, no-cache'
+    patch_vary_headers(response, ('Authorization',))
+    return response
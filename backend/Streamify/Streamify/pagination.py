@@ -0,0 +1,199 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(data):
+    """Opaque, URL-safe cursor for a small dict"""
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError):
+        raise NotFound('Invalid cursor')
+
+
+class CursorPageMixin:
+    """Page size handling and the {next, previous, results} envelope"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'API_PAGE_SIZE', 20)
+        if self.page_size_query_param in request.query_params:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except ValueError:
+                pass
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_cursor(self, request):
+        value = request.query_params.get(self.cursor_query_param)
+        if not value:
+            return None
+        cursor = decode_cursor(value)
+        if not isinstance(cursor, dict):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(cursor))
+
+    def first_page_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.next_link),
+            ('previous', self.previous_link),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetPagination(CursorPageMixin, BasePagination):
+    """
+    Cursor pagination on (created_at, id), newest first by default.
+
+    Each page is fetched with a WHERE on the last row seen instead of an
+    OFFSET, so deep pages cost the same as the first one when an index ends
+    in (created_at, id). Views may set ``keyset_ordering`` to
+    ('created_at', 'id') for oldest first.
+    """
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = getattr(view, 'keyset_ordering', self.ordering)
+        descending = ordering[0].startswith('-')
+
+        cursor = self.get_cursor(request)
+        backwards = bool(cursor and cursor.get('r'))
+        if cursor is not None:
+            created_at = parse_datetime(str(cursor.get('t', '')))
+            if created_at is None or not isinstance(cursor.get('i'), int):
+                raise NotFound(self.invalid_cursor_message)
+            # Rows after the cursor in the requested direction
+            after = descending != backwards
+            lookup = 'lt' if after else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'created_at__{lookup}': created_at})
+                | Q(created_at=created_at, **{f'id__{lookup}': cursor['i']})
+            )
+
+        if backwards:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        self.next_link = self.previous_link = None
+        if rows:
+            if has_more or backwards:
+                self.next_link = self.link(self.position(rows[-1], reverse=False))
+            if cursor is not None and (has_more or not backwards):
+                self.previous_link = self.link(self.position(rows[0], reverse=True))
+        elif backwards:
+            self.next_link = self.first_page_link()
+        return rows
+
+    def position(self, row, reverse):
+        cursor = {'t': row.created_at.isoformat(), 'i': row.id}
+        if reverse:
+            cursor['r'] = 1
+        return cursor
+
+
+class RankedPagination(CursorPageMixin, BasePagination):
+    """
+    Cursor pagination for relevance-ranked results.
+
+    Search results are a bounded, cached list of ids, so the cursor simply
+    carries the position in that ranking.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.get_cursor(request) or {}
+        start = cursor.get('o', 0)
+        if not isinstance(start, int) or start < 0:
+            raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[start:start + self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        self.next_link = self.link({'o': start + self.page_size}) if has_more else None
+        if start <= 0:
+            self.previous_link = None
+        elif start - self.page_size <= 0:
+            self.previous_link = self.first_page_link()
+        else:
+            self.previous_link = self.link({'o': start - self.page_size})
+        return rows
+
+
+class PathPagination(CursorPageMixin, BasePagination):
+    """
+    Cursor pagination in materialized-path order, i.e. a comment thread
+    depth-first. The cursor is the path of the last row seen, so each page is
+    one range scan of the path index.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.get_cursor(request)
+        backwards = bool(cursor and cursor.get('r'))
+        if cursor is not None:
+            if not isinstance(cursor.get('p'), str):
+                raise NotFound(self.invalid_cursor_message)
+            lookup = 'lt' if backwards else 'gt'
+            queryset = queryset.filter(**{f'path__{lookup}': cursor['p']})
+
+        rows = list(queryset.order_by('-path' if backwards else 'path')[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        self.next_link = self.previous_link = None
+        if rows:
+            if has_more or backwards:
+                self.next_link = self.link({'p': rows[-1].path})
+            if cursor is not None and (has_more or not backwards):
+                self.previous_link = self.link({'p': rows[0].path, 'r': 1})
+        elif backwards:
+            self.next_link = self.first_page_link()
+        return rows
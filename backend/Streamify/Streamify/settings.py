@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
+from datetime import timedelta
 from pathlib import Path
 import environ
 
@@ -160,6 +162,38 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024   # 50MB
 FILE_UPLOAD_PERMISSIONS = 0o644
 
+# Resumable uploads that receive no chunk for this long are deleted by
+# video.tasks.expire_upload_sessions_task
+VIDEO_UPLOAD_SESSION_TTL = timedelta(hours=24)
+
+# Video streaming
+# 'sendfile' serves ranges from Django and lets the WSGI server use os.sendfile;
+# 'x-accel-redirect' hands the file to nginx through an internal location that
+# maps VIDEO_STREAM_ACCEL_PREFIX onto MEDIA_ROOT.
+VIDEO_STREAM_BACKEND = env('VIDEO_STREAM_BACKEND', default='sendfile')
+VIDEO_STREAM_ACCEL_PREFIX = '/protected-media/'
+# Media elements can't send an Authorization header, so URLs of private
+# videos carry a signed token that is valid for this many seconds
+VIDEO_STREAM_TOKEN_MAX_AGE = 6 * 3600
+
+# HLS rendition ladder built by video.tasks.generate_hls_task. Rungs taller than
+# the source are skipped; the 'source' rung keeps the original resolution and
+# copies the streams when they are already H.264/AAC.
+VIDEO_HLS_LADDER = [
+    {'name': '240p', 'height': 240, 'video_bitrate': 400, 'audio_bitrate': 64},
+    {'name': '480p', 'height': 480, 'video_bitrate': 1200, 'audio_bitrate': 96},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2800, 'audio_bitrate': 128},
+    {'name': 'source', 'height': None, 'video_bitrate': None, 'audio_bitrate': 128},
+]  # bitrates in kbit/s
+VIDEO_HLS_SEGMENT_SECONDS = 6
+
+# Trickplay sprite sheets built by video.tasks.generate_trickplay_task
+VIDEO_TRICKPLAY_INTERVAL = 5  # seconds between sampled frames
+VIDEO_TRICKPLAY_TILE_WIDTH = 160
+VIDEO_TRICKPLAY_COLUMNS = 10
+VIDEO_TRICKPLAY_ROWS = 10
+VIDEO_TRICKPLAY_FORMAT = 'jpg'  # or 'webp'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -185,8 +219,6 @@ REST_FRAMEWORK = {
 }
 
 # JWT Settings
-from datetime import timedelta
-
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -210,3 +242,74 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+
+# Whisper models are cached per worker process (see video.whisper_models)
+WHISPER_MODEL = 'base'
+WHISPER_DEVICE = env('WHISPER_DEVICE', default='auto')  # 'auto', 'cpu' or 'cuda'
+WHISPER_PRECISION = 'auto'  # 'auto' uses fp16 on GPU and fp32 on CPU
+WHISPER_MODEL_CACHE_SIZE = 2
+WHISPER_PRELOAD_MODELS = ['base']
+# Load the models in the prefork parent so children share them copy-on-write.
+# Only useful on CPU: CUDA state does not survive fork.
+WHISPER_PRELOAD_IN_PARENT = env.bool('WHISPER_PRELOAD_IN_PARENT', default=False)
+# Waveform peaks: one min/max pair per this many 16 kHz samples (10 per second)
+VIDEO_WAVEFORM_SAMPLES_PER_PIXEL = 1600
+# Videos at least this long (seconds) are transcribed in overlapping windows,
+# one Celery task each, instead of in one pass. None disables chunking.
+WHISPER_CHUNKED_MIN_DURATION = 600
+WHISPER_CHUNK_SECONDS = 300
+WHISPER_CHUNK_OVERLAP_SECONDS = 5
+# Keep Whisper's token ids (packed and compressed) alongside transcript segments
+TRANSCRIPT_STORE_TOKENS = False
+# Default page size of the cursor-paginated list endpoints (?page_size= overrides, up to 100)
+API_PAGE_SIZE = 20
+# Video views are buffered here (e.g. the broker's Redis) and written in batches by
+# flush_video_views_task. Unset keeps them in process memory, which only suits tests
+# and single-process development; the test runner always does.
+VIDEO_VIEW_BUFFER_URL = env('VIDEO_VIEW_BUFFER_URL', default='')
+# Repeat views by the same user and address within this window are not counted again
+VIDEO_VIEW_DEDUPE_SECONDS = 24 * 3600
+# 'exact' keeps a VideoView row per (user, video, address). 'sketch' keeps no rows:
+# a rotating Bloom filter per video skips viewers counted in the last one to two
+# dedupe windows, and daily HyperLogLog sketches estimate unique viewers.
+VIDEO_VIEW_TRACKING = env('VIDEO_VIEW_TRACKING', default='exact')
+# Viewers per dedupe window each video's Bloom filter is sized for (1% false positives)
+VIDEO_VIEW_FILTER_CAPACITY = 10000
+# Like/dislike increments for one video or comment are spread over this many counter rows
+ENGAGEMENT_COUNTER_SHARDS = 16
+# Seconds a video list page is served from the cache. Uploads, status changes and
+# deletes drop it at once; views and likes in it may lag by this much.
+VIDEO_LIST_CACHE_TIMEOUT = 30
+# Video detail and stats are cached under per-video versions bumped by reactions,
+# view flushes, comments and edits; this only bounds how long an entry lives.
+VIDEO_DETAIL_CACHE_TIMEOUT = 300
+# How long a request waits for another one recomputing the same entry
+VIDEO_CACHE_WAIT_SECONDS = 2
+# Cached pages and the versions invalidating them are shared by every web and Celery
+# process, so they live in Redis. Tests keep a per-process cache and view buffer.
+CACHE_URL = env('CACHE_URL', default=CELERY_BROKER_URL)
+if 'test' in sys.argv[1:2]:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    VIDEO_VIEW_BUFFER_URL = ''
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'streamify',
+        }
+    }
+CELERY_BEAT_SCHEDULE = {
+    'expire-upload-sessions': {
+        'task': 'video.tasks.expire_upload_sessions_task',
+        'schedule': timedelta(hours=1),
+    },
+    'flush-video-views': {
+        'task': 'video.tasks.flush_video_views_task',
+        'schedule': timedelta(seconds=10),
+    },
+    'compact-engagement-counters': {
+        'task': 'video.tasks.compact_engagement_counters_task',
+        'schedule': timedelta(seconds=30),
+    },
+}
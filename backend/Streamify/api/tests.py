@@ -1,3 +1,57 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
\ No newline at end of file
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import Users
+from video.models import Video
+from video.search import MAX_RESULTS, rank_transcripts
+from video.transcripts import save_transcript
+
+
+class VideoSearchViewTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.uploader = Users.objects.create(username='owner', email='owner@example.com', password='x')
+
+    def transcribed(self, text, **fields):
+        video = Video.objects.create(
+            title='clip', video_file='videos/clip.mp4', uploader=self.uploader,
+            processing_status='ready', **fields
+        )
+        save_transcript(Video.objects.filter(pk=video.pk), {
+            'language': 'en', 'text': text, 'segments': [{'start': 0.0, 'end': 2.0, 'text': text}],
+        })
+        return video
+
+    def test_results_page_through_every_match(self):
+        videos = [self.transcribed(f'neural networks part {i}' + ' networks' * i) for i in range(5)]
+        self.transcribed('neural networks, but private', visibility='private')
+
+        url = reverse('video-search') + '?q=networks&page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [(item['id'], item['matches'][0]['start']) for item in response.data['results']]
+            url = response.data['next']
+
+        # More repetitions of the term score higher
+        self.assertEqual(seen, [(video.id, 0.0) for video in reversed(videos)])
+
+    def test_ranking_is_not_capped_at_one_page(self):
+        self.assertGreater(MAX_RESULTS, 20)
+        for _ in range(25):
+            self.transcribed('compilers')
+        self.assertEqual(len(rank_transcripts('compilers')), 25)
+
+    def test_more_distinct_terms_rank_first(self):
+        both = self.transcribed('graph theory')
+        repeated = self.transcribed('graph graph graph graph')
+        results = rank_transcripts('graph theory')
+        self.assertEqual([r['video_id'] for r in results], [both.id, repeated.id])
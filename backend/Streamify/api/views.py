@@ -1,4 +1,5 @@
 from django.db import IntegrityError
+from django.db.models import F
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
@@ -9,24 +10,44 @@ from rest_framework.exceptions import ValidationError
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import check_password, make_password
 from video.models import Video
-from video.serializers import VideoSerializer
+from Streamify.pagination import RankedPagination
+from video import counters
+from video.search import rank_transcripts, transcript_matches
+from video.serializers import VideoSearchResultSerializer
 
 class VideoSearchView(generics.ListAPIView):
     """ 
     A view for searching videos based on transcript content.
+    Results are ranked and carry the timestamps of the matching segments.
     """
-    serializer_class = VideoSerializer
+    serializer_class = VideoSearchResultSerializer
+    pagination_class = RankedPagination
 
     def get_queryset(self):
+        """The ranking alone; videos and matching segments are loaded per page"""
         query = self.request.query_params.get('q', None)
-        if query:
-            # Search for videos where the 'text' key in the 'transcript' JSON field contains the query
-            return Video.objects.filter(
-                processing_status='ready',
-                visibility='public',
-                transcript__text__icontains=query
-            )
-        return Video.objects.none() # Return no results if no query
+        if not query:
+            return []
+
+        return rank_transcripts(
+            query, Video.objects.filter(processing_status='ready', visibility='public')
+        )
+
+    def paginate_queryset(self, queryset):
+        results = super().paginate_queryset(queryset)
+        video_ids = [result['video_id'] for result in results]
+        videos = counters.with_totals(Video.objects.select_related('uploader', 'metadata'), 'video').annotate(
+            transcript_version=F('transcript__version')
+        ).in_bulk(video_ids)
+        matches = transcript_matches(self.request.query_params.get('q', ''), video_ids)
+        ranked = []
+        for result in results:
+            video = videos.get(result['video_id'])
+            if video is not None:
+                video.search_score = result['score']
+                video.search_matches = matches.get(result['video_id'], [])
+                ranked.append(video)
+        return ranked
 
 class UserView(generics.ListCreateAPIView):
     queryset = Users.objects.all()
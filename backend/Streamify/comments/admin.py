@@ -1,4 +1,7 @@
 from django.contrib import admin
 
 from .models import Comment
-admin.site.register(Comment) # Register your models here.
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ['user', 'video', 'likes', 'replies_count', 'created_at']
+    readonly_fields = ['likes', 'replies_count', 'created_at', 'updated_at']
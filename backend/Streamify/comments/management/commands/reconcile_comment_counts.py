@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from comments.models import Comment
+from video.models import Video
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Video.comments_count and Comment.replies_count where they have drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted rows without fixing them.')
+
+    def handle(self, *args, **options):
+        targets = [
+            (Video, 'comments_count', 'video'),
+            (Comment, 'replies_count', 'parent'),
+        ]
+        for model, counter, field in targets:
+            # One grouped query for the real counts; MySQL can't UPDATE a
+            # table from a subquery on that same table
+            actual = dict(
+                Comment.objects.exclude(**{field: None})
+                .order_by().values(field).annotate(n=Count('pk'))
+                .values_list(field, 'n')
+            )
+
+            drifted = []
+            fixed = 0
+            for obj in model.objects.only('pk', counter).iterator(chunk_size=BATCH_SIZE):
+                count = actual.get(obj.pk, 0)
+                if getattr(obj, counter) != count:
+                    setattr(obj, counter, count)
+                    drifted.append(obj)
+                if len(drifted) >= BATCH_SIZE:
+                    fixed += self.save(model, counter, drifted, options['dry_run'])
+                    drifted = []
+            fixed += self.save(model, counter, drifted, options['dry_run'])
+
+            if options['dry_run']:
+                self.stdout.write(f'{model.__name__}.{counter}: {fixed} rows have drifted.')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{model.__name__}.{counter}: fixed {fixed} rows.'))
+
+    def save(self, model, counter, objs, dry_run):
+        if objs and not dry_run:
+            model.objects.bulk_update(objs, [counter])
+        return len(objs)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counts(apps, schema_editor):
+    Comment = apps.get_model('comments', 'Comment')
+    Video = apps.get_model('video', 'Video')
+
+    for model, counter, field in ((Video, 'comments_count', 'video'), (Comment, 'replies_count', 'parent')):
+        counts = (
+            Comment.objects.exclude(**{field: None})
+            .order_by().values(field).annotate(n=Count('pk'))
+            .values_list(field, 'n')
+        )
+        for pk, n in counts.iterator():
+            model.objects.filter(pk=pk).update(**{counter: n})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0001_initial'),
+        ('video', '0013_video_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:39
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Comment = apps.get_model('comments', 'Comment')
+
+    # A reply is always created after its parent, so parents come first by id
+    paths = {}
+    batch = []
+    for comment in Comment.objects.order_by('pk').only('pk', 'parent_id').iterator():
+        parent_path, parent_depth = paths.get(comment.parent_id, ('', -1))
+        comment.path = parent_path + f'{comment.pk:010d}/'
+        comment.depth = parent_depth + 1
+        paths[comment.pk] = (comment.path, comment.depth)
+        batch.append(comment)
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['path', 'depth'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['path', 'depth'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_comment_thread_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
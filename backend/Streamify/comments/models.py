@@ -1,29 +1,57 @@
-from django.db import models
+from django.db import models, transaction
 from accounts.models import Users
 from video.models import Video
 
+# A thread path is the zero-padded ids of a comment's ancestors and its own id,
+# so sorting by path lists a thread depth-first in posting order.
+PATH_STEP = 11
+PATH_MAX_LENGTH = 255
+MAX_THREAD_DEPTH = PATH_MAX_LENGTH // PATH_STEP - 1
+
+def path_segment(comment_id):
+    return f'{comment_id:010d}/'
+
 class Comment(models.Model):
     user = models.ForeignKey(Users, on_delete=models.CASCADE, related_name='comments')
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='comments')
     content = models.TextField()
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     likes = models.PositiveIntegerField(default=0)
+    replies_count = models.PositiveIntegerField(default=0)  # maintained by comments.signals
+    path = models.CharField(max_length=PATH_MAX_LENGTH, db_index=True, blank=True, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a video's top-level comments and of replies
+            models.Index(fields=['video', 'parent', 'created_at', 'id'], name='comment_thread_idx'),
+            models.Index(fields=['parent', 'created_at', 'id'], name='comment_replies_idx'),
+        ]
     
     def __str__(self):
         return f"Comment by {self.user.username} on {self.video.title}"
     
+    def save(self, *args, **kwargs):
+        # comments.signals updates the path and the counters after the insert;
+        # they commit or roll back together with it
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     @property
     def is_reply(self):
-        return self.parent is not None
+        return self.parent_id is not None
     
-    @property
-    def replies_count(self):
-        return self.replies.count()
+    def subtree(self, max_depth=None):
+        """Replies below this comment in thread order, at most ``max_depth`` levels down"""
+        # Paths below this one sort between 'path' and 'path' with its final
+        # '/' bumped to '0', a plain range on the path index
+        replies = Comment.objects.filter(path__gt=self.path, path__lt=self.path[:-1] + '0').order_by('path')
+        if max_depth is not None:
+            replies = replies.filter(depth__lte=self.depth + max_depth)
+        return replies
 
 class CommentLike(models.Model):
     user = models.ForeignKey(Users, on_delete=models.CASCADE)
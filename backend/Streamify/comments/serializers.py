@@ -1,6 +1,11 @@
 from rest_framework import serializers
-from .models import Comment, CommentLike
+from django.db import models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .models import Comment, CommentLike, MAX_THREAD_DEPTH
 from accounts.models import Users
+from video import counters
+from video.serializers import request_user
 
 class CommentUserSerializer(serializers.ModelSerializer):
     profile_photo = serializers.SerializerMethodField()
@@ -17,8 +22,78 @@ class CommentUserSerializer(serializers.ModelSerializer):
             return obj.profile_photo.url
         return None
 
-class CommentSerializer(serializers.ModelSerializer):
+REPLY_PREVIEW_COUNT = 3  # replies embedded under each top-level comment
+
+def load_liked_ids(context, comment_ids):
+    """Remember which of ``comment_ids`` the viewer has liked, with one query"""
+    user = request_user(context.get('request'))
+    liked = set()
+    if user is not None and comment_ids:
+        liked.update(
+            CommentLike.objects.filter(user=user, comment_id__in=comment_ids)
+            .values_list('comment_id', flat=True)
+        )
+    context['liked_comment_ids'] = liked
+
+class CommentBatchListSerializer(serializers.ListSerializer):
+    """Loads the viewer's likes for a whole page of comments at once"""
+    def to_representation(self, data):
+        comments = list(data.all() if isinstance(data, models.Manager) else data)
+        if 'liked_comment_ids' not in self.context:
+            load_liked_ids(self.context, [comment.pk for comment in comments])
+        return super().to_representation(comments)
+
+class CommentThreadListSerializer(serializers.ListSerializer):
+    """
+    Loads the reply previews of every comment on the page with one windowed
+    query, and the viewer's likes for comments and replies with another.
+    """
+    def to_representation(self, data):
+        comments = list(data.all() if isinstance(data, models.Manager) else data)
+        comment_ids = [comment.pk for comment in comments]
+        
+        previews = {}
+        if comment_ids:
+            replies = (
+                counters.with_totals(Comment.objects.filter(parent_id__in=comment_ids), 'comment')
+                .select_related('user')
+                .annotate(position=Window(
+                    RowNumber(),
+                    partition_by=[F('parent_id')],
+                    order_by=[F('created_at').desc(), F('id').desc()],
+                ))
+                .filter(position__lte=REPLY_PREVIEW_COUNT)
+                .order_by('parent_id', 'position')
+            )
+            for reply in replies:
+                previews.setdefault(reply.parent_id, []).append(reply)
+        self.child.reply_previews = previews
+        
+        reply_ids = [reply.pk for replies in previews.values() for reply in replies]
+        load_liked_ids(self.context, comment_ids + reply_ids)
+        return super().to_representation(comments)
+
+class CommentLikeStateMixin:
+    """
+    user_has_liked from the ids preloaded into the context, or one lookup.
+    likes includes the counter shards when the queryset used
+    counters.with_totals().
+    """
+    def get_likes(self, obj):
+        return counters.total(obj, 'likes')
+    
+    def get_user_has_liked(self, obj):
+        liked = self.context.get('liked_comment_ids')
+        if liked is not None:
+            return obj.pk in liked
+        user = request_user(self.context.get('request'))
+        if user is None:
+            return False
+        return CommentLike.objects.filter(user=user, comment=obj).exists()
+
+class CommentSerializer(CommentLikeStateMixin, serializers.ModelSerializer):
     user = CommentUserSerializer(read_only=True)
+    likes = serializers.SerializerMethodField()
     replies_count = serializers.ReadOnlyField()
     is_reply = serializers.ReadOnlyField()
     user_has_liked = serializers.SerializerMethodField()
@@ -27,25 +102,12 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = [
             'id', 'content', 'user', 'video', 'parent', 'likes',
-            'replies_count', 'is_reply', 'user_has_liked',
+            'replies_count', 'is_reply', 'depth', 'user_has_liked',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['user', 'likes', 'created_at', 'updated_at']
+        read_only_fields = ['user', 'likes', 'depth', 'created_at', 'updated_at']
+        list_serializer_class = CommentBatchListSerializer
     
-    def get_user_has_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                # Handle our custom authentication
-                if hasattr(request.user, 'users_instance'):
-                    user = request.user.users_instance
-                else:
-                    from accounts.models import Users
-                    user = Users.objects.get(username=request.user.username)
-                return CommentLike.objects.filter(user=user, comment=obj).exists()
-            except:
-                pass
-        return False
 
 class CommentCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -57,15 +119,18 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         if data.get('parent'):
             if data['parent'].video != data['video']:
                 raise serializers.ValidationError("Reply must be on the same video as the parent comment.")
+            if data['parent'].depth >= MAX_THREAD_DEPTH:
+                raise serializers.ValidationError("Replies cannot be nested this deeply.")
         return data
     
     def to_representation(self, instance):
         # Return the comment with full user information after creation
         return CommentSerializer(instance, context=self.context).data
 
-class CommentListSerializer(serializers.ModelSerializer):
+class CommentListSerializer(CommentLikeStateMixin, serializers.ModelSerializer):
     user = CommentUserSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
+    likes = serializers.SerializerMethodField()
     user_has_liked = serializers.SerializerMethodField()
     
     class Meta:
@@ -74,24 +139,14 @@ class CommentListSerializer(serializers.ModelSerializer):
             'id', 'content', 'user', 'likes', 'replies',
             'user_has_liked', 'created_at'
         ]
+        list_serializer_class = CommentThreadListSerializer
     
     def get_replies(self, obj):
-        if obj.parent is None:  # Only get replies for top-level comments
-            replies = obj.replies.all()[:3]  # Limit to 3 replies initially
-            return CommentSerializer(replies, many=True, context=self.context).data
-        return []
+        if obj.parent_id is not None:  # Only get replies for top-level comments
+            return []
+        if hasattr(self, 'reply_previews'):
+            replies = self.reply_previews.get(obj.pk, [])
+        else:
+            replies = obj.replies.select_related('user')[:REPLY_PREVIEW_COUNT]
+        return CommentSerializer(replies, many=True, context=self.context).data
     
-    def get_user_has_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                # Handle our custom authentication
-                if hasattr(request.user, 'users_instance'):
-                    user = request.user.users_instance
-                else:
-                    from accounts.models import Users
-                    user = Users.objects.get(username=request.user.username)
-                return CommentLike.objects.filter(user=user, comment=obj).exists()
-            except:
-                pass
-        return False
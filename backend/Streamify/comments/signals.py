@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from video.detail_cache import bump_comments_version, bump_video_versions
+from video.models import Video
+from .models import Comment, path_segment
+
+
+def drop_cached_video(video_id):
+    """The comment count is part of the video's detail and stats"""
+    bump_video_versions([video_id])
+    bump_comments_version(video_id)
+
+
+@receiver(post_save, sender=Comment)
+def assign_thread_path(sender, instance, created, raw=False, **kwargs):
+    """Append the new comment's id to its parent's path; the id only exists after the insert"""
+    if not created or raw:
+        return
+    if instance.parent_id:
+        parent = instance.parent
+        instance.path = parent.path + path_segment(instance.pk)
+        instance.depth = parent.depth + 1
+    else:
+        instance.path = path_segment(instance.pk)
+        instance.depth = 0
+    Comment.objects.filter(pk=instance.pk).update(path=instance.path, depth=instance.depth)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    """Bump the video's and the parent's counters in the transaction of the insert, see Comment.save()"""
+    if not created or raw:
+        return
+    Video.objects.filter(pk=instance.video_id).update(comments_count=F('comments_count') + 1)
+    transaction.on_commit(lambda: drop_cached_video(instance.video_id))
+    if instance.parent_id:
+        Comment.objects.filter(pk=instance.parent_id).update(replies_count=F('replies_count') + 1)
+
+
+def deleting_video(origin):
+    """True if a delete started from a video (or videos), whose comments go with it"""
+    if isinstance(origin, QuerySet):
+        return origin.model is Video
+    return isinstance(origin, Video)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    """
+    Runs inside the delete's transaction, also for every reply removed by a
+    cascade. Rows that are themselves being deleted simply match nothing.
+    Counters are unsigned, so they are never decremented below zero. Nothing
+    is counted when the video itself is being deleted.
+    """
+    if deleting_video(origin):
+        return
+    Video.objects.filter(pk=instance.video_id, comments_count__gt=0).update(
+        comments_count=F('comments_count') - 1
+    )
+    transaction.on_commit(lambda: drop_cached_video(instance.video_id))
+    if instance.parent_id:
+        Comment.objects.filter(pk=instance.parent_id, replies_count__gt=0).update(
+            replies_count=F('replies_count') - 1
+        )
@@ -1,3 +1,205 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import Users
+from video import detail_cache
+from video.models import Video
+from .models import Comment, CommentLike
+from .serializers import REPLY_PREVIEW_COUNT
+
+
+class CommentRepliesViewTests(TestCase):
+    """Replies are paged depth-first with PathPagination"""
+
+    def setUp(self):
+        self.user = Users.objects.create(username='owner', email='owner@example.com', password='x')
+        self.video = Video.objects.create(
+            title='clip', video_file='videos/clip.mp4', uploader=self.user, processing_status='ready'
+        )
+        self.root = self.add(None, 'root')
+        first = self.add(self.root, '1')
+        self.add(first, '1.1')
+        self.add(self.add(first, '1.2'), '1.2.1')
+        second = self.add(self.root, '2')
+        self.add(second, '2.1')
+        self.add(self.root, '3')
+
+    def add(self, parent, text):
+        return Comment.objects.create(user=self.user, video=self.video, parent=parent, content=text)
+
+    def pages(self, url, direction='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([reply['content'] for reply in response.data['results']])
+            url = response.data[direction]
+        return pages, response.data
+
+    def test_thread_order_across_pages(self):
+        url = reverse('comment-replies', kwargs={'comment_id': self.root.id}) + '?depth=3&page_size=3'
+        pages, _ = self.pages(url)
+        self.assertEqual(pages, [['1', '1.1', '1.2'], ['1.2.1', '2', '2.1'], ['3']])
+
+    def test_depth_limits_the_levels(self):
+        url = reverse('comment-replies', kwargs={'comment_id': self.root.id}) + '?depth=1'
+        pages, _ = self.pages(url)
+        self.assertEqual(pages, [['1', '2', '3']])
+
+    def test_previous_links_walk_back(self):
+        url = reverse('comment-replies', kwargs={'comment_id': self.root.id}) + '?depth=3&page_size=3'
+        _, last = self.pages(url)
+        pages, _ = self.pages(last['previous'], direction='previous')
+        self.assertEqual(pages, [['1.2.1', '2', '2.1'], ['1', '1.1', '1.2']])
+
+    def test_subtree_of_a_reply_stays_inside_it(self):
+        first = Comment.objects.get(content='1')
+        self.add(None, 'another root')
+        self.assertEqual([c.content for c in first.subtree()], ['1.1', '1.2', '1.2.1'])
+        self.assertEqual([c.content for c in first.subtree(max_depth=1)], ['1.1', '1.2'])
+
+    def test_invalid_cursor(self):
+        url = reverse('comment-replies', kwargs={'comment_id': self.root.id})
+        self.assertEqual(self.client.get(url, {'cursor': 'garbage'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'depth': 'all'}).status_code, 400)
+
+
+class CommentCacheInvalidationTests(TestCase):
+    """Cached video pages are dropped once a comment change is committed"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = Users.objects.create(username='owner', email='owner@example.com', password='x')
+        self.video = Video.objects.create(
+            title='clip', video_file='videos/clip.mp4', uploader=self.user, processing_status='ready'
+        )
+
+    def versions(self):
+        return detail_cache.video_version(self.video.id), detail_cache.comments_version(self.video.id)
+
+    def test_versions_move_after_commit(self):
+        before = self.versions()
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.create(user=self.user, video=self.video, content='hi')
+            self.assertEqual(self.versions(), before)
+        created = self.versions()
+        self.assertTrue(all(new > old for new, old in zip(created, before)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.delete()
+        self.assertTrue(all(new > old for new, old in zip(self.versions(), created)))
+
+    def test_rolled_back_comments_leave_versions_alone(self):
+        before = self.versions()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Comment.objects.create(user=self.user, video=self.video, content='hi')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.versions(), before)
+
+
+class CommentListQueryCountTests(TestCase):
+    """A page of threads costs the same queries however many threads and replies it holds"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = Users.objects.create(username='owner', email='owner@example.com', password='x')
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def video_with_threads(self, threads, replies):
+        video = Video.objects.create(
+            title='clip', video_file='videos/clip.mp4', uploader=self.user, processing_status='ready'
+        )
+        for i in range(threads):
+            thread = Comment.objects.create(user=self.user, video=video, content=f'thread {i}')
+            CommentLike.objects.create(user=self.user, comment=thread)
+            for j in range(replies):
+                reply = Comment.objects.create(user=self.user, video=video, parent=thread, content=f'reply {j}')
+                CommentLike.objects.create(user=self.user, comment=reply)
+        return reverse('comment-list', kwargs={'video_id': video.id})
+
+    def queries(self, url, headers):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response.data['results']
+
+    def test_constant_queries(self):
+        one = self.video_with_threads(1, 0)
+        many = self.video_with_threads(15, 5)
+        for headers in ({}, self.headers):
+            with self.subTest(authenticated=bool(headers)):
+                single_count, _ = self.queries(one, headers)
+                many_count, results = self.queries(many, headers)
+                self.assertEqual(many_count, single_count)
+                self.assertEqual(len(results), 15)
+                self.assertEqual({len(thread['replies']) for thread in results}, {REPLY_PREVIEW_COUNT})
+                self.assertEqual(
+                    {thread['user_has_liked'] for thread in results}
+                    | {reply['user_has_liked'] for thread in results for reply in thread['replies']},
+                    {bool(headers)},
+                )
+
+
+class CommentCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Users.objects.create(username='owner', email='owner@example.com', password='x')
+        self.video = self.make_video()
+
+    def make_video(self):
+        return Video.objects.create(
+            title='clip', video_file='videos/clip.mp4', uploader=self.user, processing_status='ready'
+        )
+
+    def add(self, parent=None, video=None):
+        return Comment.objects.create(user=self.user, video=video or self.video, parent=parent, content='hi')
+
+    def counts(self, *comments):
+        self.video.refresh_from_db()
+        return [self.video.comments_count] + [
+            Comment.objects.get(pk=comment.pk).replies_count for comment in comments
+        ]
+
+    def test_counts_follow_replies_and_deletes(self):
+        thread = self.add()
+        reply = self.add(thread)
+        self.add(reply)
+        other = self.add()
+        self.assertEqual(self.counts(thread, reply, other), [4, 1, 1, 0])
+
+        # The cascade removes the nested reply too
+        reply.delete()
+        self.assertEqual(self.counts(thread, other), [2, 0, 0])
+        thread.delete()
+        self.assertEqual(self.counts(other), [1, 0])
+
+    def test_insert_rolls_back_with_a_failed_counter_update(self):
+        with mock.patch('comments.signals.Video.objects.filter', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.add()
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.counts(), [0])
 
-# Create your tests here.
+    def test_deleting_a_video_skips_its_comment_counters(self):
+        empty = self.make_video()
+        for _ in range(5):
+            self.add(self.add())
+        with CaptureQueriesContext(connection) as without_comments, \
+                self.captureOnCommitCallbacks() as empty_callbacks:
+            empty.delete()
+        with CaptureQueriesContext(connection) as with_comments, self.captureOnCommitCallbacks() as callbacks:
+            self.video.delete()
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(len(callbacks), len(empty_callbacks))
+        updates = [query['sql'] for query in with_comments if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), len([q for q in without_comments if q['sql'].startswith('UPDATE')]))
@@ -4,18 +4,36 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from .models import Comment, CommentLike
+from django.db import transaction
+from .models import Comment, CommentLike, MAX_THREAD_DEPTH
 from .serializers import CommentSerializer, CommentCreateSerializer, CommentListSerializer
+from video import counters, detail_cache
+from video.serializers import request_user
+from Streamify.conditional import respond_conditionally, weak_etag
 from video.models import Video
+from Streamify.pagination import KeysetPagination, PathPagination
 
 class CommentListView(generics.ListAPIView):
     serializer_class = CommentListSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    
+    def list(self, request, *args, **kwargs):
+        """Unchanged pages are answered with 304 from the video's comments version"""
+        video_id = self.kwargs['video_id']
+        version = detail_cache.comments_version(video_id)
+        user = request_user(request)
+        etag = weak_etag('comments', video_id, version, request.build_absolute_uri(), user.id if user else '')
+        return respond_conditionally(
+            request, etag, detail_cache.version_time(version),
+            lambda: super(CommentListView, self).list(request, *args, **kwargs),
+        )
     
     def get_queryset(self):
         video_id = self.kwargs['video_id']
         # Only get top-level comments (not replies)
-        return Comment.objects.filter(video_id=video_id, parent=None)
+        comments = Comment.objects.filter(video_id=video_id, parent=None).select_related('user')
+        return counters.with_totals(comments, 'comment')
 
 class CommentCreateView(generics.CreateAPIView):
     serializer_class = CommentCreateSerializer
@@ -48,7 +66,9 @@ class ToggleCommentLikeView(APIView):
                 'login_required': True
             }, status=status.HTTP_401_UNAUTHORIZED)
         
-        comment = get_object_or_404(Comment, id=comment_id)
+        # The current total comes with the comment, so the response needs no
+        # second read after the counter is bumped
+        comment = get_object_or_404(counters.with_totals(Comment.objects.all(), 'comment'), id=comment_id)
         
         # Get the user from the Users model
         from accounts.models import Users
@@ -61,35 +81,42 @@ class ToggleCommentLikeView(APIView):
         except Users.DoesNotExist:
             return Response({'error': 'User not found'}, status=400)
         
-        comment_like, created = CommentLike.objects.get_or_create(
-            user=user,
-            comment=comment
-        )
+        with transaction.atomic():
+            comment_like, created = CommentLike.objects.get_or_create(
+                user=user,
+                comment=comment
+            )
+            if not created:
+                # User unliked the comment
+                comment_like.delete()
+            delta = 1 if created else -1
+            counters.increment('comment', comment.id, {'likes': delta})
+            transaction.on_commit(lambda: detail_cache.bump_comments_version(comment.video_id))
         
-        if created:
-            # User liked the comment
-            comment.likes += 1
-            comment.save()
-            return Response({
-                'liked': True,
-                'likes_count': comment.likes
-            })
-        else:
-            # User unliked the comment
-            comment_like.delete()
-            comment.likes = max(0, comment.likes - 1)
-            comment.save()
-            return Response({
-                'liked': False,
-                'likes_count': comment.likes
-            })
+        return Response({
+            'liked': created,
+            'likes_count': max(0, counters.total(comment, 'likes') + delta)
+        })
 
 class CommentRepliesView(APIView):
     permission_classes = [permissions.AllowAny]
     
     def get(self, request, comment_id):
-        """Get all replies for a comment"""
+        """
+        Get the replies below a comment in thread order, one page at a time.
+        ``?depth=`` sets how many levels of nested replies to include.
+        """
         comment = get_object_or_404(Comment, id=comment_id)
-        replies = comment.replies.all()
+        try:
+            depth = int(request.query_params.get('depth', 1))
+        except ValueError:
+            return Response({'error': 'depth must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        depth = max(1, min(depth, MAX_THREAD_DEPTH))
+        
+        paginator = PathPagination()
+        replies = paginator.paginate_queryset(
+            counters.with_totals(comment.subtree(max_depth=depth).select_related('user'), 'comment'),
+            request, view=self
+        )
         serializer = CommentSerializer(replies, many=True, context={'request': request})
-        return Response(serializer.data)
\ No newline at end of file
+        return paginator.get_paginated_response(serializer.data)
\ No newline at end of file
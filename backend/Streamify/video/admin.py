@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import Video, VideoLike, VideoView
+from .models import Video, VideoLike, VideoView, VideoMetadata, VideoRendition, UploadSession, MediaBlob, Transcript, TranscriptSegment
 
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
     list_display = ['title', 'uploader', 'views', 'likes', 'dislikes', 'visibility', 'processing_status', 'created_at']
     list_filter = ['visibility', 'processing_status', 'created_at', 'uploader']
     search_fields = ['title', 'description', 'uploader__username']
-    readonly_fields = ['views', 'likes', 'dislikes', 'file_size', 'duration', 'created_at', 'updated_at']
+    readonly_fields = ['views', 'likes', 'dislikes', 'comments_count', 'file_size', 'duration', 'created_at', 'updated_at']
     ordering = ['-created_at']
     
     fieldsets = (
@@ -17,7 +17,7 @@ class VideoAdmin(admin.ModelAdmin):
             'fields': ('video_file', 'thumbnail')
         }),
         ('Statistics', {
-            'fields': ('views', 'likes', 'dislikes', 'duration', 'file_size'),
+            'fields': ('views', 'likes', 'dislikes', 'comments_count', 'duration', 'file_size'),
             'classes': ('collapse',)
         }),
         ('Status', {
@@ -29,6 +29,48 @@ class VideoAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'size', 'ref_count', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'file', 'size', 'ref_count', 'created_at']
+    ordering = ['-created_at']
+
+@admin.register(VideoMetadata)
+class VideoMetadataAdmin(admin.ModelAdmin):
+    list_display = ['video', 'container', 'video_codec', 'width', 'height', 'fps', 'audio_codec', 'probed_at']
+    list_filter = ['container', 'video_codec', 'audio_codec']
+    search_fields = ['video__title']
+
+@admin.register(VideoRendition)
+class VideoRenditionAdmin(admin.ModelAdmin):
+    list_display = ['video', 'name', 'width', 'height', 'bandwidth', 'created_at']
+    search_fields = ['video__title']
+    ordering = ['video', 'height']
+
+class TranscriptSegmentInline(admin.TabularInline):
+    model = TranscriptSegment
+    extra = 0
+    fields = ['index', 'start', 'end', 'text']
+    readonly_fields = ['index', 'start', 'end', 'text']
+
+@admin.register(Transcript)
+class TranscriptAdmin(admin.ModelAdmin):
+    list_display = ['video', 'language', 'version', 'updated_at']
+    list_filter = ['language']
+    search_fields = ['video__title', 'text']
+    readonly_fields = ['version', 'created_at', 'updated_at']
+    exclude = ['tokens']
+    inlines = [TranscriptSegmentInline]
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'uploader', 'offset', 'upload_length', 'status', 'updated_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['filename', 'title', 'uploader__username']
+    readonly_fields = ['offset', 'sha256', 'file_path', 'created_at', 'updated_at']
+    ordering = ['-updated_at']
+
 @admin.register(VideoLike)
 class VideoLikeAdmin(admin.ModelAdmin):
     list_display = ['user', 'video', 'reaction', 'created_at']
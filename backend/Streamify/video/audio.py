@@ -0,0 +1,121 @@
+import json
+import os
+import wave
+
+import ffmpeg
+import numpy as np
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+# Buckets are reduced this many at a time so memory doesn't grow with duration
+PEAKS_BLOCK_BUCKETS = 4096
+
+
+def extract_audio(source_path, output_path):
+    """Decode the first audio stream to a 16 kHz mono 16-bit WAV file"""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    (
+        ffmpeg
+        .input(source_path)
+        .output(output_path, vn=None, acodec='pcm_s16le', ac=1, ar=SAMPLE_RATE, format='wav')
+        .run(quiet=True, overwrite_output=True)
+    )
+    return output_path
+
+
+def is_pcm_wav(path):
+    """True if ``path`` is a WAV file in the format written by extract_audio"""
+    if not path or not path.lower().endswith('.wav') or not os.path.exists(path):
+        return False
+    try:
+        with wave.open(path, 'rb') as wav:
+            return (
+                wav.getframerate() == SAMPLE_RATE
+                and wav.getnchannels() == 1
+                and wav.getsampwidth() == SAMPLE_WIDTH
+            )
+    except (wave.Error, EOFError):
+        return False
+
+
+def open_pcm(path):
+    """
+    Open an extracted WAV file positioned at the start of its PCM data.
+
+    The caller reads raw 16-bit samples from the returned file and closes it.
+    """
+    stream = open(path, 'rb')
+    try:
+        # Parsing the header leaves the file at the start of the data chunk
+        wav = wave.open(stream, 'rb')
+        if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != SAMPLE_WIDTH:
+            raise ValueError(f'{path} is not 16 kHz mono 16-bit audio')
+    except Exception:
+        stream.close()
+        raise
+    return stream
+
+
+def map_samples(path):
+    """Memory-map the samples of an extracted WAV file as int16 without reading it"""
+    with open_pcm(path) as stream:
+        offset = stream.tell()
+    frames = (os.path.getsize(path) - offset) // SAMPLE_WIDTH
+    if frames <= 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(frames,))
+
+
+def load_audio(path):
+    """Samples of an extracted WAV file as float32 in [-1, 1], as Whisper expects"""
+    return map_samples(path).astype(np.float32) / 32768.0
+
+
+def whisper_input(path):
+    """What to pass to model.transcribe(): decoded samples for extracted audio, else the path"""
+    if is_pcm_wav(path):
+        return load_audio(path)
+    return path
+
+
+def compute_peaks(samples, samples_per_pixel):
+    """
+    Min/max pairs of 8-bit amplitudes for every ``samples_per_pixel`` samples.
+
+    Returns a flat int8 array ``[min0, max0, min1, max1, ...]``.
+    """
+    buckets = -(-len(samples) // samples_per_pixel)
+    peaks = np.empty(buckets * 2, dtype=np.int8)
+    block = PEAKS_BLOCK_BUCKETS * samples_per_pixel
+    for start in range(0, len(samples), block):
+        chunk = np.asarray(samples[start:start + block])
+        remainder = len(chunk) % samples_per_pixel
+        if remainder:
+            # Pad the last bucket with its own last sample so it doesn't skew the range
+            chunk = np.concatenate([chunk, np.full(samples_per_pixel - remainder, chunk[-1], dtype=chunk.dtype)])
+        rows = chunk.reshape(-1, samples_per_pixel)
+        first = start // samples_per_pixel * 2
+        peaks[first:first + len(rows) * 2:2] = rows.min(axis=1) >> 8
+        peaks[first + 1:first + len(rows) * 2:2] = rows.max(axis=1) >> 8
+    return peaks
+
+
+def write_peaks(path, samples, samples_per_pixel):
+    """
+    Write waveform peaks as JSON in the audiowaveform/peaks.js format.
+
+    Returns the number of buckets written.
+    """
+    peaks = compute_peaks(samples, samples_per_pixel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'version': 2,
+            'channels': 1,
+            'sample_rate': SAMPLE_RATE,
+            'samples_per_pixel': samples_per_pixel,
+            'bits': 8,
+            'length': len(peaks) // 2,
+            'data': peaks.tolist(),
+        }, f, separators=(',', ':'))
+    return len(peaks) // 2
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+
+from .models import TranscriptSegment
+from .trickplay import format_timestamp
+
+CAPTION_FORMATS = {
+    'vtt': 'text/vtt; charset=utf-8',
+    'srt': 'application/x-subrip; charset=utf-8',
+}
+# Rendered captions never change for a given transcript version
+CAPTIONS_CACHE_TIMEOUT = 7 * 24 * 3600
+
+
+def format_srt_timestamp(seconds):
+    """Format seconds as an SRT timestamp (HH:MM:SS,mmm)"""
+    return format_timestamp(seconds).replace('.', ',')
+
+
+def render_vtt(segments):
+    lines = ['WEBVTT', '']
+    for segment in segments:
+        lines.append(f"{format_timestamp(segment['start'])} --> {format_timestamp(segment['end'])}")
+        lines.append(segment['text'])
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def render_srt(segments):
+    lines = []
+    for number, segment in enumerate(segments, start=1):
+        lines.append(str(number))
+        lines.append(f"{format_srt_timestamp(segment['start'])} --> {format_srt_timestamp(segment['end'])}")
+        lines.append(segment['text'])
+        lines.append('')
+    return '\n'.join(lines)
+
+
+RENDERERS = {'vtt': render_vtt, 'srt': render_srt}
+
+
+def caption_etag(transcript_id, version, caption_format):
+    """Strong validator derived from the transcript version, known before rendering"""
+    return f'"captions-{transcript_id}-{version}-{caption_format}"'
+
+
+def render_captions(transcript_id, version, caption_format):
+    """
+    Captions for a transcript in ``caption_format`` ('vtt' or 'srt').
+
+    Rendered text is cached per transcript version, so a new transcript
+    replaces it without explicit invalidation.
+    """
+    key = f'captions:{transcript_id}:{version}:{caption_format}'
+    body = cache.get(key)
+    if body is None:
+        segments = TranscriptSegment.objects.filter(transcript_id=transcript_id).values('start', 'end', 'text')
+        body = RENDERERS[caption_format](segments.iterator())
+        cache.set(key, body, CAPTIONS_CACHE_TIMEOUT)
+    return body
@@ -0,0 +1,130 @@
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import EngagementCounter
+
+# Counted fields per kind of object; the model column holds the compacted total
+COUNTED_FIELDS = {
+    'video': ('likes', 'dislikes'),
+    'comment': ('likes',),
+}
+COMPACT_BATCH_SIZE = 1000
+
+
+def shard_count():
+    return max(1, getattr(settings, 'ENGAGEMENT_COUNTER_SHARDS', 16))
+
+
+def _upsert_sql(rows):
+    table = connection.ops.quote_name(EngagementCounter._meta.db_table)
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    insert = f'INSERT INTO {table} (kind, object_id, field, shard, value) VALUES {placeholders}'
+    if connection.vendor == 'mysql':
+        return f'{insert} ON DUPLICATE KEY UPDATE value = value + VALUES(value)'
+    if connection.vendor in ('postgresql', 'sqlite'):
+        return (
+            f'{insert} ON CONFLICT (kind, object_id, field, shard) '
+            f'DO UPDATE SET value = {table}.value + excluded.value'
+        )
+    return None
+
+
+def increment(kind, object_id, deltas):
+    """
+    Add ``deltas`` ({field: amount}) to the counters of one object.
+
+    Every call picks a random shard and writes all fields with a single
+    upsert, so concurrent reactions to the same object rarely wait on the
+    same row and never touch the object's own row.
+    """
+    shard = random.randrange(shard_count())
+    rows = [(kind, object_id, field, shard, delta) for field, delta in deltas.items() if delta]
+    if not rows:
+        return
+    sql = _upsert_sql(rows)
+    if sql is None:
+        _increment_portably(rows)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+
+
+def _increment_portably(rows):
+    for kind, object_id, field, shard, delta in rows:
+        lookup = {'kind': kind, 'object_id': object_id, 'field': field, 'shard': shard}
+        if EngagementCounter.objects.filter(**lookup).update(value=F('value') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                EngagementCounter.objects.create(value=delta, **lookup)
+        except IntegrityError:
+            EngagementCounter.objects.filter(**lookup).update(value=F('value') + delta)
+
+
+def pending(kind, field):
+    """Expression for the not yet compacted count of ``field``, for annotate()"""
+    shards = (
+        EngagementCounter.objects.filter(kind=kind, object_id=OuterRef('pk'), field=field)
+        .order_by().values('object_id').annotate(total=Sum('value')).values('total')
+    )
+    return Coalesce(Subquery(shards), 0)
+
+
+def with_totals(queryset, kind):
+    """
+    Annotate ``<field>_total`` for every counted field: the compacted column
+    plus the shards written since the last compaction.
+    """
+    return queryset.annotate(**{
+        f'{field}_total': ExpressionWrapper(F(field) + pending(kind, field), output_field=IntegerField())
+        for field in COUNTED_FIELDS[kind]
+    })
+
+
+def total(obj, field):
+    """The live count of ``field``, from with_totals() when it was applied"""
+    return getattr(obj, f'{field}_total', getattr(obj, field))
+
+
+def compact(kind, model, batch_size=COMPACT_BATCH_SIZE):
+    """
+    Fold counter shards into the ``model`` columns they count and delete them.
+
+    Each batch locks the shard rows of up to ``batch_size`` objects, adds
+    their sums to the objects with one UPDATE per object and deletes them in
+    the same transaction. Increments arriving meanwhile wait for the lock and
+    then start new shard rows.
+    Returns the number of shard rows folded.
+    """
+    folded = 0
+    while True:
+        with transaction.atomic():
+            # Whole objects per batch, so a column never gets an unlike
+            # without the like it cancels
+            object_ids = list(
+                EngagementCounter.objects.filter(kind=kind).order_by('object_id')
+                .values_list('object_id', flat=True).distinct()[:batch_size]
+            )
+            if not object_ids:
+                return folded
+            rows = list(
+                EngagementCounter.objects.select_for_update()
+                .filter(kind=kind, object_id__in=object_ids)
+                .values_list('pk', 'object_id', 'field', 'value')
+            )
+            sums = defaultdict(lambda: defaultdict(int))
+            for _, object_id, field, value in rows:
+                sums[object_id][field] += value
+            for object_id, fields in sums.items():
+                changes = {field: F(field) + value for field, value in fields.items() if value}
+                if changes:
+                    model.objects.filter(pk=object_id).update(**changes)
+            EngagementCounter.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        folded += len(rows)
+        if len(object_ids) < batch_size:
+            return folded
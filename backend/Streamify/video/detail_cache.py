@@ -0,0 +1,140 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'video:{video_id}:version'
+COMMENTS_VERSION_KEY = 'video:{video_id}:comments-version'
+METRICS_KEY = 'video-cache:{name}:{event}'
+METRIC_EVENTS = ('hits', 'misses', 'early_refreshes', 'recomputes', 'stale_served', 'waits', 'wait_timeouts')
+CACHE_NAMES = ('detail', 'stats')
+VERSION_TIMEOUT = 7 * 24 * 3600  # idle versions expire; a lost one restarts at the current time
+LOCK_TIMEOUT = 10  # seconds a recomputation may hold a key before others take over
+WAIT_INTERVAL = 0.05
+XFETCH_BETA = 1.0  # higher refreshes earlier
+
+
+def _now_us():
+    return time.time_ns() // 1000
+
+
+def get_version(key):
+    """
+    Version stored at ``key``: the time of the last change in microseconds.
+    A lost key comes back as the current time, never as an older version, so
+    validators built from it cannot match stale copies.
+    """
+    return cache.get_or_set(key, _now_us, VERSION_TIMEOUT)
+
+
+def bump_version(key):
+    cache.set(key, max(_now_us(), (cache.get(key) or 0) + 1), VERSION_TIMEOUT)
+
+
+def version_time(version):
+    """Unix time of the change a version stands for, for Last-Modified"""
+    return version / 1e6
+
+
+def video_version(video_id):
+    return get_version(VERSION_KEY.format(video_id=video_id))
+
+
+def bump_video_versions(video_ids):
+    """Invalidate the cached detail and stats of these videos"""
+    for video_id in video_ids:
+        bump_version(VERSION_KEY.format(video_id=video_id))
+
+
+def comments_version(video_id):
+    return get_version(COMMENTS_VERSION_KEY.format(video_id=video_id))
+
+
+def bump_comments_version(video_id):
+    """Comments or their like counts on a video changed"""
+    bump_version(COMMENTS_VERSION_KEY.format(video_id=video_id))
+
+
+def _count(name, event):
+    key = METRICS_KEY.format(name=name, event=event)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def metrics():
+    """{cache name: {event: count}} across every process sharing the cache"""
+    keys = {
+        METRICS_KEY.format(name=name, event=event): (name, event)
+        for name in CACHE_NAMES for event in METRIC_EVENTS
+    }
+    values = cache.get_many(list(keys))
+    result = {name: {event: 0 for event in METRIC_EVENTS} for name in CACHE_NAMES}
+    for key, value in values.items():
+        name, event = keys[key]
+        result[name][event] = value
+    return result
+
+
+def reset_metrics():
+    cache.delete_many([METRICS_KEY.format(name=name, event=event) for name in CACHE_NAMES for event in METRIC_EVENTS])
+
+
+def get_or_compute(name, key, stale_key, compute, timeout, version):
+    """
+    The cached value of ``key``, computing it at most once at a time.
+
+    Entries remember how long they took to compute and are refreshed early
+    with a probability that grows towards expiry (XFetch), so hot keys are
+    rarely seen expired. Only the request that takes the lock recomputes;
+    the others serve the last value stored under ``stale_key`` (the previous
+    version of the key) or wait for the new one.
+
+    Returns ``(value, served_version)``: ``version`` unless an older value
+    was served, so validators can be built from what was actually sent.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        # XFetch: -delta * beta * log(U) moves "now" forward by a random amount
+        now = time.time() - entry['delta'] * XFETCH_BETA * math.log(1.0 - random.random())
+        if now < entry['expires']:
+            _count(name, 'hits')
+            return entry['value'], version
+        _count(name, 'early_refreshes' if time.time() < entry['expires'] else 'misses')
+    else:
+        _count(name, 'misses')
+
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, LOCK_TIMEOUT):
+        if entry is not None:
+            _count(name, 'stale_served')
+            return entry['value'], version
+        stale = cache.get(stale_key)
+        if stale is not None and stale.get('version') is not None:
+            _count(name, 'stale_served')
+            return stale['value'], stale['version']
+        _count(name, 'waits')
+        deadline = time.monotonic() + getattr(settings, 'VIDEO_CACHE_WAIT_SECONDS', 2)
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value'], version
+        _count(name, 'wait_timeouts')
+        return compute(), version
+
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        entry = {'value': value, 'delta': delta, 'expires': time.time() + timeout, 'version': version}
+        # Kept past expiry so it can stand in while the next value is computed
+        cache.set_many({key: entry, stale_key: entry}, timeout * 2)
+        _count(name, 'recomputes')
+        return value, version
+    finally:
+        cache.delete(lock)
@@ -0,0 +1,105 @@
+import os
+
+import ffmpeg
+
+
+def plan_ladder(ladder, source):
+    """
+    Pick the rungs to encode for a source.
+
+    ``source`` is the video's VideoMetadata. Rungs at or above the source
+    height are dropped (the 'source' rung covers them) and every rung gets a
+    concrete width/height with even dimensions.
+    """
+    rungs = []
+    for rung in ladder:
+        height = rung.get('height')
+        if height is None:
+            height = source.height
+        elif height >= source.height:
+            continue
+        width = round(source.width * height / source.height / 2) * 2
+        rungs.append(dict(rung, width=width, height=height - height % 2))
+    return rungs
+
+
+def rendition_bandwidth(rung, source):
+    """Peak bandwidth (bits/s) advertised for a rung in the master playlist"""
+    if rung.get('video_bitrate'):
+        return int((rung['video_bitrate'] * 1.1 + (rung.get('audio_bitrate') or 0)) * 1000)
+    return source.bit_rate or 5_000_000
+
+
+def can_copy_source(rung, source):
+    """The source rung is remuxed instead of re-encoded when HLS can carry it as-is"""
+    return (
+        rung.get('video_bitrate') is None
+        and source.video_codec == 'h264'
+        and source.audio_codec in ('', 'aac')
+    )
+
+
+def transcode_rendition(source_path, output_dir, rung, source, segment_seconds):
+    """Encode one rung into ``output_dir/index.m3u8`` plus its segments"""
+    os.makedirs(output_dir, exist_ok=True)
+    playlist_path = os.path.join(output_dir, 'index.m3u8')
+
+    stream = ffmpeg.input(source_path)
+    options = {
+        'f': 'hls',
+        'hls_time': segment_seconds,
+        'hls_playlist_type': 'vod',
+        'hls_segment_filename': os.path.join(output_dir, 'segment_%05d.ts'),
+    }
+
+    if can_copy_source(rung, source):
+        streams = [stream.video]
+        options['c:v'] = 'copy'
+    else:
+        streams = [stream.video.filter('scale', rung['width'], rung['height'])]
+        options.update({
+            'c:v': 'libx264',
+            'preset': 'veryfast',
+            'profile:v': 'main',
+            'pix_fmt': 'yuv420p',
+            # Keyframe on every segment boundary so renditions switch cleanly
+            'force_key_frames': f'expr:gte(t,n_forced*{segment_seconds})',
+            'sc_threshold': 0,
+        })
+        if rung.get('video_bitrate'):
+            options.update({
+                'b:v': f"{rung['video_bitrate']}k",
+                'maxrate': f"{int(rung['video_bitrate'] * 1.1)}k",
+                'bufsize': f"{rung['video_bitrate'] * 2}k",
+            })
+        else:
+            options['crf'] = 21
+
+    if source.has_audio:
+        streams.append(stream.audio)
+        if options.get('c:v') == 'copy':
+            options['c:a'] = 'copy'
+        else:
+            options.update({'c:a': 'aac', 'b:a': f"{rung.get('audio_bitrate') or 128}k", 'ac': 2})
+
+    ffmpeg.output(*streams, playlist_path, **options).run(quiet=True, overwrite_output=True)
+    return playlist_path
+
+
+def write_master_playlist(path, renditions):
+    """
+    Write the master playlist for ``renditions``.
+
+    Each rendition is a dict with ``bandwidth``, ``width``, ``height`` and
+    ``uri`` (relative to the master playlist).
+    """
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for rendition in sorted(renditions, key=lambda r: r['bandwidth']):
+        lines.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={rendition['bandwidth']},"
+            f"RESOLUTION={rendition['width']}x{rendition['height']}"
+        )
+        lines.append(rendition['uri'])
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .detail_cache import bump_version, get_version
+from .models import VideoLike
+from .serializers import request_user
+
+LIST_VERSION_KEY = 'video-list:version'
+
+
+def bump_list_version():
+    """Invalidate every cached video list page"""
+    bump_version(LIST_VERSION_KEY)
+
+
+def response_key(request):
+    """Cache key of a list page: the full URL (filters, cursor, host) and the list version"""
+    version = get_version(LIST_VERSION_KEY)
+    digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'video-list:{version}:{digest}'
+
+
+def cached_page(request, render):
+    """
+    The shared payload of a list page from the cache, or from ``render()``
+    which must leave the per-user fields empty.
+
+    Returns ``{'data', 'digest', 'modified'}``: the digest of the payload and
+    when it was rendered are kept with it to serve as validators.
+    """
+    key = response_key(request)
+    entry = cache.get(key)
+    if entry is None:
+        data = render()
+        entry = {
+            'data': data,
+            'digest': hashlib.md5(json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest(),
+            'modified': time.time(),
+        }
+        cache.set(key, entry, getattr(settings, 'VIDEO_LIST_CACHE_TIMEOUT', 30))
+    return entry
+
+
+def user_reactions(data, request):
+    """The viewer's reactions to the videos of a page, with one query"""
+    user = request_user(request)
+    if user is None:
+        return {}
+    return dict(
+        VideoLike.objects.filter(user=user, video_id__in=[item['id'] for item in data['results']])
+        .values_list('video_id', 'reaction')
+    )
+
+
+def overlay_user_reactions(data, reactions):
+    """Fill in user_reaction; the payload itself is not modified"""
+    if not reactions:
+        return data
+    return {**data, 'results': [{**item, 'user_reaction': reactions.get(item['id'])} for item in data['results']]}
@@ -0,0 +1,165 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from video import detail_cache, list_cache
+from video.models import BackfillCheckpoint
+
+
+class BackfillCommand(BaseCommand):
+    """
+    Base class for management commands that (re)process many videos.
+
+    Subclasses describe one unit of work and the framework takes care of the
+    rest: rows are read in primary-key order and in batches, the work is fanned
+    out over a process pool, results are written back with ``bulk_update`` and
+    progress is checkpointed after every batch so an interrupted run resumes
+    where it stopped. Bulk writes send no post_save, so the cached pages of
+    the videos in each saved batch are dropped once it is committed. A run
+    that reaches the end resets the checkpoint, so the next run starts over.
+    Rows whose work failed are kept on the checkpoint and processed again
+    with ``--retry-failed``.
+
+    Subclasses set ``checkpoint_name`` and ``update_fields`` and implement:
+
+    - ``get_queryset()``: rows still needing work
+    - ``work``: a module-level (picklable) function run in the worker processes
+    - ``get_work_args(obj)``: picklable arguments for ``work``, or None to skip
+    - ``apply_result(obj, result)``: set fields on ``obj``; return True to save it
+    """
+    checkpoint_name = None
+    update_fields = []
+    work = None
+    default_workers = 4
+    default_batch_size = 100
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=self.default_workers,
+                            help='Number of worker processes.')
+        parser.add_argument('--batch-size', type=int, default=self.default_batch_size,
+                            help='Rows read, processed and written per batch.')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Maximum items started per second (0 for no limit).')
+        parser.add_argument('--limit', type=int, default=0,
+                            help='Stop after this many items (0 for no limit).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be processed without doing any work.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the saved checkpoint and start from the beginning.')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Only process the rows that failed in earlier runs.')
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_work_args(self, obj):
+        raise NotImplementedError
+
+    def apply_result(self, obj, result):
+        raise NotImplementedError
+
+    def save_batch(self, objs):
+        """Write back the rows changed in one batch"""
+        type(objs[0]).objects.bulk_update(objs, self.update_fields)
+
+    def handle(self, *args, **options):
+        checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=self.checkpoint_name)
+        if options['restart']:
+            checkpoint.last_pk = 0
+            checkpoint.processed = 0
+
+        retrying = options['retry_failed']
+        if retrying:
+            # A pass over the failed rows leaves the position of the main run alone
+            queryset = self.get_queryset().filter(pk__in=checkpoint.failed_pks).order_by('pk')
+            last_pk = 0
+        else:
+            queryset = self.get_queryset().filter(pk__gt=checkpoint.last_pk).order_by('pk')
+            last_pk = checkpoint.last_pk
+
+        if options['dry_run']:
+            total = queryset.count()
+            sample = list(queryset.values_list('pk', flat=True)[:20])
+            self.stdout.write(
+                f'{total} rows would be processed after pk {last_pk}. First ids: {sample}'
+            )
+            return
+
+        limit = options['limit']
+        batch_size = options['batch_size']
+        interval = 1.0 / options['rate'] if options['rate'] > 0 else 0
+        processed = failed = 0
+        failed_pks = set(checkpoint.failed_pks)
+        finished = False
+
+        if retrying:
+            self.stdout.write(f'Retrying {len(failed_pks)} failed rows of {self.checkpoint_name}.')
+        else:
+            self.stdout.write(f'Resuming {self.checkpoint_name} after pk {last_pk}.')
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            while not limit or processed < limit:
+                size = min(batch_size, limit - processed) if limit else batch_size
+                batch = list(queryset.filter(pk__gt=last_pk)[:size])
+                if not batch:
+                    finished = True
+                    break
+
+                futures = []
+                for obj in batch:
+                    work_args = self.get_work_args(obj)
+                    if work_args is None:
+                        futures.append(None)
+                        continue
+                    if interval:
+                        time.sleep(interval)
+                    futures.append(executor.submit(type(self).work, *work_args))
+
+                changed = []
+                for obj, future in zip(batch, futures):
+                    failed_pks.discard(obj.pk)
+                    if future is None:
+                        continue
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed += 1
+                        failed_pks.add(obj.pk)
+                        self.stderr.write(f'Failed on pk {obj.pk}: {e}')
+                        continue
+                    if self.apply_result(obj, result):
+                        changed.append(obj)
+
+                last_pk = batch[-1].pk
+                with transaction.atomic():
+                    if changed:
+                        self.save_batch(changed)
+                    if not retrying:
+                        checkpoint.last_pk = last_pk
+                        checkpoint.processed += len(batch)
+                    checkpoint.failed_pks = sorted(failed_pks)
+                    checkpoint.save()
+                if changed:
+                    list_cache.bump_list_version()
+                    detail_cache.bump_video_versions([obj.pk for obj in changed])
+
+                processed += len(batch)
+                self.stdout.write(
+                    f'Processed {processed} rows ({len(changed)} updated in last batch), '
+                    f'checkpoint at pk {checkpoint.last_pk}.'
+                )
+
+        if retrying:
+            # Failed rows the queryset no longer selects need no more work
+            failed_pks &= set(self.get_queryset().filter(pk__in=failed_pks).values_list('pk', flat=True))
+        elif finished:
+            checkpoint.last_pk = 0
+            checkpoint.processed = 0
+        checkpoint.failed_pks = sorted(failed_pks)
+        checkpoint.save()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.checkpoint_name}: processed {processed} rows, {failed} failed'
+            + (f', {len(failed_pks)} left to retry with --retry-failed.' if failed_pks else '.')
+        ))
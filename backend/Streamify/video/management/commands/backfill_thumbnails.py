@@ -0,0 +1,31 @@
+import os
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from video.management.backfill import BackfillCommand
+from video.models import Video
+from video.probe import extract_frame
+
+
+class Command(BackfillCommand):
+    help = 'Generates a thumbnail from a frame of the video for videos without one.'
+    checkpoint_name = 'video-thumbnails'
+    update_fields = ['thumbnail']
+    work = extract_frame
+
+    def get_queryset(self):
+        return Video.objects.filter(Q(thumbnail__isnull=True) | Q(thumbnail='')).exclude(video_file='')
+
+    def get_work_args(self, obj):
+        if not os.path.exists(obj.video_file.path):
+            return None
+        # Grab a frame 10% into the video to skip black intro frames
+        duration = obj.duration.total_seconds() if obj.duration else 0
+        name = os.path.join('thumbnails', f"thumb_{obj.pk}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.jpg")
+        return (obj.video_file.path, os.path.join(settings.MEDIA_ROOT, name), duration * 0.1, name)
+
+    def apply_result(self, obj, result):
+        if not result:
+            return False
+        obj.thumbnail = result
+        return True
@@ -0,0 +1,48 @@
+import os
+from video import audio, transcripts, whisper_models
+from video.management.backfill import BackfillCommand
+from video.models import Video
+from video.storage import videos_sharing_content
+from video.tasks import transcription_source
+
+
+def transcribe_file(path, model_name):
+    """Transcribe one file, loading the Whisper model once per worker process"""
+    model = whisper_models.get_model(model_name)
+    return model.transcribe(audio.whisper_input(path), **whisper_models.transcribe_options(model_name))
+
+
+class Command(BackfillCommand):
+    help = 'Transcribes videos that have no transcript yet using OpenAI Whisper.'
+    checkpoint_name = 'video-transcripts'
+    update_fields = ['processing_status']
+    work = transcribe_file
+    default_workers = 1
+    default_batch_size = 10
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--model', default=None, help='Whisper model name (defaults to WHISPER_MODEL).')
+
+    def handle(self, *args, **options):
+        self.model_name = options['model']
+        super().handle(*args, **options)
+
+    def get_queryset(self):
+        return Video.objects.filter(transcript__isnull=True).exclude(video_file='')
+
+    def get_work_args(self, obj):
+        if not os.path.exists(obj.video_file.path):
+            return None
+        return (transcription_source(obj), self.model_name)
+
+    def apply_result(self, obj, result):
+        obj.whisper_result = result
+        if obj.processing_status in ('processing', 'transcribing', 'failed'):
+            obj.processing_status = 'ready'
+        return True
+
+    def save_batch(self, objs):
+        for obj in objs:
+            transcripts.save_transcript(videos_sharing_content(obj), obj.whisper_result)
+        super().save_batch(objs)
@@ -0,0 +1,33 @@
+from datetime import timedelta
+import os
+from video.management.backfill import BackfillCommand
+from video.models import Video, VideoMetadata
+from video.probe import probe_media
+
+
+class Command(BackfillCommand):
+    help = 'Probes videos that have no stored media metadata.'
+    checkpoint_name = 'video-metadata'
+    update_fields = ['duration']
+    work = probe_media
+
+    def get_queryset(self):
+        return Video.objects.filter(metadata__isnull=True).exclude(video_file='').only('pk', 'video_file', 'duration')
+
+    def get_work_args(self, obj):
+        if not os.path.exists(obj.video_file.path):
+            return None
+        return (obj.video_file.path,)
+
+    def apply_result(self, obj, result):
+        obj.probed_metadata = result
+        if result.get('duration'):
+            obj.duration = timedelta(seconds=result['duration'])
+        return True
+
+    def save_batch(self, objs):
+        VideoMetadata.objects.bulk_create(
+            [VideoMetadata(video=obj, **obj.probed_metadata) for obj in objs],
+            ignore_conflicts=True
+        )
+        Video.objects.bulk_update(objs, self.update_fields)
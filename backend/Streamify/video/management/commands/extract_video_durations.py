@@ -1,37 +1,26 @@
-from django.core.management.base import BaseCommand
 from datetime import timedelta
-import ffmpeg
 import os
+from video.management.backfill import BackfillCommand
 from video.models import Video
+from video.probe import probe_duration
 
-class Command(BaseCommand):
-    def extract_video_duration(self, video_file_path):
-        try:
-            if not os.path.exists(video_file_path):
-                return None
-                
-            probe = ffmpeg.probe(video_file_path)
 
-            for stream in probe['streams']:
-                if stream['codec_type'] == 'video':
-                    if 'duration' in stream:
-                        duration = float(stream['duration'])
-                        return timedelta(seconds=duration)
-            
-            if 'format' in probe and 'duration' in probe['format']:
-                duration = float(probe['format']['duration'])
-                return timedelta(seconds=duration)
-                
-            return None
-        except Exception:
+class Command(BackfillCommand):
+    help = 'Fills in Video.duration for videos that do not have one yet.'
+    checkpoint_name = 'video-durations'
+    update_fields = ['duration']
+    work = probe_duration
+
+    def get_queryset(self):
+        return Video.objects.filter(duration__isnull=True).exclude(video_file='').only('pk', 'video_file')
+
+    def get_work_args(self, obj):
+        if not os.path.exists(obj.video_file.path):
             return None
+        return (obj.video_file.path,)
 
-    def handle(self, *args, **options):
-        videos_without_duration = Video.objects.filter(duration__isnull=True)
-        
-        for video in videos_without_duration:
-            if video.video_file:
-                duration = self.extract_video_duration(video.video_file.path)
-                if duration:
-                    video.duration = duration
-                    video.save()
\ No newline at end of file
+    def apply_result(self, obj, result):
+        if not result:
+            return False
+        obj.duration = timedelta(seconds=result)
+        return True
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from video.models import Transcript
+from video.search import index_transcript
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the transcript search index from the stored transcript segments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*', type=int, help='Only reindex these videos.')
+
+    def handle(self, *args, **options):
+        transcripts = Transcript.objects.order_by('pk')
+        if options['video_ids']:
+            transcripts = transcripts.filter(video_id__in=options['video_ids'])
+
+        count = postings = 0
+        for transcript in transcripts.iterator():
+            postings += index_transcript(transcript)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} transcripts ({postings} postings).'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from video.models import Video
+from video.search import index_video
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the metadata search index (title, description, uploader) for all videos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*', type=int, help='Only reindex these videos.')
+
+    def handle(self, *args, **options):
+        videos = Video.objects.select_related('uploader').order_by('pk')
+        if options['video_ids']:
+            videos = videos.filter(pk__in=options['video_ids'])
+
+        count = 0
+        for video in videos.iterator():
+            index_video(video)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} videos.'))
@@ -1,7 +1,8 @@
-import whisper
-import torch
 from django.core.management.base import BaseCommand
 from video.models import Video
+from video import audio, transcripts, whisper_models
+from video.storage import videos_sharing_content
+from video.tasks import transcription_source
 import logging
 import os
 
@@ -34,22 +35,18 @@ class Command(BaseCommand):
         video.save()
 
         try:
-            # Check for GPU
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.stdout.write(f"Using device: {device}")
-
-            # Load the model
-            # Model options: "tiny", "base", "small", "medium", "large"
-            # "base" is a good starting point.
-            model = whisper.load_model("base", device=device)
+            self.stdout.write(f"Using device: {whisper_models.resolve_device()}")
+
+            # Load the model (WHISPER_MODEL, "base" by default)
+            model = whisper_models.get_model()
             
             self.stdout.write("Model loaded. Starting transcription process...")
 
-            # Transcribe the video
-            result = model.transcribe(video.video_file.path, verbose=True)
+            # Transcribe the extracted audio if present, otherwise the video
+            result = model.transcribe(audio.whisper_input(transcription_source(video)), verbose=True, **whisper_models.transcribe_options())
 
             # Save the transcript
-            video.transcript = result
+            transcripts.save_transcript(videos_sharing_content(video), result)
             video.processing_status = 'ready'
             video.save()
             
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from video import detail_cache
+
+
+class Command(BaseCommand):
+    help = 'Shows hit ratio and recomputation counts of the video detail and stats caches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after showing them.')
+
+    def handle(self, *args, **options):
+        for name, events in detail_cache.metrics().items():
+            # Stale and coalesced answers still spare the database
+            served = events['hits'] + events['stale_served']
+            lookups = served + events['misses'] + events['early_refreshes']
+            ratio = served / lookups if lookups else 0.0
+            details = ', '.join(f'{event} {count}' for event, count in events.items())
+            self.stdout.write(f'{name}: hit ratio {ratio:.1%} ({details})')
+
+        if options['reset']:
+            detail_cache.reset_metrics()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0003_video_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='trickplay_vtt',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=''),
+        ),
+    ]
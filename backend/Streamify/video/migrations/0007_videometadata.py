@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0006_mediablob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('container', models.CharField(blank=True, max_length=100)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('bit_rate', models.PositiveIntegerField(blank=True, null=True)),
+                ('video_codec', models.CharField(blank=True, max_length=50)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('fps', models.FloatField(blank=True, null=True)),
+                ('pixel_format', models.CharField(blank=True, max_length=50)),
+                ('video_bit_rate', models.PositiveIntegerField(blank=True, null=True)),
+                ('audio_codec', models.CharField(blank=True, max_length=50)),
+                ('audio_channels', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('audio_sample_rate', models.PositiveIntegerField(blank=True, null=True)),
+                ('audio_bit_rate', models.PositiveIntegerField(blank=True, null=True)),
+                ('keyframe_interval', models.FloatField(blank=True, null=True)),
+                ('probed_at', models.DateTimeField(auto_now=True)),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='metadata', to='video.video')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0008_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='audio_file',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='waveform',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=''),
+        ),
+    ]
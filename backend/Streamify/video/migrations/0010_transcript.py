@@ -0,0 +1,93 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_transcripts(apps, schema_editor):
+    """Copy the Whisper result stored on each video into the segment tables"""
+    Video = apps.get_model('video', 'Video')
+    Transcript = apps.get_model('video', 'Transcript')
+    TranscriptSegment = apps.get_model('video', 'TranscriptSegment')
+    rows = Video.objects.exclude(legacy_transcript=None).values_list('pk', 'legacy_transcript')
+    for video_id, result in rows.iterator():
+        if not isinstance(result, dict):
+            continue
+        segments = result.get('segments') or []
+        transcript = Transcript.objects.create(
+            video_id=video_id,
+            language=result.get('language') or '',
+            text=result.get('text') or ''.join(s.get('text', '') for s in segments),
+        )
+        TranscriptSegment.objects.bulk_create([
+            TranscriptSegment(
+                transcript=transcript,
+                index=index,
+                start=segment.get('start') or 0,
+                end=segment.get('end') or 0,
+                text=segment.get('text', ''),
+            )
+            for index, segment in enumerate(segments)
+        ])
+
+
+def restore_transcripts(apps, schema_editor):
+    Transcript = apps.get_model('video', 'Transcript')
+    Video = apps.get_model('video', 'Video')
+    for transcript in Transcript.objects.prefetch_related('segments').iterator(chunk_size=100):
+        Video.objects.filter(pk=transcript.video_id).update(legacy_transcript={
+            'text': transcript.text,
+            'language': transcript.language,
+            'segments': [
+                {'id': s.index, 'start': s.start, 'end': s.end, 'text': s.text}
+                for s in transcript.segments.all()
+            ],
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0009_video_audio_waveform'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='video',
+            old_name='transcript',
+            new_name='legacy_transcript',
+        ),
+        migrations.CreateModel(
+            name='Transcript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(blank=True, max_length=20)),
+                ('text', models.TextField(blank=True)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('tokens', models.BinaryField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='transcript', to='video.video')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TranscriptSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('start', models.FloatField()),
+                ('end', models.FloatField()),
+                ('text', models.TextField()),
+                ('transcript', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='video.transcript')),
+            ],
+            options={
+                'ordering': ['index'],
+                'unique_together': {('transcript', 'index')},
+            },
+        ),
+        migrations.RunPython(move_transcripts, restore_transcripts),
+        migrations.RemoveField(
+            model_name='video',
+            name='legacy_transcript',
+        ),
+    ]
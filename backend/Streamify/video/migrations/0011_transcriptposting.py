@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0010_transcript'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('start', models.FloatField()),
+                ('term_frequency', models.PositiveSmallIntegerField(default=1)),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='video.transcriptsegment')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transcript_postings', to='video.video')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'video'], name='video_posting_term_idx')],
+            },
+        ),
+    ]
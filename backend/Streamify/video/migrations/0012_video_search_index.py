@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0011_transcriptposting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('length', models.PositiveIntegerField(default=0)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='video.video')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VideoSearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64)),
+                ('term_frequency', models.PositiveSmallIntegerField(default=1)),
+                ('document_length', models.PositiveIntegerField(default=0)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='video.video')),
+            ],
+            options={
+                'unique_together': {('term', 'video')},
+            },
+        ),
+    ]
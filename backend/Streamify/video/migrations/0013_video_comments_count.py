@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0012_video_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
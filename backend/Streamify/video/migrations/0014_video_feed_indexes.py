@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_users_profile_photo'),
+        ('video', '0013_video_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['visibility', 'processing_status', 'created_at', 'id'], name='video_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['uploader', 'created_at', 'id'], name='video_uploader_feed_idx'),
+        ),
+    ]
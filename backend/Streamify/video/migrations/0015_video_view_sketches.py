@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0014_video_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoViewFilter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current', models.BinaryField()),
+                ('previous', models.BinaryField(blank=True, null=True)),
+                ('rotated_at', models.DateTimeField()),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='view_filter', to='video.video')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VideoViewSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('viewers', models.BinaryField()),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_sketches', to='video.video')),
+            ],
+            options={
+                'unique_together': {('video', 'day')},
+            },
+        ),
+    ]
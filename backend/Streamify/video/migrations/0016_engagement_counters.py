@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0015_video_view_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngagementCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('video', 'Video'), ('comment', 'Comment')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('field', models.CharField(max_length=20)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id', 'field', 'shard'), name='engagement_counter_shard')],
+            },
+        ),
+    ]
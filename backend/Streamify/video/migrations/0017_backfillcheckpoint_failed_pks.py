@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0016_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backfillcheckpoint',
+            name='failed_pks',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
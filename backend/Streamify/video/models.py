@@ -1,6 +1,7 @@
 from django.db import models
 from accounts.models import Users
 import os
+import uuid
 from django.utils import timezone
 
 def video_upload_path(instance, filename):
@@ -13,6 +14,32 @@ def thumbnail_upload_path(instance, filename):
     filename = f"thumb_{instance.title}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{ext}"
     return os.path.join('thumbnails/', filename)
 
+def blob_upload_path(sha256, ext):
+    """Content-addressed location of a media file, fanned out by hash prefix"""
+    return os.path.join('blobs', sha256[:2], sha256[2:4], f"{sha256}.{ext.lstrip('.').lower()}")
+
+def video_asset_dir(video):
+    """
+    Directory (relative to MEDIA_ROOT) holding files derived from a video.
+    
+    Videos backed by a MediaBlob share their artifacts with every other video
+    pointing at the same content.
+    """
+    if video.blob_id:
+        return os.path.join('derived', video.blob.sha256)
+    return os.path.join('derived', str(video.pk))
+
+class MediaBlob(models.Model):
+    """A stored media file, addressed by its SHA-256 and shared by reference"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    size = models.BigIntegerField()  # in bytes
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
 class Video(models.Model):
     VISIBILITY_CHOICES = [
         ('public', 'Public'),
@@ -32,21 +59,31 @@ class Video(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     video_file = models.FileField(upload_to=video_upload_path)
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='videos')
     thumbnail = models.ImageField(upload_to=thumbnail_upload_path, blank=True, null=True)
     uploader = models.ForeignKey(Users, on_delete=models.CASCADE, related_name='videos')
     views = models.PositiveIntegerField(default=0)
     likes = models.PositiveIntegerField(default=0)
     dislikes = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)  # comments and replies, maintained by comments.signals
     duration = models.DurationField(blank=True, null=True)
     file_size = models.BigIntegerField(blank=True, null=True)  # in bytes
     visibility = models.CharField(max_length=10, choices=VISIBILITY_CHOICES, default='public')
     processing_status = models.CharField(max_length=20, choices=PROCESSING_STATUS_CHOICES, default='uploading')
-    transcript = models.JSONField(blank=True, null=True)
+    hls_manifest = models.FileField(max_length=255, blank=True, null=True)  # master playlist, set by generate_hls_task
+    trickplay_vtt = models.FileField(max_length=255, blank=True, null=True)  # thumbnail track, set by generate_trickplay_task
+    audio_file = models.FileField(max_length=255, blank=True, null=True)  # 16 kHz mono WAV, set by extract_audio_task
+    waveform = models.FileField(max_length=255, blank=True, null=True)  # peaks JSON, set by extract_audio_task
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the public feed and of a user's videos
+            models.Index(fields=['visibility', 'processing_status', 'created_at', 'id'], name='video_feed_idx'),
+            models.Index(fields=['uploader', 'created_at', 'id'], name='video_uploader_feed_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -77,6 +114,140 @@ class Video(models.Model):
             return f"{self.file_size:.1f} TB"
         return "Unknown"
 
+class VideoMetadata(models.Model):
+    """Technical details of a video's media file, filled in by probe_video_task"""
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='metadata')
+    container = models.CharField(max_length=100, blank=True)
+    duration = models.FloatField(blank=True, null=True)  # in seconds
+    bit_rate = models.PositiveIntegerField(blank=True, null=True)  # overall, bits per second
+    video_codec = models.CharField(max_length=50, blank=True)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    fps = models.FloatField(blank=True, null=True)
+    pixel_format = models.CharField(max_length=50, blank=True)
+    video_bit_rate = models.PositiveIntegerField(blank=True, null=True)
+    audio_codec = models.CharField(max_length=50, blank=True)
+    audio_channels = models.PositiveSmallIntegerField(blank=True, null=True)
+    audio_sample_rate = models.PositiveIntegerField(blank=True, null=True)
+    audio_bit_rate = models.PositiveIntegerField(blank=True, null=True)
+    keyframe_interval = models.FloatField(blank=True, null=True)  # average seconds between keyframes
+    probed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Metadata for {self.video.title}"
+    
+    @property
+    def has_audio(self):
+        return bool(self.audio_codec)
+
+class VideoRendition(models.Model):
+    """One rung of a video's HLS bitrate ladder"""
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=20)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    bandwidth = models.PositiveIntegerField()  # peak bits per second, as advertised in the master playlist
+    playlist = models.FileField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['height']
+        unique_together = ('video', 'name')
+    
+    def __str__(self):
+        return f"{self.video.title} ({self.name})"
+
+class Transcript(models.Model):
+    """A video's Whisper transcript, kept out of the Video row"""
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='transcript')
+    language = models.CharField(max_length=20, blank=True)
+    text = models.TextField(blank=True)
+    version = models.PositiveIntegerField(default=1)  # bumped every time the transcript is replaced
+    tokens = models.BinaryField(blank=True, null=True)  # zlib-packed token ids, only with TRANSCRIPT_STORE_TOKENS
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Transcript for {self.video.title}"
+
+class TranscriptSegment(models.Model):
+    """One timed segment of a transcript"""
+    transcript = models.ForeignKey(Transcript, on_delete=models.CASCADE, related_name='segments')
+    index = models.PositiveIntegerField()
+    start = models.FloatField()  # in seconds
+    end = models.FloatField()
+    text = models.TextField()
+    
+    class Meta:
+        ordering = ['index']
+        unique_together = ('transcript', 'index')
+    
+    def __str__(self):
+        return f"{self.transcript.video.title} [{self.start:.1f}s]"
+
+class TranscriptPosting(models.Model):
+    """Inverted index entry: a term occurring in one transcript segment"""
+    term = models.CharField(max_length=64)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='transcript_postings')
+    segment = models.ForeignKey(TranscriptSegment, on_delete=models.CASCADE, related_name='postings')
+    start = models.FloatField()  # segment start, copied so hits don't need the segment row
+    term_frequency = models.PositiveSmallIntegerField(default=1)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'video'], name='video_posting_term_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} @ {self.start:.1f}s"
+
+class VideoSearchDocument(models.Model):
+    """Per-video statistics for metadata search (BM25 document length)"""
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='search_document')
+    length = models.PositiveIntegerField(default=0)  # weighted term count of title, description and uploader
+    indexed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Search document for {self.video.title}"
+
+class VideoSearchPosting(models.Model):
+    """Inverted index entry for metadata search: a term in a video's title, description or uploader"""
+    term = models.CharField(max_length=64, db_index=True)  # also gets a LIKE index for prefix matching
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='search_postings')
+    term_frequency = models.PositiveSmallIntegerField(default=1)  # field-weighted
+    document_length = models.PositiveIntegerField(default=0)  # copied from VideoSearchDocument for scoring
+    
+    class Meta:
+        unique_together = ('term', 'video')
+    
+    def __str__(self):
+        return f"{self.term} in video {self.video_id}"
+
+class UploadSession(models.Model):
+    """A resumable, chunked video upload in progress"""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('completed', 'Completed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploader = models.ForeignKey(Users, on_delete=models.CASCADE, related_name='upload_sessions')
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    visibility = models.CharField(max_length=10, choices=Video.VISIBILITY_CHOICES, default='public')
+    filename = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=255)  # relative to MEDIA_ROOT
+    upload_length = models.BigIntegerField()  # in bytes
+    offset = models.BigIntegerField(default=0)  # bytes received so far
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Upload of {self.filename} by {self.uploader.username} ({self.offset}/{self.upload_length})"
+
 class VideoLike(models.Model):
     REACTION_CHOICES = [
         ('like', 'Like'),
@@ -105,3 +276,61 @@ class VideoView(models.Model):
     
     def __str__(self):
         return f"View of {self.video.title} by {self.user.username if self.user else self.ip_address}"
+
+class VideoViewSketch(models.Model):
+    """HyperLogLog of the viewers of a video on one day, see video.sketches"""
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='view_sketches')
+    day = models.DateField()
+    viewers = models.BinaryField()
+    
+    class Meta:
+        unique_together = ('video', 'day')
+    
+    def __str__(self):
+        return f"Viewers of {self.video_id} on {self.day}"
+
+class VideoViewFilter(models.Model):
+    """Rotating Bloom filter of the viewers already counted recently"""
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name='view_filter')
+    current = models.BinaryField()
+    previous = models.BinaryField(blank=True, null=True)
+    rotated_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Recent viewers of {self.video_id}"
+
+class EngagementCounter(models.Model):
+    """
+    One shard of a like/dislike counter of a video or comment, see
+    video.counters. Shards hold signed deltas until they are compacted into
+    the object's own column.
+    """
+    KIND_CHOICES = [
+        ('video', 'Video'),
+        ('comment', 'Comment'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    field = models.CharField(max_length=20)
+    shard = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id', 'field', 'shard'], name='engagement_counter_shard'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {self.field}[{self.shard}] {self.value:+d}"
+
+class BackfillCheckpoint(models.Model):
+    """Progress of a resumable backfill management command"""
+    name = models.CharField(max_length=100, unique=True)
+    last_pk = models.BigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed_pks = models.JSONField(default=list, blank=True)  # rows to retry with --retry-failed
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} at pk {self.last_pk}"
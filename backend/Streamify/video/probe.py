@@ -0,0 +1,114 @@
+import os
+from fractions import Fraction
+
+import ffmpeg
+
+# Only the start of the file is scanned to estimate the keyframe interval
+KEYFRAME_SCAN_SECONDS = 60
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _frame_rate(stream):
+    """Parse ffprobe's rational frame rate ('30000/1001')"""
+    for key in ('avg_frame_rate', 'r_frame_rate'):
+        try:
+            rate = Fraction(stream.get(key) or '')
+        except (ValueError, ZeroDivisionError):
+            continue
+        if rate > 0:
+            return round(float(rate), 3)
+    return None
+
+
+def keyframe_interval(path, scan_seconds=KEYFRAME_SCAN_SECONDS):
+    """Average seconds between keyframes over the first ``scan_seconds``"""
+    probe = ffmpeg.probe(
+        path,
+        select_streams='v:0',
+        skip_frame='nokey',
+        show_entries='frame=pts_time,best_effort_timestamp_time',
+        read_intervals=f'%+{scan_seconds}',
+    )
+    times = []
+    for frame in probe.get('frames', []):
+        time = _to_float(frame.get('pts_time') or frame.get('best_effort_timestamp_time'))
+        if time is not None:
+            times.append(time)
+    if len(times) < 2:
+        return None
+    return round((times[-1] - times[0]) / (len(times) - 1), 3)
+
+
+def probe_duration(path):
+    """Duration of a media file in seconds, or None if it can't be determined"""
+    probe = ffmpeg.probe(path)
+    for stream in probe.get('streams', []):
+        if stream.get('codec_type') == 'video' and _to_float(stream.get('duration')):
+            return float(stream['duration'])
+    return _to_float(probe.get('format', {}).get('duration'))
+
+
+def extract_frame(source_path, output_path, at_seconds, name=None):
+    """
+    Write a single JPEG frame taken ``at_seconds`` into the video.
+
+    Returns ``name`` (or ``output_path``) so callers can store the result.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    (
+        ffmpeg
+        .input(source_path, ss=max(at_seconds, 0))
+        .output(output_path, vframes=1, **{'q:v': 3})
+        .run(quiet=True, overwrite_output=True)
+    )
+    return name or output_path
+
+
+def probe_media(path):
+    """
+    Probe a media file and return the fields stored on VideoMetadata.
+
+    Raises ValueError if the file has no video stream.
+    """
+    probe = ffmpeg.probe(path)
+    streams = probe.get('streams', [])
+    fmt = probe.get('format', {})
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    if video_stream is None:
+        raise ValueError('No video stream found')
+
+    try:
+        keyframes = keyframe_interval(path)
+    except ffmpeg.Error:
+        keyframes = None
+
+    return {
+        'container': fmt.get('format_name', ''),
+        'duration': _to_float(video_stream.get('duration')) or _to_float(fmt.get('duration')),
+        'bit_rate': _to_int(fmt.get('bit_rate')),
+        'video_codec': video_stream.get('codec_name', ''),
+        'width': _to_int(video_stream.get('width')),
+        'height': _to_int(video_stream.get('height')),
+        'fps': _frame_rate(video_stream),
+        'pixel_format': video_stream.get('pix_fmt', ''),
+        'video_bit_rate': _to_int(video_stream.get('bit_rate')),
+        'audio_codec': audio_stream.get('codec_name', '') if audio_stream else '',
+        'audio_channels': _to_int(audio_stream.get('channels')) if audio_stream else None,
+        'audio_sample_rate': _to_int(audio_stream.get('sample_rate')) if audio_stream else None,
+        'audio_bit_rate': _to_int(audio_stream.get('bit_rate')) if audio_stream else None,
+        'keyframe_interval': keyframes,
+    }
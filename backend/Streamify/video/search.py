@@ -0,0 +1,296 @@
+import hashlib
+import math
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Case, Count, ExpressionWrapper, F, FloatField, IntegerField, Q, Sum, Value, When
+
+from .models import (
+    Transcript, TranscriptPosting, TranscriptSegment, VideoSearchDocument, VideoSearchPosting
+)
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its of on or so
+    that the their there they this to was we were what when which who will with
+    you your
+""".split())
+
+SNIPPET_LENGTH = 160
+MAX_RESULTS = 200  # ranked videos a transcript search pages through
+HITS_PER_VIDEO = 5
+
+# Metadata search: a title word counts three times as much as a description word
+FIELD_WEIGHTS = (('title', 3), ('description', 1), ('uploader', 2))
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_PREFIX_LENGTH = 3
+PREFIX_WEIGHT = 0.5  # relative weight of 'pyth' matching 'python'
+MAX_EXPANSIONS = 50
+METADATA_MAX_RESULTS = 200
+SEARCH_CACHE_TIMEOUT = 60
+SEARCH_VERSION_KEY = 'video-search:version'
+TRANSCRIPT_VERSION_KEY = 'transcript-search:version'
+
+
+def tokenize(text):
+    """Lowercased word terms of ``text`` without stop words"""
+    return [
+        term for term in TOKEN_RE.findall(text.lower())
+        if term not in STOP_WORDS and len(term) <= MAX_TERM_LENGTH
+    ]
+
+
+def index_transcript(transcript):
+    """Replace the postings of a transcript's video with its current segments"""
+    postings = []
+    for segment in TranscriptSegment.objects.filter(transcript=transcript).values('pk', 'start', 'text'):
+        for term, frequency in Counter(tokenize(segment['text'])).items():
+            postings.append(TranscriptPosting(
+                term=term,
+                video_id=transcript.video_id,
+                segment_id=segment['pk'],
+                start=segment['start'],
+                term_frequency=min(frequency, 32767),
+            ))
+    with transaction.atomic():
+        TranscriptPosting.objects.filter(video_id=transcript.video_id).delete()
+        TranscriptPosting.objects.bulk_create(postings, batch_size=1000)
+    bump_search_version(TRANSCRIPT_VERSION_KEY)
+    return len(postings)
+
+
+def _transcript_count():
+    """Number of transcripts for IDF, cached until the transcript index changes"""
+    version = cache.get_or_set(TRANSCRIPT_VERSION_KEY, 1, None)
+    return cache.get_or_set(
+        f'transcript-search:count:{version}', Transcript.objects.count, SEARCH_CACHE_TIMEOUT
+    )
+
+
+def make_snippet(text, terms, length=SNIPPET_LENGTH):
+    """A window of ``text`` around the first query term it contains"""
+    if len(text) <= length:
+        return text
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms if term in lowered]
+    first = min(positions) if positions else 0
+    begin = max(first - length // 3, 0)
+    snippet = text[begin:begin + length].strip()
+    if begin > 0:
+        snippet = '…' + snippet
+    if begin + length < len(text):
+        snippet += '…'
+    return snippet
+
+
+def rank_transcripts(query, videos=None, limit=MAX_RESULTS):
+    """
+    Rank videos by how well their transcripts match ``query``.
+
+    Videos matching more distinct query terms come first, then by TF-IDF
+    score. Only the postings of the query terms are read, so the cost depends
+    on how common the terms are rather than on the size of the library.
+    ``videos`` optionally restricts the search to a Video queryset.
+
+    Returns up to ``limit`` ``{'video_id', 'score'}``, best match first.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    postings = TranscriptPosting.objects.filter(term__in=terms)
+    if videos is not None:
+        postings = postings.filter(video__in=videos)
+
+    total = _transcript_count() or 1
+    document_frequency = dict(
+        postings.values('term').annotate(n=Count('video', distinct=True)).values_list('term', 'n')
+    )
+    if not document_frequency:
+        return []
+    weights = [
+        When(term=term, then=ExpressionWrapper(
+            F('term_frequency') * math.log(1 + (total - n + 0.5) / (n + 0.5)),
+            output_field=FloatField(),
+        ))
+        for term, n in document_frequency.items()
+    ]
+    ranked = (
+        postings.values('video')
+        .annotate(matched=Count('term', distinct=True), score=Sum(Case(*weights, output_field=FloatField())))
+        .order_by('-matched', '-score', 'video')[:limit]
+    )
+    return [{'video_id': row['video'], 'score': round(row['score'] or 0, 4)} for row in ranked]
+
+
+def transcript_matches(query, video_ids, hits_per_video=HITS_PER_VIDEO):
+    """
+    The segments of each video's transcript containing the most query terms,
+    as ``{video_id: [{'start', 'end', 'text'}]}`` in time order.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms or not video_ids:
+        return {}
+
+    # Segments with the most distinct query terms are the best places to jump to
+    hits = {}
+    segment_rows = (
+        TranscriptPosting.objects.filter(term__in=terms, video_id__in=video_ids)
+        .values('video', 'segment', 'start')
+        .annotate(matched=Count('term', distinct=True))
+        .order_by('video', '-matched', 'start')
+    )
+    for row in segment_rows:
+        video_hits = hits.setdefault(row['video'], [])
+        if len(video_hits) < hits_per_video:
+            video_hits.append(row['segment'])
+
+    segments = TranscriptSegment.objects.in_bulk(
+        [segment_id for segment_ids in hits.values() for segment_id in segment_ids]
+    )
+    matches = {}
+    for video_id, segment_ids in hits.items():
+        found = sorted((segments[pk] for pk in segment_ids if pk in segments), key=lambda s: s.start)
+        matches[video_id] = [{'start': s.start, 'end': s.end, 'text': make_snippet(s.text, terms)} for s in found]
+    return matches
+
+
+def _video_fields(video):
+    return {
+        'title': video.title or '',
+        'description': video.description or '',
+        'uploader': video.uploader.username if video.uploader_id else '',
+    }
+
+
+def index_video(video):
+    """Replace the metadata search postings of one video"""
+    fields = _video_fields(video)
+    frequencies = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize(fields[field]):
+            frequencies[term] += weight
+    length = sum(frequencies.values())
+
+    with transaction.atomic():
+        VideoSearchPosting.objects.filter(video=video).delete()
+        VideoSearchDocument.objects.update_or_create(video=video, defaults={'length': length})
+        VideoSearchPosting.objects.bulk_create([
+            VideoSearchPosting(
+                term=term,
+                video=video,
+                term_frequency=min(frequency, 32767),
+                document_length=length,
+            )
+            for term, frequency in frequencies.items()
+        ])
+    bump_search_version()
+
+
+def bump_search_version(key=SEARCH_VERSION_KEY):
+    """Invalidate every cached metadata search result, or what is cached under another index's ``key``"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _collection_stats(version):
+    """Document count and average length, cached until the index changes"""
+    key = f'video-search:stats:{version}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = VideoSearchDocument.objects.aggregate(total=Count('pk'), average=Avg('length'))
+        stats['average'] = stats['average'] or 1.0
+        cache.set(key, stats, SEARCH_CACHE_TIMEOUT)
+    return stats
+
+
+def _expand_terms(terms):
+    """
+    Map index terms to the weight of the query term they match.
+
+    Query terms of MIN_PREFIX_LENGTH or more characters also match longer
+    index terms starting with them, at PREFIX_WEIGHT. Returns
+    ``{index_term: (weight, document_frequency)}``.
+    """
+    condition = Q()
+    for term in terms:
+        condition |= Q(term=term)
+        if len(term) >= MIN_PREFIX_LENGTH:
+            condition |= Q(term__startswith=term)
+    # The query terms themselves come first so the limit only drops prefix matches
+    rows = (
+        VideoSearchPosting.objects.filter(condition)
+        .values('term').annotate(n=Count('video'))
+        .order_by(Case(When(term__in=terms, then=Value(0)), default=Value(1)), '-n')[:MAX_EXPANSIONS * len(terms)]
+    )
+    expanded = {}
+    for row in rows:
+        weight = 1.0 if row['term'] in terms else PREFIX_WEIGHT
+        expanded[row['term']] = (weight, row['n'])
+    return expanded
+
+
+def search_videos(query, videos=None, limit=METADATA_MAX_RESULTS):
+    """
+    Rank videos by BM25 over their title, description and uploader.
+
+    ``videos`` optionally restricts results to a Video queryset. Returns video
+    ids, best match first. Results are cached for SEARCH_CACHE_TIMEOUT seconds
+    and dropped as soon as any video is reindexed.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    version = cache.get_or_set(SEARCH_VERSION_KEY, 1, None)
+    scope = str(videos.query) if videos is not None else ''
+    digest = hashlib.md5(f'{" ".join(terms)}|{scope}|{limit}'.encode()).hexdigest()
+    key = f'video-search:{version}:{digest}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    expanded = _expand_terms(terms)
+    if not expanded:
+        cache.set(key, [], SEARCH_CACHE_TIMEOUT)
+        return []
+
+    stats = _collection_stats(version)
+    total = stats['total'] or 1
+    # BM25 term weight: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+    scores = [
+        When(term=term, then=ExpressionWrapper(
+            F('term_frequency') * (weight * math.log(1 + (total - n + 0.5) / (n + 0.5)) * (BM25_K1 + 1))
+            / (F('term_frequency') + BM25_K1 * (1 - BM25_B) + F('document_length') * (BM25_K1 * BM25_B / stats['average'])),
+            output_field=FloatField(),
+        ))
+        for term, (weight, n) in expanded.items()
+    ]
+    postings = VideoSearchPosting.objects.filter(term__in=expanded)
+    if videos is not None:
+        postings = postings.filter(video__in=videos)
+    video_ids = list(
+        postings.values('video')
+        .annotate(score=Sum(Case(*scores, output_field=FloatField())))
+        .order_by('-score', '-video')
+        .values_list('video', flat=True)[:limit]
+    )
+    cache.set(key, video_ids, SEARCH_CACHE_TIMEOUT)
+    return video_ids
+
+
+def ranked(queryset, video_ids):
+    """Filter ``queryset`` to ``video_ids`` and keep their order"""
+    if not video_ids:
+        return queryset.none()
+    order = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(video_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=video_ids).order_by(order)
@@ -1,8 +1,15 @@
 from rest_framework import serializers
-from .models import Video, VideoLike
+from django.db import models
+from django.urls import reverse
+from .models import Video, VideoLike, VideoMetadata, UploadSession, Transcript, TranscriptSegment
+from . import counters
+from .streaming import stream_token, with_token
 from accounts.models import Users
 import os
 
+MAX_VIDEO_FILE_SIZE = 500 * 1024 * 1024  # 500MB
+ALLOWED_VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv']
+
 class UploaderSerializer(serializers.ModelSerializer):
     profile_photo = serializers.SerializerMethodField()
     
@@ -18,34 +25,155 @@ class UploaderSerializer(serializers.ModelSerializer):
             return obj.profile_photo.url
         return None
 
-class VideoSerializer(serializers.ModelSerializer):
+class VideoMetadataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoMetadata
+        fields = [
+            'container', 'duration', 'bit_rate', 'video_codec', 'width', 'height',
+            'fps', 'pixel_format', 'video_bit_rate', 'audio_codec', 'audio_channels',
+            'audio_sample_rate', 'audio_bit_rate', 'keyframe_interval'
+        ]
+
+class TranscriptSegmentSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='index', read_only=True)
+    
+    class Meta:
+        model = TranscriptSegment
+        fields = ['id', 'start', 'end', 'text']
+
+class TranscriptSerializer(serializers.ModelSerializer):
+    segments = TranscriptSegmentSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Transcript
+        fields = ['text', 'language', 'version', 'segments']
+
+def request_user(request):
+    """The Users row of the authenticated user, or None"""
+    if not request or not request.user.is_authenticated:
+        return None
+    if hasattr(request.user, 'users_instance'):
+        return request.user.users_instance
+    return Users.objects.filter(username=request.user.username).first()
+
+class VideoBatchListSerializer(serializers.ListSerializer):
+    """
+    Resolves user_reaction for a whole page of videos with one query instead
+    of one per row. With ``shared`` in the context it is left empty, for
+    payloads cached for every viewer.
+    """
+    def to_representation(self, data):
+        videos = list(data.all() if isinstance(data, models.Manager) else data)
+        video_ids = [video.pk for video in videos]
+        
+        user = None if self.context.get('shared') else request_user(self.context.get('request'))
+        if user is not None:
+            self.child.user_reactions = dict(
+                VideoLike.objects.filter(user=user, video_id__in=video_ids)
+                .values_list('video_id', 'reaction')
+            )
+        else:
+            self.child.user_reactions = {}
+        
+        return super().to_representation(videos)
+
+class VideoReactionFieldsMixin:
+    """
+    user_reaction read from the map filled in by VideoBatchListSerializer, or
+    looked up directly for a single video, and empty in payloads shared by
+    every viewer (``shared`` in the context). likes and dislikes include the
+    counter shards when the queryset used counters.with_totals().
+    """
+    def get_likes(self, obj):
+        return counters.total(obj, 'likes')
+    
+    def get_dislikes(self, obj):
+        return counters.total(obj, 'dislikes')
+    
+    def get_user_reaction(self, obj):
+        if self.context.get('shared'):
+            return None
+        if hasattr(self, 'user_reactions'):
+            return self.user_reactions.get(obj.pk)
+        user = request_user(self.context.get('request'))
+        if user is None:
+            return None
+        video_like = VideoLike.objects.filter(user=user, video=obj).first()
+        return video_like.reaction if video_like else None
+
+class VideoSerializer(VideoReactionFieldsMixin, serializers.ModelSerializer):
     uploader = UploaderSerializer(read_only=True)
+    metadata = VideoMetadataSerializer(read_only=True)
     video_url = serializers.SerializerMethodField()
+    hls_manifest_url = serializers.SerializerMethodField()
+    trickplay_url = serializers.SerializerMethodField()
+    waveform_url = serializers.SerializerMethodField()
+    captions_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
     formatted_duration = serializers.SerializerMethodField()
     formatted_file_size = serializers.ReadOnlyField()
+    likes = serializers.SerializerMethodField()
+    dislikes = serializers.SerializerMethodField()
     user_reaction = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Video
         fields = [
-            'id', 'title', 'description', 'video_url', 'thumbnail_url',
-            'uploader', 'views', 'likes', 'dislikes', 'duration',
-            'formatted_duration', 'file_size', 'formatted_file_size',
+            'id', 'title', 'description', 'video_url', 'hls_manifest_url',
+            'trickplay_url', 'waveform_url', 'captions_url', 'thumbnail_url', 'uploader', 'views', 'likes',
+            'dislikes', 'duration', 'formatted_duration', 'file_size', 'formatted_file_size',
             'visibility', 'processing_status', 'user_reaction', 'comments_count',
-            'transcript', 'created_at', 'updated_at'
+            'metadata', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['uploader', 'views', 'likes', 'dislikes', 'processing_status']
+        read_only_fields = ['uploader', 'views', 'likes', 'dislikes', 'comments_count', 'processing_status']
+        list_serializer_class = VideoBatchListSerializer
+    
+    def media_url(self, obj, url):
+        """
+        Absolute URL of one of the video's files. Players fetch these without
+        the Authorization header, so those of private videos carry a signed token.
+        """
+        if obj.visibility == 'private':
+            url = with_token(url, stream_token(obj.id))
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(url)
+        return url
     
     def get_video_url(self, obj):
         if obj.video_file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.video_file.url)
-            return obj.video_file.url
+            return self.media_url(obj, reverse('video-stream', kwargs={'video_id': obj.id}))
+        return None
+    
+    def get_hls_manifest_url(self, obj):
+        if obj.hls_manifest:
+            return self.media_url(obj, reverse('video-asset', kwargs={'video_id': obj.id, 'asset_path': 'hls/master.m3u8'}))
+        return None
+    
+    def get_trickplay_url(self, obj):
+        if obj.trickplay_vtt:
+            return self.media_url(obj, reverse('video-asset', kwargs={'video_id': obj.id, 'asset_path': 'trickplay/thumbnails.vtt'}))
         return None
     
+    def get_waveform_url(self, obj):
+        if obj.waveform:
+            return self.media_url(obj, reverse('video-asset', kwargs={'video_id': obj.id, 'asset_path': 'audio/peaks.json'}))
+        return None
+    
+    def get_captions_url(self, obj):
+        """
+        WebVTT captions, versioned so the response can be cached for good.
+        Querysets should annotate ``transcript_version`` to avoid a lookup.
+        """
+        if hasattr(obj, 'transcript_version'):
+            version = obj.transcript_version
+        else:
+            version = Transcript.objects.filter(video=obj).values_list('version', flat=True).first()
+        if version is None:
+            return None
+        url = reverse('video-captions', kwargs={'video_id': obj.id, 'caption_format': 'vtt'}) + f'?v={version}'
+        return self.media_url(obj, url)
+    
     def get_thumbnail_url(self, obj):
         if obj.thumbnail:
             request = self.context.get('request')
@@ -66,21 +194,30 @@ class VideoSerializer(serializers.ModelSerializer):
             else:
                 return f"{minutes}:{seconds:02d}"
         return "0:00"
+
+class VideoTranscriptSerializer(VideoSerializer):
+    """
+    Video with its transcript. Only used where the transcript is asked for;
+    querysets should prefetch 'transcript__segments'.
+    """
+    transcript = TranscriptSerializer(read_only=True)
     
-    def get_user_reaction(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                from accounts.models import Users
-                user = Users.objects.get(username=request.user.username)
-                video_like = VideoLike.objects.filter(user=user, video=obj).first()
-                return video_like.reaction if video_like else None
-            except Users.DoesNotExist:
-                pass
-        return None
+    class Meta(VideoSerializer.Meta):
+        fields = VideoSerializer.Meta.fields + ['transcript']
+
+class VideoSearchResultSerializer(VideoSerializer):
+    """Video with the transcript segments that matched a search"""
+    score = serializers.SerializerMethodField()
+    matches = serializers.SerializerMethodField()
+    
+    class Meta(VideoSerializer.Meta):
+        fields = VideoSerializer.Meta.fields + ['score', 'matches']
     
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+    def get_score(self, obj):
+        return getattr(obj, 'search_score', None)
+    
+    def get_matches(self, obj):
+        return getattr(obj, 'search_matches', [])
 
 class VideoUploadSerializer(serializers.ModelSerializer):
     video_file = serializers.FileField()
@@ -93,16 +230,14 @@ class VideoUploadSerializer(serializers.ModelSerializer):
     def validate_video_file(self, value):
         """Validate video file"""
         # Check file size (limit to 500MB)
-        max_size = 500 * 1024 * 1024  # 500MB
-        if value.size > max_size:
+        if value.size > MAX_VIDEO_FILE_SIZE:
             raise serializers.ValidationError("Video file size cannot exceed 500MB.")
         
         # Check file extension
-        allowed_extensions = ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv']
         ext = os.path.splitext(value.name)[1].lower()
-        if ext not in allowed_extensions:
+        if ext not in ALLOWED_VIDEO_EXTENSIONS:
             raise serializers.ValidationError(
-                f"Invalid video format. Allowed formats: {', '.join(allowed_extensions)}"
+                f"Invalid video format. Allowed formats: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"
             )
         
         return value
@@ -124,18 +259,52 @@ class VideoUploadSerializer(serializers.ModelSerializer):
         
         return value
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    upload_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'title', 'description', 'visibility', 'filename',
+            'upload_length', 'offset', 'upload_url', 'status', 'created_at'
+        ]
+        read_only_fields = ['offset', 'status', 'created_at']
+    
+    def get_upload_url(self, obj):
+        url = reverse('upload-session', kwargs={'session_id': obj.id})
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(url)
+        return url
+    
+    def validate_filename(self, value):
+        ext = os.path.splitext(value)[1].lower()
+        if ext not in ALLOWED_VIDEO_EXTENSIONS:
+            raise serializers.ValidationError(
+                f"Invalid video format. Allowed formats: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"
+            )
+        return os.path.basename(value)
+    
+    def validate_upload_length(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Upload length must be positive.")
+        if value > MAX_VIDEO_FILE_SIZE:
+            raise serializers.ValidationError("Video file size cannot exceed 500MB.")
+        return value
+
 class VideoLikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = VideoLike
         fields = ['reaction', 'created_at']
         read_only_fields = ['created_at']
 
-class VideoListSerializer(serializers.ModelSerializer):
+class VideoListSerializer(VideoReactionFieldsMixin, serializers.ModelSerializer):
     uploader = UploaderSerializer(read_only=True)
     thumbnail_url = serializers.SerializerMethodField()
     formatted_duration = serializers.SerializerMethodField()
+    likes = serializers.SerializerMethodField()
+    dislikes = serializers.SerializerMethodField()
     user_reaction = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Video
@@ -144,6 +313,7 @@ class VideoListSerializer(serializers.ModelSerializer):
             'likes', 'dislikes', 'formatted_duration', 'user_reaction',
             'comments_count', 'processing_status', 'created_at'
         ]
+        list_serializer_class = VideoBatchListSerializer
     
     def get_thumbnail_url(self, obj):
         if obj.thumbnail:
@@ -166,18 +336,3 @@ class VideoListSerializer(serializers.ModelSerializer):
             else:
                 return f"{minutes}:{seconds:02d}"
         return "0:00"
-
-    def get_user_reaction(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                from accounts.models import Users
-                user = Users.objects.get(username=request.user.username)
-                video_like = VideoLike.objects.filter(user=user, video=obj).first()
-                return video_like.reaction if video_like else None
-            except Users.DoesNotExist:
-                pass
-        return None
-    
-    def get_comments_count(self, obj):
-        return obj.comments.count()
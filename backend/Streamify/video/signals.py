@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Users
+from .models import Video
+from .detail_cache import bump_video_versions
+from .list_cache import bump_list_version
+from .search import TRANSCRIPT_VERSION_KEY, bump_search_version, index_video
+from .storage import release_blob
+
+SEARCH_FIELDS = {'title', 'description', 'uploader'}
+
+
+@receiver(post_delete, sender=Video)
+def release_video_blob(sender, instance, **kwargs):
+    """Drop the deleted video's reference to its content once the delete commits"""
+    if instance.blob_id:
+        blob_id = instance.blob_id
+        transaction.on_commit(lambda: release_blob(blob_id))
+
+
+@receiver(post_save, sender=Video)
+def index_video_metadata(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Keep the metadata search index in step with title, description and uploader"""
+    if raw or (update_fields is not None and not SEARCH_FIELDS & set(update_fields)):
+        return
+    index_video(instance)
+
+
+@receiver(post_delete, sender=Video)
+def drop_video_from_search(sender, instance, **kwargs):
+    # Postings and the transcript go with the video (cascade); cached results must go too
+    bump_search_version()
+    bump_search_version(TRANSCRIPT_VERSION_KEY)
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def drop_cached_pages(sender, instance, raw=False, **kwargs):
+    """Uploads, edits, status and visibility changes and deletes all show in list and detail pages"""
+    if not raw:
+        bump_list_version()
+        bump_video_versions([instance.pk])
+
+
+@receiver(post_save, sender=Users)
+def reindex_uploader_videos(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Uploader names are searchable, so renaming a user reindexes their videos"""
+    if raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    video_ids = []
+    for video in instance.videos.select_related('uploader'):
+        index_video(video)
+        video_ids.append(video.pk)
+    # Uploader names and photos are part of cached list and detail pages
+    bump_list_version()
+    bump_video_versions(video_ids)
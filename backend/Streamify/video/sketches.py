@@ -0,0 +1,113 @@
+import hashlib
+import math
+import zlib
+
+import numpy as np
+
+HLL_PRECISION = 12  # 4096 registers, about 1.6% standard error
+
+
+def _hash64(item):
+    return int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """
+    Cardinality estimate of a set of strings in 2**precision one-byte
+    registers. Sketches of the same precision merge by taking the register
+    maximum, so daily sketches add up to any longer window.
+    """
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, item):
+        value = _hash64(item)
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small sets
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return zlib.compress(self.registers.tobytes(), 6)
+
+    @classmethod
+    def from_bytes(cls, data, precision=HLL_PRECISION):
+        if not data:
+            return cls(precision)
+        registers = np.frombuffer(zlib.decompress(bytes(data)), dtype=np.uint8).copy()
+        return cls(int(math.log2(len(registers))), registers)
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and a false positive rate of about
+    ``error_rate`` up to ``capacity`` items.
+    """
+
+    def __init__(self, capacity, error_rate=0.01, bits=None):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def to_bytes(self):
+        return zlib.compress(self.bits.tobytes(), 6)
+
+    @classmethod
+    def from_bytes(cls, data, capacity, error_rate=0.01):
+        bloom = cls(capacity, error_rate)
+        if data:
+            bits = np.frombuffer(zlib.decompress(bytes(data)), dtype=np.uint8)
+            if len(bits) == len(bloom.bits):
+                bloom.bits = bits.copy()
+        return bloom
+
+
+class RotatingBloomFilter:
+    """
+    "Seen recently" as two Bloom filter generations. Lookups check both;
+    rotating drops the older one, so an item is remembered for between one
+    and two rotation periods.
+    """
+
+    def __init__(self, current, previous):
+        self.current = current
+        self.previous = previous
+
+    def __contains__(self, item):
+        return item in self.current or item in self.previous
+
+    def add(self, item):
+        self.current.add(item)
+
+    def rotate(self, capacity, error_rate=0.01):
+        self.previous = self.current
+        self.current = BloomFilter(capacity, error_rate)
@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from .models import MediaBlob, Video, VideoMetadata, VideoRendition, blob_upload_path
+from .transcripts import copy_transcript
+
+logger = logging.getLogger(__name__)
+
+
+def hash_uploaded_file(uploaded_file):
+    """SHA-256 of an UploadedFile, read in chunks"""
+    hasher = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        hasher.update(chunk)
+    uploaded_file.seek(0)
+    return hasher.hexdigest()
+
+
+def _file_extension(name):
+    return os.path.splitext(name)[1].lstrip('.').lower() or 'bin'
+
+
+def store_uploaded_file(uploaded_file):
+    """
+    Store an UploadedFile under its content hash and take a reference to it.
+
+    If the content is already stored the upload is dropped and the existing
+    blob is reused. Must be called inside a transaction together with the
+    creation of the Video that references the blob; the file is only written
+    once that transaction commits, so a rollback leaves nothing behind.
+    Returns (blob, created).
+    """
+    sha256 = hash_uploaded_file(uploaded_file)
+    blob, created = _acquire_blob(sha256, uploaded_file.size)
+    if created:
+        name = blob_upload_path(sha256, _file_extension(uploaded_file.name))
+        blob.file.name = name
+        blob.save(update_fields=['file'])
+        transaction.on_commit(lambda: _write_blob_file(name, uploaded_file))
+    return blob, created
+
+
+def _write_blob_file(name, uploaded_file):
+    # Same name, same content: a file left by an earlier attempt is kept
+    if not default_storage.exists(name):
+        # Storage moves temporary uploads into place instead of copying them
+        saved = default_storage.save(name, uploaded_file)
+        if saved != name:
+            logger.error(f'Blob file {name} was stored as {saved}.')
+
+
+def adopt_file(path, sha256):
+    """
+    Move a complete file on disk into content-addressed storage.
+
+    Used for resumable uploads whose hash was computed while receiving chunks.
+    Once the transaction commits the file is renamed into place, or deleted
+    if the content already exists; after a rollback it stays where it is.
+    Must be called inside a transaction. Returns (blob, created).
+    """
+    blob, created = _acquire_blob(sha256, os.path.getsize(path))
+    if created:
+        name = blob_upload_path(sha256, _file_extension(path))
+        blob.file.name = name
+        blob.save(update_fields=['file'])
+        transaction.on_commit(lambda: _move_into_place(path, os.path.join(settings.MEDIA_ROOT, name)))
+    else:
+        transaction.on_commit(lambda: os.remove(path))
+    return blob, created
+
+
+def _move_into_place(path, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+
+
+def _acquire_blob(sha256, size):
+    """Get or create the blob row for a hash (locked) and add a reference"""
+    blob, created = MediaBlob.objects.select_for_update().get_or_create(
+        sha256=sha256, defaults={'size': size}
+    )
+    MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    blob.ref_count += 1
+    return blob, created
+
+
+def release_blob(blob_id):
+    """
+    Drop one reference to a blob, deleting the file and everything derived
+    from it once the last reference is gone.
+    """
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            return
+        if Video.objects.filter(blob=blob).exists():
+            # Reference count drifted; never delete content still in use
+            logger.warning(f'Blob {blob.sha256} has videos but ref_count {blob.ref_count}; keeping it.')
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=Video.objects.filter(blob=blob).count())
+            return
+        file_path = blob.file.path if blob.file else None
+        derived_dir = os.path.join(settings.MEDIA_ROOT, 'derived', blob.sha256)
+        blob.delete()
+
+    try:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        shutil.rmtree(derived_dir, ignore_errors=True)
+    except OSError as e:
+        logger.error(f'Error deleting files for blob {blob.sha256}: {e}')
+
+
+def videos_sharing_content(video):
+    """All videos (including ``video``) backed by the same media file"""
+    if video.blob_id:
+        return Video.objects.filter(blob_id=video.blob_id)
+    return Video.objects.filter(pk=video.pk)
+
+
+def reuse_existing_processing(video):
+    """
+    Reuse the processing results of another video with the same content.
+
+    Copies duration, metadata, transcript, thumbnail and derived artifacts
+    (renditions, trickplay, extracted audio) from a ready sibling. If a
+    sibling is still being processed, the stages it already finished are
+    copied the same way and the video waits for the rest, whose tasks update
+    every video sharing the content.
+    Returns True if no processing needs to be queued for ``video``.
+    """
+    if not video.blob_id:
+        return False
+
+    siblings = Video.objects.filter(blob_id=video.blob_id).exclude(pk=video.pk)
+    source = siblings.filter(processing_status='ready').order_by('created_at').first()
+    if source is None:
+        source = siblings.filter(processing_status__in=['processing', 'transcribing']).order_by('created_at').first()
+        if source is None:
+            return False
+        copy_processing_results(source, video)
+        logger.info(f'Video ID {video.pk} waits for the processing of video ID {source.pk}.')
+        return True
+
+    copy_processing_results(source, video)
+    copy_transcript(source, video)
+    logger.info(f'Video ID {video.pk} reuses processing results of video ID {source.pk}.')
+    return True
+
+
+def copy_processing_results(source, video):
+    """
+    Give ``video`` the duration, metadata and derived artifacts ``source``
+    has so far, and its processing status.
+    """
+    video.duration = source.duration
+    video.hls_manifest = source.hls_manifest.name or None
+    video.trickplay_vtt = source.trickplay_vtt.name or None
+    video.audio_file = source.audio_file.name or None
+    video.waveform = source.waveform.name or None
+    if not video.thumbnail and source.thumbnail:
+        video.thumbnail = source.thumbnail.name
+    video.processing_status = source.processing_status
+    video.save()
+
+    metadata = VideoMetadata.objects.filter(video=source).first()
+    if metadata is not None:
+        metadata.pk = None
+        metadata.video = video
+        VideoMetadata.objects.filter(video=video).delete()
+        metadata.save()
+
+    VideoRendition.objects.filter(video=video).delete()
+    VideoRendition.objects.bulk_create([
+        VideoRendition(
+            video=video,
+            name=rendition.name,
+            width=rendition.width,
+            height=rendition.height,
+            bandwidth=rendition.bandwidth,
+            playlist=rendition.playlist.name,
+        )
+        for rendition in source.renditions.all()
+    ])
@@ -0,0 +1,284 @@
+import mimetypes
+import os
+import re
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+mimetypes.add_type('text/vtt', '.vtt')
+
+# Read size used when the WSGI server can't hand the file to the kernel itself
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Requests asking for more ranges than this are answered with the whole file
+MAX_RANGES = 16
+
+STREAM_TOKEN_SALT = 'video.stream'
+PLAYLIST_URI = re.compile(r'URI="([^"]+)"')
+
+
+class RangedFile:
+    """
+    File wrapper that exposes a single byte range of an open file.
+
+    The underlying descriptor is positioned at the start of the range, so WSGI
+    servers that implement ``wsgi.file_wrapper`` with ``os.sendfile`` (gunicorn,
+    uwsgi) can send the range straight from the page cache using ``fileno()``
+    and the response's Content-Length. Servers without it fall back to
+    ``read()``, which never returns more than the range.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def stream_token(video_id):
+    """Signed token granting access to the files of one video, for URLs"""
+    return signing.TimestampSigner(salt=STREAM_TOKEN_SALT).sign(str(video_id))
+
+
+def has_stream_token(request, video_id):
+    """True if the request's ``?token=`` grants access to this video and has not expired"""
+    token = request.GET.get('token')
+    if not token:
+        return False
+    try:
+        value = signing.TimestampSigner(salt=STREAM_TOKEN_SALT).unsign(
+            token, max_age=getattr(settings, 'VIDEO_STREAM_TOKEN_MAX_AGE', 6 * 3600)
+        )
+    except signing.BadSignature:
+        return False
+    return value == str(video_id)
+
+
+def with_token(uri, token):
+    """``uri`` with the stream token added to its query string, before any fragment"""
+    uri, hash_mark, fragment = uri.partition('#')
+    return f'{uri}{"&" if "?" in uri else "?"}token={token}{hash_mark}{fragment}'
+
+
+def tokenized_playlist(path, token):
+    """
+    An HLS playlist whose segment and playlist URIs carry ``token``, so a
+    player given a tokenized manifest URL can fetch everything it references.
+    """
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    result = []
+    for line in lines:
+        if line.startswith('#'):
+            line = PLAYLIST_URI.sub(lambda match: f'URI="{with_token(match.group(1), token)}"', line)
+        elif line.strip():
+            line = with_token(line.strip(), token)
+        result.append(line)
+    return '\n'.join(result) + '\n'
+
+
+def tokenized_thumbnail_track(path, token):
+    """
+    A WebVTT thumbnail track whose sprite URIs carry ``token``. Cue payloads
+    are the lines following a cue timing line up to the next blank line.
+    """
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    result = []
+    in_cue = False
+    for line in lines:
+        if '-->' in line:
+            in_cue = True
+        elif not line.strip():
+            in_cue = False
+        elif in_cue:
+            line = with_token(line.strip(), token)
+        result.append(line)
+    return '\n'.join(result) + '\n'
+
+
+def parse_range_header(header, size):
+    """
+    Parse a ``Range: bytes=...`` header against a file of ``size`` bytes.
+
+    Returns a sorted list of inclusive ``(start, end)`` tuples with overlapping
+    and adjacent ranges merged, an empty list if no range is satisfiable, or
+    None if the header should be ignored (malformed, other unit, too many ranges).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+
+    parts = spec.split(',')
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, sep, last = part.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if first == '':
+                # Suffix range: the last N bytes
+                suffix = int(last)
+                if suffix < 0:
+                    return None
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else None
+                if start < 0 or (end is not None and end < start):
+                    return None
+                end = size - 1 if end is None else min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def file_etag(stat_result):
+    """Strong validator built from the file's size and modification time"""
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def if_range_matches(request, etag, last_modified):
+    """Return True if the Range header may be honoured under If-Range"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _multipart_ranges(path, ranges, size, content_type, boundary):
+    """Yield a multipart/byteranges body reading each range in blocks"""
+    with open(path, 'rb') as f:
+        for start, end in ranges:
+            yield _part_header(boundary, content_type, start, end, size)
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        yield f'\r\n--{boundary}--\r\n'.encode()
+
+
+def _part_header(boundary, content_type, start, end, size):
+    return (
+        f'\r\n--{boundary}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+    ).encode()
+
+
+def _accel_redirect_response(path, content_type):
+    """Let the front-end proxy serve the file (ranges and validators included)"""
+    relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    prefix = getattr(settings, 'VIDEO_STREAM_ACCEL_PREFIX', '/protected-media/')
+    response = HttpResponse(content_type=content_type)
+    response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relative
+    return response
+
+
+def serve_file(request, path, content_type=None):
+    """
+    Serve a media file with HTTP range and conditional request support.
+
+    Single ranges and whole-file responses are returned as a FileResponse so the
+    WSGI server can use sendfile; multiple ranges are streamed as
+    multipart/byteranges. With ``VIDEO_STREAM_BACKEND = 'x-accel-redirect'``
+    the transfer is delegated to nginx instead.
+    """
+    if content_type is None:
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if getattr(settings, 'VIDEO_STREAM_BACKEND', 'sendfile') == 'x-accel-redirect':
+        return _accel_redirect_response(path, content_type)
+
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    last_modified = int(stat_result.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    ranges = None
+    if request.method in ('GET', 'HEAD') and if_range_matches(request, etag, last_modified):
+        ranges = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif ranges and len(ranges) > 1:
+        boundary = uuid.uuid4().hex
+        length = sum(
+            len(_part_header(boundary, content_type, start, end, size)) + end - start + 1
+            for start, end in ranges
+        ) + len(f'\r\n--{boundary}--\r\n')
+        response = StreamingHttpResponse(
+            _multipart_ranges(path, ranges, size, content_type, boundary),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = length
+    else:
+        start, end = ranges[0] if ranges else (0, size - 1)
+        length = end - start + 1
+        response = FileResponse(
+            RangedFile(open(path, 'rb'), start, length),
+            status=206 if ranges else 200,
+            content_type=content_type,
+        )
+        response.block_size = STREAM_BLOCK_SIZE
+        response['Content-Length'] = length
+        if ranges:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -1,13 +1,138 @@
 
-from celery import shared_task
-import whisper
-import torch
-from .models import Video
+from celery import shared_task, chain, chord, group
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Video, VideoMetadata, VideoRendition, UploadSession, video_asset_dir
+from . import audio, counters, detail_cache, hls, list_cache, probe, transcription, transcripts, trickplay, uploads, view_buffer, whisper_models
+from datetime import timedelta
+from .storage import videos_sharing_content
 import logging
 import os
+import shutil
 
 logger = logging.getLogger(__name__)
 
+
+
+def save_media_metadata(video, fields):
+    """Store probe results on every video sharing the file and sync Video.duration"""
+    sharing = videos_sharing_content(video)
+    for shared_id in sharing.values_list('pk', flat=True):
+        VideoMetadata.objects.update_or_create(video_id=shared_id, defaults=fields)
+    if fields.get('duration'):
+        sharing.update(duration=timedelta(seconds=fields['duration']))
+        drop_cached_pages(sharing)
+    return VideoMetadata.objects.get(video=video)
+
+
+def drop_cached_pages(videos):
+    """Queryset updates skip the post_save signal, so cached pages are dropped here"""
+    list_cache.bump_list_version()
+    detail_cache.bump_video_versions(list(videos.values_list('pk', flat=True)))
+
+
+def set_processing_status(videos, status):
+    videos.update(processing_status=status, updated_at=timezone.now())
+    drop_cached_pages(videos)
+
+
+def get_media_metadata(video):
+    """Return the video's stored metadata, probing the file only if it is missing"""
+    try:
+        return video.metadata
+    except VideoMetadata.DoesNotExist:
+        return save_media_metadata(video, probe.probe_media(video.video_file.path))
+
+
+@shared_task
+def probe_video_task(video_id):
+    """
+    A Celery task to probe a video file with ffprobe and store its metadata.
+    """
+    try:
+        video = Video.objects.get(pk=video_id)
+    except Video.DoesNotExist:
+        logger.error(f'Video with ID {video_id} does not exist.')
+        return f"Video with ID {video_id} not found."
+
+    if not os.path.exists(video.video_file.path):
+        logger.error(f'Video file not found for video ID {video_id} at: {video.video_file.path}')
+        return f"Video file for ID {video_id} not found."
+
+    try:
+        save_media_metadata(video, probe.probe_media(video.video_file.path))
+        logger.info(f'Stored media metadata for video ID {video_id}.')
+        return f"Successfully probed video ID {video_id}."
+    except Exception as e:
+        logger.error(f'Error probing video ID {video_id}: {e}', exc_info=True)
+        return f"Error probing video ID {video_id}: {e}"
+
+
+def transcription_source(video):
+    """The extracted audio if it exists, so Whisper skips demuxing the container"""
+    if video.audio_file and os.path.exists(video.audio_file.path):
+        return video.audio_file.path
+    return video.video_file.path
+
+
+@shared_task
+def extract_audio_task(video_id):
+    """
+    A Celery task to extract a video's audio once as 16 kHz mono PCM and
+    precompute its waveform peaks. Later audio stages read this file instead
+    of the original container.
+    """
+    try:
+        video = Video.objects.get(pk=video_id)
+    except Video.DoesNotExist:
+        logger.error(f'Video with ID {video_id} does not exist.')
+        return f"Video with ID {video_id} not found."
+
+    source_path = video.video_file.path
+    if not os.path.exists(source_path):
+        logger.error(f'Video file not found for video ID {video_id} at: {source_path}')
+        return f"Video file for ID {video_id} not found."
+
+    audio_dir = os.path.join(video_asset_dir(video), 'audio')
+    audio_root = os.path.join(settings.MEDIA_ROOT, audio_dir)
+
+    try:
+        if not get_media_metadata(video).has_audio:
+            logger.info(f'Video ID {video_id} has no audio stream; skipping audio extraction.')
+            return f"Video ID {video_id} has no audio."
+
+        shutil.rmtree(audio_root, ignore_errors=True)
+        audio.extract_audio(source_path, os.path.join(audio_root, 'audio.wav'))
+        buckets = audio.write_peaks(
+            os.path.join(audio_root, 'peaks.json'),
+            audio.map_samples(os.path.join(audio_root, 'audio.wav')),
+            settings.VIDEO_WAVEFORM_SAMPLES_PER_PIXEL,
+        )
+        sharing = videos_sharing_content(video)
+        sharing.update(
+            audio_file=os.path.join(audio_dir, 'audio.wav'),
+            waveform=os.path.join(audio_dir, 'peaks.json'),
+        )
+        drop_cached_pages(sharing)
+
+        logger.info(f'Extracted audio and {buckets} waveform peaks for video ID {video_id}.')
+        return f"Successfully extracted audio for video ID {video_id}."
+
+    except Exception as e:
+        logger.error(f'Error extracting audio for video ID {video_id}: {e}', exc_info=True)
+        shutil.rmtree(audio_root, ignore_errors=True)
+        return f"Error during audio extraction for video ID {video_id}: {e}"
+
+
+def use_chunked_transcription(video):
+    """Long videos are transcribed in windows to bound memory and spread over the workers"""
+    threshold = settings.WHISPER_CHUNKED_MIN_DURATION
+    if threshold is None or not video.duration:
+        return False
+    return video.duration.total_seconds() >= threshold
+
+
 @shared_task
 def transcribe_video_task(video_id):
     """
@@ -19,34 +144,291 @@ def transcribe_video_task(video_id):
         logger.error(f'Video with ID {video_id} does not exist.')
         return f"Video with ID {video_id} not found."
 
+    # Results are shared by every video backed by the same content
+    sharing = videos_sharing_content(video)
+
     if not os.path.exists(video.video_file.path):
         logger.error(f'Video file not found for video ID {video_id} at: {video.video_file.path}')
-        video.processing_status = 'failed'
-        video.save()
+        set_processing_status(sharing, 'failed')
         return f"Video file for ID {video_id} not found."
 
     logger.info(f'Starting transcription for video: {video.title} (ID: {video_id})')
-    video.processing_status = 'transcribing'
-    video.save()
+    set_processing_status(sharing, 'transcribing')
 
+    source_path = transcription_source(video)
     try:
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"Using device: {device} for transcription of video ID {video_id}")
-
-        model = whisper.load_model("base", device=device)
-        logger.info(f"Whisper model 'base' loaded for video ID {video_id}.")
+        if use_chunked_transcription(video):
+            # Each window is its own task, so long videos spread over the
+            # workers and every window uses the worker's cached model
+            window = settings.WHISPER_CHUNK_SECONDS
+            offsets = transcription.window_offsets(
+                video.duration.total_seconds(), window, settings.WHISPER_CHUNK_OVERLAP_SECONDS
+            )
+            logger.info(f'Transcribing video ID {video_id} in {len(offsets)} windows.')
+            chord(
+                transcribe_window_task.si(source_path, offset, window) for offset in offsets
+            )(save_chunked_transcript_task.s(video_id))
+            return f"Queued {len(offsets)} transcription windows for video ID {video_id}."
 
-        result = model.transcribe(video.video_file.path, verbose=True)
+        model = whisper_models.get_model()
+        stats = whisper_models.cache_stats()
+        logger.info(f"Whisper model ready for video ID {video_id} ({stats['loads']} loads, {stats['hits']} hits in this worker).")
+        result = model.transcribe(audio.whisper_input(source_path), verbose=True, **whisper_models.transcribe_options())
 
-        video.transcript = result
-        video.processing_status = 'ready'
-        video.save()
+        transcripts.save_transcript(sharing, result)
+        set_processing_status(sharing, 'ready')
         
         logger.info(f'Successfully transcribed video ID {video_id}.')
         return f"Successfully transcribed video ID {video_id}."
 
     except Exception as e:
         logger.error(f'Error transcribing video ID {video_id}: {e}', exc_info=True)
-        video.processing_status = 'failed'
-        video.save()
+        set_processing_status(sharing, 'failed')
         return f"Error during transcription for video ID {video_id}: {e}"
+
+
+@shared_task
+def transcribe_window_task(path, offset, seconds):
+    """
+    A Celery task to transcribe one window of a long video, see
+    transcribe_video_task. Returns None if the window failed.
+    """
+    try:
+        return transcription.transcribe_window(path, offset, seconds)
+    except Exception as e:
+        logger.error(f'Error transcribing {path} at {offset}s: {e}', exc_info=True)
+        return None
+
+
+@shared_task
+def save_chunked_transcript_task(windows, video_id):
+    """
+    A Celery task to stitch the windows of a chunked transcription together
+    and store the transcript.
+    """
+    try:
+        video = Video.objects.get(pk=video_id)
+    except Video.DoesNotExist:
+        logger.error(f'Video with ID {video_id} does not exist.')
+        return f"Video with ID {video_id} not found."
+
+    sharing = videos_sharing_content(video)
+    if any(window is None for window in windows):
+        logger.error(f'Some transcription windows failed for video ID {video_id}.')
+        set_processing_status(sharing, 'failed')
+        return f"Error during transcription for video ID {video_id}: a window failed."
+
+    try:
+        result = transcription.merge_windows(windows, settings.WHISPER_CHUNK_OVERLAP_SECONDS)
+        transcripts.save_transcript(sharing, result)
+        set_processing_status(sharing, 'ready')
+
+        logger.info(f'Successfully transcribed video ID {video_id} in {len(windows)} windows.')
+        return f"Successfully transcribed video ID {video_id}."
+
+    except Exception as e:
+        logger.error(f'Error saving transcript of video ID {video_id}: {e}', exc_info=True)
+        set_processing_status(sharing, 'failed')
+        return f"Error during transcription for video ID {video_id}: {e}"
+
+
+@shared_task
+def generate_hls_task(video_id):
+    """
+    A Celery task to transcode a video into the HLS rendition ladder.
+    """
+    try:
+        video = Video.objects.get(pk=video_id)
+    except Video.DoesNotExist:
+        logger.error(f'Video with ID {video_id} does not exist.')
+        return f"Video with ID {video_id} not found."
+
+    source_path = video.video_file.path
+    if not os.path.exists(source_path):
+        logger.error(f'Video file not found for video ID {video_id} at: {source_path}')
+        return f"Video file for ID {video_id} not found."
+
+    hls_dir = os.path.join(video_asset_dir(video), 'hls')
+    hls_root = os.path.join(settings.MEDIA_ROOT, hls_dir)
+    shutil.rmtree(hls_root, ignore_errors=True)
+
+    try:
+        source = get_media_metadata(video)
+        rungs = hls.plan_ladder(settings.VIDEO_HLS_LADDER, source)
+        segment_seconds = settings.VIDEO_HLS_SEGMENT_SECONDS
+        logger.info(f"Generating HLS renditions {[r['name'] for r in rungs]} for video ID {video_id}")
+
+        renditions = []
+        for rung in rungs:
+            hls.transcode_rendition(
+                source_path, os.path.join(hls_root, rung['name']), rung, source, segment_seconds
+            )
+            renditions.append(VideoRendition(
+                name=rung['name'],
+                width=rung['width'],
+                height=rung['height'],
+                bandwidth=hls.rendition_bandwidth(rung, source),
+                playlist=os.path.join(hls_dir, rung['name'], 'index.m3u8'),
+            ))
+
+        hls.write_master_playlist(os.path.join(hls_root, 'master.m3u8'), [
+            {
+                'bandwidth': r.bandwidth,
+                'width': r.width,
+                'height': r.height,
+                'uri': f'{r.name}/index.m3u8',
+            }
+            for r in renditions
+        ])
+
+        # Record the ladder on every video backed by the same content
+        sharing = videos_sharing_content(video)
+        with transaction.atomic():
+            VideoRendition.objects.filter(video__in=sharing).delete()
+            VideoRendition.objects.bulk_create([
+                VideoRendition(
+                    video_id=shared_id,
+                    name=r.name,
+                    width=r.width,
+                    height=r.height,
+                    bandwidth=r.bandwidth,
+                    playlist=r.playlist.name,
+                )
+                for shared_id in sharing.values_list('pk', flat=True)
+                for r in renditions
+            ])
+            sharing.update(hls_manifest=os.path.join(hls_dir, 'master.m3u8'))
+            drop_cached_pages(sharing)
+
+        logger.info(f'Successfully generated {len(renditions)} HLS renditions for video ID {video_id}.')
+        return f"Successfully generated HLS renditions for video ID {video_id}."
+
+    except Exception as e:
+        logger.error(f'Error generating HLS renditions for video ID {video_id}: {e}', exc_info=True)
+        shutil.rmtree(hls_root, ignore_errors=True)
+        return f"Error during HLS generation for video ID {video_id}: {e}"
+
+
+@shared_task
+def generate_trickplay_task(video_id):
+    """
+    A Celery task to build trickplay sprite sheets and their WebVTT track.
+    """
+    try:
+        video = Video.objects.get(pk=video_id)
+    except Video.DoesNotExist:
+        logger.error(f'Video with ID {video_id} does not exist.')
+        return f"Video with ID {video_id} not found."
+
+    source_path = video.video_file.path
+    if not os.path.exists(source_path):
+        logger.error(f'Video file not found for video ID {video_id} at: {source_path}')
+        return f"Video file for ID {video_id} not found."
+
+    trickplay_dir = os.path.join(video_asset_dir(video), 'trickplay')
+    trickplay_root = os.path.join(settings.MEDIA_ROOT, trickplay_dir)
+    shutil.rmtree(trickplay_root, ignore_errors=True)
+
+    try:
+        source = get_media_metadata(video)
+        if not source.duration:
+            raise ValueError('Could not determine video duration')
+
+        interval = settings.VIDEO_TRICKPLAY_INTERVAL
+        columns = settings.VIDEO_TRICKPLAY_COLUMNS
+        rows = settings.VIDEO_TRICKPLAY_ROWS
+        tile_width, tile_height = trickplay.tile_size(
+            source.width, source.height, settings.VIDEO_TRICKPLAY_TILE_WIDTH
+        )
+
+        sprites = trickplay.generate_sprites(
+            source_path, trickplay_root, interval, tile_width, tile_height,
+            columns, rows, settings.VIDEO_TRICKPLAY_FORMAT
+        )
+        if not sprites:
+            raise ValueError('ffmpeg produced no sprite sheets')
+
+        trickplay.write_vtt(
+            os.path.join(trickplay_root, 'thumbnails.vtt'), sprites, source.duration,
+            interval, tile_width, tile_height, columns, rows
+        )
+        sharing = videos_sharing_content(video)
+        sharing.update(trickplay_vtt=os.path.join(trickplay_dir, 'thumbnails.vtt'))
+        drop_cached_pages(sharing)
+
+        logger.info(f'Successfully generated {len(sprites)} trickplay sprite sheets for video ID {video_id}.')
+        return f"Successfully generated trickplay sprites for video ID {video_id}."
+
+    except Exception as e:
+        logger.error(f'Error generating trickplay sprites for video ID {video_id}: {e}', exc_info=True)
+        shutil.rmtree(trickplay_root, ignore_errors=True)
+        return f"Error during trickplay generation for video ID {video_id}: {e}"
+
+
+@shared_task
+def whisper_model_stats_task():
+    """
+    A Celery task returning the Whisper model cache statistics of the worker
+    process that runs it.
+    """
+    return whisper_models.cache_stats()
+
+
+@shared_task
+def expire_upload_sessions_task():
+    """
+    A Celery task to delete resumable uploads abandoned for longer than
+    VIDEO_UPLOAD_SESSION_TTL, together with their partial files.
+    """
+    cutoff = timezone.now() - settings.VIDEO_UPLOAD_SESSION_TTL
+    expired = UploadSession.objects.filter(status='active', updated_at__lt=cutoff)
+    count = 0
+    for session in expired.iterator():
+        uploads.discard_session(session)
+        session.delete()
+        count += 1
+    logger.info(f'Expired {count} abandoned upload sessions.')
+    return f"Expired {count} upload sessions."
+
+
+@shared_task
+def flush_video_views_task():
+    """
+    A Celery task to write the buffered video views to the database, see
+    video.view_buffer.
+    """
+    stored = view_buffer.flush_views()
+    if stored:
+        logger.info(f'Stored {stored} buffered video views.')
+    return f"Stored {stored} video views."
+
+
+@shared_task
+def compact_engagement_counters_task():
+    """
+    A Celery task to fold the sharded like/dislike counters into the Video
+    and Comment rows, see video.counters.
+    """
+    from comments.models import Comment
+    folded = counters.compact('video', Video) + counters.compact('comment', Comment)
+    return f"Compacted {folded} counter shards."
+
+
+def start_video_processing(video_id):
+    """
+    Queue the post-upload processing tasks for a video: probe the file first,
+    then run the stages that read its metadata in parallel. Transcription
+    waits for the audio extraction it reads from.
+    """
+    pipeline = chain(
+        probe_video_task.si(video_id),
+        group(
+            chain(extract_audio_task.si(video_id), transcribe_video_task.si(video_id)),
+            generate_hls_task.si(video_id),
+            generate_trickplay_task.si(video_id),
+        ),
+    )
+    try:
+        pipeline.delay()
+    except Exception as task_error:
+        logger.error(f'Could not queue processing for video ID {video_id}: {task_error}')
@@ -1,3 +1,1552 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+import wave
+from collections import OrderedDict
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import billiard
+import ffmpeg
+import numpy as np
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DataError, OperationalError, connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import Users
+from Streamify.celery import app as celery_app
+from Streamify.pagination import KeysetPagination, encode_cursor
+from . import audio, captions, counters, detail_cache, hls, probe, storage, tasks, uploads, view_buffer, whisper_models
+from .management.backfill import BackfillCommand
+from .models import (
+    BackfillCheckpoint, EngagementCounter, MediaBlob, Transcript, UploadSession, Video, VideoLike, VideoMetadata,
+    VideoRendition, VideoView, VideoViewFilter, blob_upload_path, video_asset_dir,
+)
+from .search import rank_transcripts, search_videos
+from .sketches import BloomFilter, HyperLogLog, RotatingBloomFilter
+from .streaming import (
+    has_stream_token, if_range_matches, parse_range_header, stream_token, tokenized_playlist,
+    tokenized_thumbnail_track, with_token,
+)
+from .trickplay import format_timestamp, write_vtt
+from .transcripts import pack_tokens, save_transcript, unpack_tokens
+from .transcription import SAMPLE_RATE, merge_windows, stitch_windows, transcribe_window, window_offsets
+from .view_buffer import LocalViewBuffer, RedisViewBuffer, flush_views, get_buffer, record_view, unique_viewers
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    def test_single_range(self):
+        self.assertEqual(parse_range_header('bytes=0-99', 1000), [(0, 99)])
+
+    def test_open_ended_range_runs_to_the_end(self):
+        self.assertEqual(parse_range_header('bytes=900-', 1000), [(900, 999)])
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range_header('bytes=-100', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=-5000', 1000), [(0, 999)])
+
+    def test_end_is_clamped_to_the_file(self):
+        self.assertEqual(parse_range_header('bytes=500-5000', 1000), [(500, 999)])
+
+    def test_overlapping_and_adjacent_ranges_are_merged(self):
+        self.assertEqual(
+            parse_range_header('bytes=500-599, 0-99, 100-199, 550-650', 1000),
+            [(0, 199), (500, 650)],
+        )
+
+    def test_unsatisfiable(self):
+        self.assertEqual(parse_range_header('bytes=1000-', 1000), [])
+        self.assertEqual(parse_range_header('bytes=-0', 1000), [])
+
+    def test_ignored_headers(self):
+        for header in (None, '', 'items=0-1', 'bytes=', 'bytes=abc', 'bytes=5-1', 'bytes=1'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 1000))
+
+    def test_too_many_ranges_are_ignored(self):
+        header = 'bytes=' + ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(17))
+        self.assertIsNone(parse_range_header(header, 1000))
+
+
+class IfRangeTests(SimpleTestCase):
+    etag = '"abc-10"'
+    last_modified = 1700000000
+
+    def matches(self, if_range=None):
+        headers = {'HTTP_IF_RANGE': if_range} if if_range is not None else {}
+        request = RequestFactory().get('/', **headers)
+        return if_range_matches(request, self.etag, self.last_modified)
+
+    def test_without_if_range(self):
+        self.assertTrue(self.matches())
+
+    def test_etag(self):
+        self.assertTrue(self.matches(self.etag))
+        self.assertFalse(self.matches('"other"'))
+        self.assertFalse(self.matches(f'W/{self.etag}'))
+
+    def test_date(self):
+        self.assertTrue(self.matches(http_date(self.last_modified)))
+        self.assertFalse(self.matches(http_date(self.last_modified - 60)))
+
+
+class StreamTokenTests(SimpleTestCase):
+    def test_token_is_bound_to_the_video(self):
+        token = stream_token(7)
+        self.assertTrue(has_stream_token(RequestFactory().get('/', {'token': token}), 7))
+        self.assertFalse(has_stream_token(RequestFactory().get('/', {'token': token}), 8))
+        self.assertFalse(has_stream_token(RequestFactory().get('/', {'token': token + 'x'}), 7))
+        self.assertFalse(has_stream_token(RequestFactory().get('/'), 7))
+
+    @override_settings(VIDEO_STREAM_TOKEN_MAX_AGE=60)
+    def test_token_expires(self):
+        with mock.patch('django.core.signing.time.time', return_value=1700000000):
+            token = stream_token(7)
+        with mock.patch('django.core.signing.time.time', return_value=1700000000 + 61):
+            self.assertFalse(has_stream_token(RequestFactory().get('/', {'token': token}), 7))
+
+    def test_playlist_uris_carry_the_token(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'index.m3u8')
+        with open(path, 'w') as f:
+            f.write('#EXTM3U\n#EXT-X-MAP:URI="init.mp4"\n#EXTINF:6.0,\nsegment_000.ts\n')
+        self.assertEqual(
+            tokenized_playlist(path, 'abc'),
+            '#EXTM3U\n#EXT-X-MAP:URI="init.mp4?token=abc"\n#EXTINF:6.0,\nsegment_000.ts?token=abc\n',
+        )
+        self.assertEqual(with_token('/captions.vtt?v=2', 'abc'), '/captions.vtt?v=2&token=abc')
+        self.assertEqual(with_token('sprite_001.jpg#xywh=0,0,160,90', 'abc'), 'sprite_001.jpg?token=abc#xywh=0,0,160,90')
+
+
+class MediaTestMixin:
+    """A temporary MEDIA_ROOT and a ready video whose file lives in it"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.uploader = Users.objects.create(username='owner', email='owner@example.com', password='x')
+
+    def make_video(self, content=b'', name='clip.mp4', **fields):
+        os.makedirs(os.path.join(self.media_root, 'videos'), exist_ok=True)
+        with open(os.path.join(self.media_root, 'videos', name), 'wb') as f:
+            f.write(content)
+        fields.setdefault('processing_status', 'ready')
+        fields.setdefault('title', 'clip')
+        return Video.objects.create(video_file=f'videos/{name}', uploader=self.uploader, **fields)
+
+
+class VideoStreamViewTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = self.make_video(bytes(range(256)) * 4, visibility='private')
+        self.url = reverse('video-stream', kwargs={'video_id': self.video.id})
+
+    def test_private_stream_needs_a_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'token': stream_token(self.video.id + 1)}).status_code, 404)
+
+    def test_private_stream_with_token(self):
+        response = self.client.get(self.url, {'token': stream_token(self.video.id)}, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-9/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10)))
+        self.assertEqual(response['Cache-Control'], 'private')
+
+    def test_stale_if_range_sends_the_whole_file(self):
+        response = self.client.get(
+            self.url, {'token': stream_token(self.video.id)}, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '1024')
+
+    def test_private_thumbnail_track_sprites_carry_the_token(self):
+        trickplay_root = os.path.join(self.media_root, video_asset_dir(self.video), 'trickplay')
+        os.makedirs(trickplay_root)
+        write_vtt(os.path.join(trickplay_root, 'thumbnails.vtt'), ['sprite_001.jpg'], 4, 2, 160, 90, 2, 1)
+        with open(os.path.join(trickplay_root, 'sprite_001.jpg'), 'wb') as f:
+            f.write(b'jpeg')
+        token = stream_token(self.video.id)
+        url = reverse('video-asset', kwargs={'video_id': self.video.id, 'asset_path': 'trickplay/thumbnails.vtt'})
+
+        response = self.client.get(url, {'token': token})
+        self.assertEqual(response['Content-Type'], 'text/vtt')
+        sprite_uris = [line for line in response.content.decode().splitlines() if '#xywh=' in line]
+        self.assertEqual(sprite_uris, [
+            f'sprite_001.jpg?token={token}#xywh=0,0,160,90',
+            f'sprite_001.jpg?token={token}#xywh=160,0,160,90',
+        ])
+        # What the player requests for a cue, resolved against the track URL
+        sprite_url = url.rsplit('/', 1)[0] + '/' + sprite_uris[0].split('#')[0]
+        self.assertEqual(self.client.get(sprite_url).status_code, 200)
+        self.assertEqual(self.client.get(sprite_url.split('?')[0]).status_code, 404)
+
+
+class TrickplayTests(SimpleTestCase):
+    def test_format_timestamp(self):
+        self.assertEqual(format_timestamp(0), '00:00:00.000')
+        self.assertEqual(format_timestamp(3725.0456), '01:02:05.046')
+
+    def test_cues_walk_tiles_then_sheets(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = write_vtt(os.path.join(directory, 'thumbnails.vtt'), ['a.jpg', 'b.jpg'], 25, 5, 160, 90, 2, 2)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[:2], ['WEBVTT', ''])
+        cues = [lines[i:i + 2] for i in range(2, len(lines), 3)]
+        self.assertEqual(cues, [
+            ['00:00:00.000 --> 00:00:05.000', 'a.jpg#xywh=0,0,160,90'],
+            ['00:00:05.000 --> 00:00:10.000', 'a.jpg#xywh=160,0,160,90'],
+            ['00:00:10.000 --> 00:00:15.000', 'a.jpg#xywh=0,90,160,90'],
+            ['00:00:15.000 --> 00:00:20.000', 'a.jpg#xywh=160,90,160,90'],
+            ['00:00:20.000 --> 00:00:25.000', 'b.jpg#xywh=0,0,160,90'],
+        ])
+
+    def test_last_cue_ends_with_the_video_and_missing_tiles_are_skipped(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = write_vtt(os.path.join(directory, 'thumbnails.vtt'), ['a.jpg'], 100, 3, 160, 90, 2, 1)
+        with open(path) as f:
+            cue_times = [line for line in f.read().splitlines() if '-->' in line]
+        # Two tiles in the only sheet, although the video has 34 intervals
+        self.assertEqual(cue_times, ['00:00:00.000 --> 00:00:03.000', '00:00:03.000 --> 00:00:06.000'])
+        path = write_vtt(os.path.join(directory, 'short.vtt'), ['a.jpg'], 4.5, 3, 160, 90, 2, 1)
+        with open(path) as f:
+            self.assertIn('00:00:03.000 --> 00:00:04.500', f.read())
+
+    def test_tokenized_track_keeps_timings(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = write_vtt(os.path.join(directory, 'thumbnails.vtt'), ['a.jpg'], 2, 2, 160, 90, 1, 1)
+        self.assertEqual(
+            tokenized_thumbnail_track(path, 'abc'),
+            'WEBVTT\n\n00:00:00.000 --> 00:00:02.000\na.jpg?token=abc#xywh=0,0,160,90\n',
+        )
+
+
+LADDER = [
+    {'name': '240p', 'height': 240, 'video_bitrate': 400, 'audio_bitrate': 64},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2800, 'audio_bitrate': 128},
+    {'name': '1080p', 'height': 1080, 'video_bitrate': 5000, 'audio_bitrate': 192},
+    {'name': 'source', 'height': None, 'video_bitrate': None, 'audio_bitrate': None},
+]
+
+
+class PlanLadderTests(SimpleTestCase):
+    def test_rungs_at_or_above_the_source_are_dropped(self):
+        source = SimpleNamespace(width=1280, height=720)
+        rungs = hls.plan_ladder(LADDER, source)
+        self.assertEqual([r['name'] for r in rungs], ['240p', 'source'])
+        self.assertEqual((rungs[0]['width'], rungs[0]['height']), (426, 240))
+        self.assertEqual((rungs[1]['width'], rungs[1]['height']), (1280, 720))
+
+    def test_dimensions_are_even(self):
+        source = SimpleNamespace(width=1001, height=563)
+        for rung in hls.plan_ladder(LADDER, source):
+            self.assertEqual(rung['width'] % 2, 0)
+            self.assertEqual(rung['height'] % 2, 0)
+
+    def test_small_source_keeps_only_the_source_rung(self):
+        source = SimpleNamespace(width=320, height=180)
+        self.assertEqual([r['name'] for r in hls.plan_ladder(LADDER, source)], ['source'])
+
+    def test_source_rung_is_copied_only_when_hls_can_carry_it(self):
+        rung = {'name': 'source', 'height': None, 'video_bitrate': None}
+        self.assertTrue(hls.can_copy_source(rung, SimpleNamespace(video_codec='h264', audio_codec='aac')))
+        self.assertFalse(hls.can_copy_source(rung, SimpleNamespace(video_codec='vp9', audio_codec='aac')))
+        self.assertFalse(hls.can_copy_source(LADDER[0], SimpleNamespace(video_codec='h264', audio_codec='aac')))
+
+
+def fake_transcode(source_path, output_dir, rung, source, segment_seconds):
+    os.makedirs(output_dir, exist_ok=True)
+    playlist_path = os.path.join(output_dir, 'index.m3u8')
+    with open(playlist_path, 'w') as f:
+        f.write('#EXTM3U\n#EXTINF:6.0,\nsegment_00000.ts\n#EXT-X-ENDLIST\n')
+    return playlist_path
+
+
+WHISPER_RESULT = {
+    'language': 'en',
+    'text': ' Hello there. ',
+    'segments': [{'start': 0.0, 'end': 1.5, 'text': ' Hello there.', 'tokens': [1, 2]}],
+}
+
+
+@override_settings(VIDEO_HLS_LADDER=LADDER, WHISPER_CHUNKED_MIN_DURATION=None)
+class ProcessingPipelineTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = self.make_video(b'not really a video', processing_status='processing')
+        VideoMetadata.objects.create(
+            video=self.video, duration=4.0, width=1280, height=720, video_codec='h264', audio_codec='aac',
+        )
+
+    @mock.patch.object(hls, 'transcode_rendition', side_effect=fake_transcode)
+    def test_hls_records_the_ladder(self, transcode):
+        tasks.generate_hls_task(self.video.id)
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.hls_manifest.name, f'{tasks.video_asset_dir(self.video)}/hls/master.m3u8')
+        self.assertEqual(
+            list(VideoRendition.objects.filter(video=self.video).order_by('height').values_list('name', 'height')),
+            [('240p', 240), ('source', 720)],
+        )
+        with open(os.path.join(self.media_root, self.video.hls_manifest.name)) as f:
+            master = f.read()
+        self.assertIn('RESOLUTION=426x240\n240p/index.m3u8', master)
+        self.assertIn('RESOLUTION=1280x720\nsource/index.m3u8', master)
+
+    @mock.patch.object(hls, 'transcode_rendition', side_effect=fake_transcode)
+    def test_transcription_keeps_the_hls_manifest(self, transcode):
+        # The stages run in parallel; a transcription finishing last must not
+        # write back the copy of the row it loaded before HLS was done
+        loaded = Video.objects.get(pk=self.video.id)
+        tasks.generate_hls_task(self.video.id)
+        model = mock.Mock()
+        model.transcribe.return_value = WHISPER_RESULT
+        with mock.patch.object(tasks.whisper_models, 'get_model', return_value=model), \
+                mock.patch.object(Video.objects, 'get', return_value=loaded):
+            tasks.transcribe_video_task(self.video.id)
+
+        self.video.refresh_from_db()
+        self.assertTrue(self.video.hls_manifest)
+        self.assertEqual(self.video.processing_status, 'ready')
+        self.assertEqual(Transcript.objects.get(video=self.video).text, 'Hello there.')
+
+
+@skipUnless(shutil.which('ffmpeg') and shutil.which('ffprobe'), 'needs ffmpeg')
+@override_settings(VIDEO_HLS_LADDER=LADDER, VIDEO_HLS_SEGMENT_SECONDS=2)
+class SyntheticClipTests(MediaTestMixin, TestCase):
+    """The real ffmpeg stages on a generated test pattern clip"""
+
+    def setUp(self):
+        super().setUp()
+        self.video = self.make_video(processing_status='processing')
+        subprocess.run([
+            'ffmpeg', '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', 'testsrc=duration=4:size=640x360:rate=25',
+            '-f', 'lavfi', '-i', 'sine=frequency=440:duration=4',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest',
+            self.video.video_file.path,
+        ], check=True)
+
+    def test_probe_and_hls(self):
+        tasks.probe_video_task(self.video.id)
+        metadata = VideoMetadata.objects.get(video=self.video)
+        self.assertEqual((metadata.width, metadata.height), (640, 360))
+        self.assertTrue(metadata.has_audio)
+
+        tasks.generate_hls_task(self.video.id)
+        self.video.refresh_from_db()
+        self.assertEqual(
+            sorted(VideoRendition.objects.filter(video=self.video).values_list('name', flat=True)),
+            ['240p', 'source'],
+        )
+        hls_root = os.path.dirname(self.video.hls_manifest.path)
+        for name in ('240p', 'source'):
+            with open(os.path.join(hls_root, name, 'index.m3u8')) as f:
+                self.assertIn('#EXT-X-ENDLIST', f.read())
+
+
+class ReuseExistingProcessingTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.blob = MediaBlob.objects.create(sha256='a' * 64, file='blobs/clip.mp4', size=10, ref_count=2)
+        self.source = self.make_video(blob=self.blob, processing_status='transcribing')
+        self.video = self.make_video(name='copy.mp4', blob=self.blob, processing_status='processing')
+
+    def test_finished_stages_of_a_sibling_in_progress_are_copied(self):
+        Video.objects.filter(pk=self.source.pk).update(
+            hls_manifest='derived/a/hls/master.m3u8',
+            audio_file='derived/a/audio/audio.wav',
+            waveform='derived/a/audio/peaks.json',
+        )
+        VideoMetadata.objects.create(video=self.source, duration=4.0, width=640, height=360, video_codec='h264')
+        VideoRendition.objects.create(
+            video=self.source, name='source', width=640, height=360, bandwidth=1000,
+            playlist='derived/a/hls/source/index.m3u8',
+        )
+
+        self.assertTrue(storage.reuse_existing_processing(self.video))
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.processing_status, 'transcribing')
+        self.assertEqual(self.video.hls_manifest.name, 'derived/a/hls/master.m3u8')
+        self.assertEqual(self.video.waveform.name, 'derived/a/audio/peaks.json')
+        self.assertFalse(self.video.trickplay_vtt)
+        self.assertEqual(self.video.metadata.width, 640)
+        self.assertEqual(list(self.video.renditions.values_list('name', flat=True)), ['source'])
+
+    def test_ready_sibling_gives_everything(self):
+        Video.objects.filter(pk=self.source.pk).update(processing_status='ready', trickplay_vtt='derived/a/t.vtt')
+        Transcript.objects.create(video=self.source, language='en', text='Hello there.')
+
+        self.assertTrue(storage.reuse_existing_processing(self.video))
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.processing_status, 'ready')
+        self.assertEqual(self.video.trickplay_vtt.name, 'derived/a/t.vtt')
+        self.assertEqual(Transcript.objects.get(video=self.video).text, 'Hello there.')
+
+    def test_failed_sibling_is_processed_again(self):
+        Video.objects.filter(pk=self.source.pk).update(processing_status='failed')
+        self.assertFalse(storage.reuse_existing_processing(self.video))
+
+
+def count_title_letters(title):
+    if title == 'broken':
+        raise ValueError('cannot read this one')
+    return len(title)
+
+
+class TitleLengthBackfill(BackfillCommand):
+    checkpoint_name = 'test-title-lengths'
+    update_fields = ['views']
+    work = count_title_letters
+
+    def get_queryset(self):
+        return Video.objects.all()
+
+    def get_work_args(self, obj):
+        return (obj.title,)
+
+    def apply_result(self, obj, result):
+        obj.views = result
+        return True
+
+
+class BackfillCommandTests(MediaTestMixin, TestCase):
+    def run_backfill(self, **options):
+        call_command(TitleLengthBackfill(), workers=1, batch_size=2, stdout=StringIO(), stderr=StringIO(), **options)
+        return BackfillCheckpoint.objects.get(name='test-title-lengths')
+
+    def test_completed_run_resets_the_checkpoint_and_keeps_failures(self):
+        videos = [self.make_video(name=f'{i}.mp4') for i in range(3)]
+        Video.objects.filter(pk=videos[1].pk).update(title='broken')
+
+        checkpoint = self.run_backfill()
+        self.assertEqual((checkpoint.last_pk, checkpoint.failed_pks), (0, [videos[1].pk]))
+        self.assertEqual(Video.objects.get(pk=videos[0].pk).views, 4)
+
+        # The next full run starts from the beginning again
+        Video.objects.filter(pk=videos[0].pk).update(views=0)
+        self.run_backfill()
+        self.assertEqual(Video.objects.get(pk=videos[0].pk).views, 4)
+
+        Video.objects.filter(pk=videos[1].pk).update(title='fixed now')
+        checkpoint = self.run_backfill(retry_failed=True)
+        self.assertEqual(checkpoint.failed_pks, [])
+        self.assertEqual(Video.objects.get(pk=videos[1].pk).views, 9)
+
+    def test_limited_run_keeps_its_position(self):
+        videos = [self.make_video(name=f'{i}.mp4') for i in range(3)]
+        checkpoint = self.run_backfill(limit=2)
+        self.assertEqual(checkpoint.last_pk, videos[1].pk)
+
+    def test_saved_batches_drop_cached_pages(self):
+        cache.clear()
+        video = self.make_video()
+        detail_url = reverse('video-detail', kwargs={'video_id': video.id})
+
+        def listed_views():
+            return [item['views'] for item in self.client.get(reverse('video-list')).json()['results']]
+
+        self.assertEqual(self.client.get(detail_url).data['views'], 0)
+        self.assertEqual(listed_views(), [0])
+
+        self.run_backfill()
+        self.assertEqual(self.client.get(detail_url).data['views'], 4)
+        self.assertEqual(listed_views(), [4])
+
+
+def segment(start, end, text):
+    return {'start': start, 'end': end, 'text': text}
+
+
+class StitchWindowsTests(SimpleTestCase):
+    def test_overlap_is_split_at_its_middle(self):
+        windows = [
+            (0, [segment(0, 4, ' one'), segment(4, 8, ' two'), segment(9, 10, ' late')]),
+            (8, [segment(8.2, 8.9, ' early'), segment(9.5, 12, ' three')]),
+        ]
+        merged = stitch_windows(windows, overlap_seconds=2)
+        self.assertEqual([s['text'] for s in merged], [' one', ' two', ' early', ' three'])
+        self.assertEqual([s['id'] for s in merged], [0, 1, 2, 3])
+
+    def test_repeated_segment_is_dropped(self):
+        windows = [
+            (0, [segment(0, 8.5, ' Hello, world.')]),
+            (8, [segment(8.4, 9.5, ' hello world'), segment(9.5, 11, ' next')]),
+        ]
+        merged = stitch_windows(windows, overlap_seconds=2)
+        self.assertEqual([s['text'] for s in merged], [' Hello, world.', ' next'])
+
+    def test_segment_starting_inside_the_previous_one_is_dropped(self):
+        windows = [
+            (0, [segment(0, 9.8, ' long sentence')]),
+            (8, [segment(9.0, 10.5, ' tail of it'), segment(10.5, 12, ' after')]),
+        ]
+        merged = stitch_windows(windows, overlap_seconds=2)
+        self.assertEqual([s['text'] for s in merged], [' long sentence', ' after'])
+
+    def test_window_offsets_cover_the_duration(self):
+        self.assertEqual(window_offsets(250, 100, 10), [0.0, 90.0, 180.0])
+        self.assertEqual(window_offsets(190, 100, 10), [0.0, 90.0])
+        self.assertEqual(window_offsets(50, 100, 10), [0.0])
+        with self.assertRaises(ValueError):
+            window_offsets(50, 10, 10)
+
+
+class FakeWhisperModel:
+    """Says which second of the file each window starts at, in one segment ending a second early"""
+
+    def transcribe(self, samples, **options):
+        first = int(round(samples[0] * 32768))
+        end = len(samples) / SAMPLE_RATE - 1
+        return {'language': 'en', 'segments': [{'start': 0.0, 'end': end, 'text': f' from {first}', 'seek': 0}]}
+
+
+def write_counting_wav(path, seconds):
+    """A 16 kHz mono WAV whose samples hold the second they belong to"""
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(np.repeat(np.arange(seconds, dtype='<i2'), SAMPLE_RATE).tobytes())
+
+
+def is_daemon():
+    return billiard.current_process().daemon
+
+
+def transcribe_all_windows(path, offsets, seconds):
+    return [transcribe_window(path, offset, seconds) for offset in offsets]
+
+
+@mock.patch.object(whisper_models, 'get_model', return_value=FakeWhisperModel())
+class ChunkedTranscriptionTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.audio_path = os.path.join(self.media_root, 'audio.wav')
+        write_counting_wav(self.audio_path, 25)
+        # Run the chord of window tasks in this process
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', celery_app.conf.task_always_eager)
+        celery_app.conf.task_always_eager = True
+
+    def test_windows_are_read_from_the_extracted_audio(self, get_model):
+        window = transcribe_window(self.audio_path, 9.0, 10)
+        self.assertEqual(window['segments'][0]['text'], ' from 9')
+        self.assertEqual((window['segments'][0]['start'], window['segments'][0]['end']), (9.0, 18.0))
+        self.assertEqual(window['segments'][0]['seek'], 900)
+
+    def test_windows_run_inside_a_daemonic_worker(self, get_model):
+        # Prefork Celery workers are daemonic and may not start processes of
+        # their own, so the chunked path must work from inside one
+        with billiard.Pool(1) as pool:
+            self.assertTrue(pool.apply(is_daemon))
+            windows = pool.apply(transcribe_all_windows, (self.audio_path, window_offsets(25, 10, 1), 10))
+        result = merge_windows(windows, 1)
+        self.assertEqual(result['text'], ' from 0 from 9 from 18')
+        self.assertEqual(result['language'], 'en')
+
+    @override_settings(WHISPER_CHUNKED_MIN_DURATION=20, WHISPER_CHUNK_SECONDS=10, WHISPER_CHUNK_OVERLAP_SECONDS=1)
+    def test_task_fans_out_and_saves_the_stitched_transcript(self, get_model):
+        video = self.make_video(processing_status='processing', duration=timedelta(seconds=25))
+        Video.objects.filter(pk=video.pk).update(audio_file=os.path.relpath(self.audio_path, self.media_root))
+        tasks.transcribe_video_task(video.id)
+
+        video.refresh_from_db()
+        self.assertEqual(video.processing_status, 'ready')
+        transcript = Transcript.objects.get(video=video)
+        self.assertEqual(transcript.text, 'from 0 from 9 from 18')
+        self.assertEqual(transcript.segments.count(), 3)
+
+    @override_settings(WHISPER_CHUNKED_MIN_DURATION=20, WHISPER_CHUNK_SECONDS=10, WHISPER_CHUNK_OVERLAP_SECONDS=1)
+    def test_failed_window_fails_the_video(self, get_model):
+        get_model.return_value = mock.Mock(**{'transcribe.side_effect': RuntimeError('out of memory')})
+        video = self.make_video(processing_status='processing', duration=timedelta(seconds=25))
+        Video.objects.filter(pk=video.pk).update(audio_file=os.path.relpath(self.audio_path, self.media_root))
+        tasks.transcribe_video_task(video.id)
+
+        video.refresh_from_db()
+        self.assertEqual(video.processing_status, 'failed')
+
+
+class PackTokensTests(SimpleTestCase):
+    def test_round_trip(self):
+        segments = [{'tokens': [50364, 1012, 2]}, {'tokens': []}, {}, {'tokens': [4294967295, 0]}]
+        self.assertEqual(unpack_tokens(pack_tokens(segments)), [[50364, 1012, 2], [], [], [4294967295, 0]])
+
+    def test_no_segments(self):
+        self.assertEqual(unpack_tokens(pack_tokens([])), [])
+
+    def test_packed_bytes_are_compressed(self):
+        segments = [{'tokens': list(range(100))} for _ in range(50)]
+        self.assertLess(len(pack_tokens(segments)), 50 * 100 * 4)
+
+
+class SaveTranscriptTests(MediaTestMixin, TestCase):
+    def test_tokens_are_stored_when_asked_and_replacing_bumps_the_version(self):
+        video = self.make_video()
+        save_transcript(Video.objects.filter(pk=video.pk), WHISPER_RESULT, store_tokens=True)
+        transcript = Transcript.objects.get(video=video)
+        self.assertEqual(unpack_tokens(transcript.tokens), [[1, 2]])
+        self.assertEqual(list(transcript.segments.values_list('text', flat=True)), ['Hello there.'])
+
+        save_transcript(Video.objects.filter(pk=video.pk), {**WHISPER_RESULT, 'text': 'Bye.'}, store_tokens=False)
+        transcript.refresh_from_db()
+        self.assertEqual((transcript.text, transcript.tokens, transcript.version), ('Bye.', None, 2))
+
+
+class MetadataSearchTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def video(self, title, description=''):
+        return self.make_video(name=f'{title[:20]}.mp4', title=title, description=description)
+
+    def test_title_matches_outrank_description_matches(self):
+        in_description = self.video('Weekend vlog', 'we made sourdough bread')
+        in_title = self.video('Sourdough bread at home')
+        self.assertEqual(search_videos('sourdough'), [in_title.id, in_description.id])
+
+    def test_shorter_documents_rank_higher(self):
+        long = self.video('Guitar', 'a long description about strings, chords, amps, pedals and practice routines')
+        short = self.video('Guitar')
+        self.assertEqual(search_videos('guitar'), [short.id, long.id])
+
+    def test_rare_terms_weigh_more_than_common_ones(self):
+        for i in range(5):
+            self.video(f'Cooking show {i}')
+        rare = self.video('Cooking risotto')
+        common_twice = self.video('Cooking cooking show')
+        results = search_videos('cooking risotto')
+        self.assertEqual(results[0], rare.id)
+        self.assertIn(common_twice.id, results)
+
+    def test_prefixes_match_at_a_lower_weight(self):
+        prefix = self.video('Pythonic idioms')
+        exact = self.video('Pyth tutorial')
+        self.assertEqual(search_videos('pyth'), [exact.id, prefix.id])
+        self.assertEqual(search_videos('py'), [])
+
+    def test_stop_words_alone_find_nothing(self):
+        self.video('The best of it')
+        self.assertEqual(search_videos('the of it'), [])
+
+    def test_results_follow_reindexing_and_scope(self):
+        video = self.video('Drums')
+        other = self.video('Drums again')
+        self.assertEqual(set(search_videos('drums')), {video.id, other.id})
+        video.title = 'Piano'
+        video.save()
+        self.assertEqual(search_videos('drums'), [other.id])
+        self.assertEqual(search_videos('piano', Video.objects.exclude(pk=video.pk)), [])
+
+    def test_exact_term_survives_the_expansion_limit(self):
+        exact = self.video('Python')
+        longer = [self.video(f'Pythonista {i}') for i in range(3)]
+        with mock.patch('video.search.MAX_EXPANSIONS', 1):
+            self.assertEqual(search_videos('python'), [exact.id])
+        cache.clear()
+        self.assertEqual(set(search_videos('python')), {exact.id, *(v.id for v in longer)})
+
+
+class TranscriptSearchTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def transcribed(self, text):
+        video = self.make_video(name=f'{len(Video.objects.all())}.mp4')
+        save_transcript(Video.objects.filter(pk=video.pk), {
+            'language': 'en', 'text': text, 'segments': [{'start': 0.0, 'end': 2.0, 'text': text}],
+        })
+        return video
+
+    def test_document_count_is_read_once_per_index_version(self):
+        drums = self.transcribed('drums and more drums')
+        self.transcribed('piano')
+        with mock.patch.object(Transcript.objects, 'count', wraps=Transcript.objects.count) as count:
+            self.assertEqual([hit['video_id'] for hit in rank_transcripts('drums')], [drums.id])
+            rank_transcripts('piano')
+            self.assertEqual(count.call_count, 1)
+
+            guitar = self.transcribed('guitar')
+            self.assertEqual([hit['video_id'] for hit in rank_transcripts('guitar')], [guitar.id])
+            self.assertEqual(count.call_count, 2)
+
+            guitar.delete()
+            self.assertEqual(rank_transcripts('guitar'), [])
+            self.assertEqual(count.call_count, 3)
+
+
+def walk_pages(paginator, queryset, url, view=None, direction='next'):
+    """The ids of every page reached by following ``direction`` links from ``url``"""
+    pages = []
+    while url:
+        request = Request(RequestFactory().get(url))
+        pages.append([row.id for row in paginator.paginate_queryset(queryset, request, view)])
+        url = getattr(paginator, f'{direction}_link')
+    return pages
+
+
+class KeysetPaginationTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.videos = [self.make_video(name=f'{i}.mp4') for i in range(7)]
+        # Ties on created_at are broken by id
+        Video.objects.filter(pk__in=[v.pk for v in self.videos[2:5]]).update(created_at=self.videos[2].created_at)
+        self.newest_first = list(Video.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_pages_cover_every_row_once(self):
+        pages = walk_pages(KeysetPagination(), Video.objects.all(), '/videos/?page_size=3')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.newest_first)
+
+    def test_previous_links_walk_back(self):
+        paginator = KeysetPagination()
+        forward = walk_pages(paginator, Video.objects.all(), '/videos/?page_size=3')
+        # The paginator is left on the last page
+        backward = walk_pages(paginator, Video.objects.all(), paginator.previous_link, direction='previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_oldest_first(self):
+        view = SimpleNamespace(keyset_ordering=('created_at', 'id'))
+        pages = walk_pages(KeysetPagination(), Video.objects.all(), '/videos/?page_size=4', view)
+        self.assertEqual(sum(pages, []), self.newest_first[::-1])
+
+    def test_rows_added_meanwhile_do_not_shift_pages(self):
+        paginator = KeysetPagination()
+        first = paginator.paginate_queryset(Video.objects.all(), Request(RequestFactory().get('/videos/?page_size=3')))
+        self.make_video(name='new.mp4')
+        second = paginator.paginate_queryset(Video.objects.all(), Request(RequestFactory().get(paginator.next_link)))
+        self.assertEqual([v.id for v in first + second], self.newest_first[:6])
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', encode_cursor({'t': 'yesterday', 'i': 1}), encode_cursor([1, 2])):
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                KeysetPagination().paginate_queryset(
+                    Video.objects.all(), Request(RequestFactory().get('/videos/', {'cursor': cursor}))
+                )
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def sketch(self, items):
+        hll = HyperLogLog()
+        for item in items:
+            hll.add(item)
+        return hll
+
+    def test_estimates_within_a_few_percent(self):
+        for n in (100, 5000, 50000):
+            with self.subTest(n=n):
+                estimate = self.sketch(f'viewer-{i}' for i in range(n)).count()
+                self.assertLess(abs(estimate - n) / n, 0.05)
+
+    def test_repeats_are_not_counted(self):
+        self.assertEqual(self.sketch(['a', 'b', 'a', 'b', 'a']).count(), 2)
+
+    def test_merge_is_the_union(self):
+        first = self.sketch(f'viewer-{i}' for i in range(10000))
+        second = self.sketch(f'viewer-{i}' for i in range(5000, 15000))
+        self.assertLess(abs(first.merge(second).count() - 15000) / 15000, 0.05)
+
+    def test_bytes_round_trip(self):
+        hll = self.sketch(f'viewer-{i}' for i in range(1000))
+        restored = HyperLogLog.from_bytes(hll.to_bytes())
+        self.assertEqual(restored.precision, hll.precision)
+        self.assertEqual(restored.count(), hll.count())
+        self.assertEqual(HyperLogLog.from_bytes(None).count(), 0)
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f'member-{i}')
+        self.assertTrue(all(f'member-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.02)
+
+    def test_bytes_round_trip(self):
+        bloom = BloomFilter(100)
+        bloom.add('a')
+        restored = BloomFilter.from_bytes(bloom.to_bytes(), 100)
+        self.assertIn('a', restored)
+        self.assertNotIn('b', restored)
+
+    def test_bits_of_another_size_are_dropped(self):
+        bloom = BloomFilter(100)
+        bloom.add('a')
+        self.assertNotIn('a', BloomFilter.from_bytes(bloom.to_bytes(), 5000))
+
+    def test_rotation_forgets_after_two_periods(self):
+        recent = RotatingBloomFilter(BloomFilter(100), BloomFilter(100))
+        recent.add('a')
+        recent.rotate(100)
+        self.assertIn('a', recent)
+        recent.rotate(100)
+        self.assertNotIn('a', recent)
+
+
+@override_settings(VIDEO_VIEW_TRACKING='sketch', VIDEO_VIEW_DEDUPE_SECONDS=3600)
+class SketchViewTrackingTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer = LocalViewBuffer()
+        patcher = mock.patch.dict('video.view_buffer._buffers', {None: self.buffer})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.video = self.make_video()
+
+    def flush(self, *viewers):
+        self.buffer.requeue([(self.video.id, user_id, ip_address) for user_id, ip_address in viewers])
+        flush_views()
+        self.video.refresh_from_db()
+
+    def test_recent_viewers_are_counted_once(self):
+        self.flush((None, '10.0.0.1'), (None, '10.0.0.2'), (self.uploader.id, '10.0.0.1'))
+        self.flush((None, '10.0.0.1'), (None, '10.0.0.3'))
+        self.assertEqual(self.video.views, 4)
+        self.assertEqual(unique_viewers(self.video), 4)
+        self.assertFalse(VideoView.objects.filter(video=self.video).exists())
+
+    def test_viewers_count_again_once_the_filter_has_rotated_twice(self):
+        self.flush((None, '10.0.0.1'))
+        VideoViewFilter.objects.filter(video=self.video).update(rotated_at=timezone.now() - timedelta(hours=2))
+        self.flush((None, '10.0.0.1'))
+        self.assertEqual(self.video.views, 1)
+        VideoViewFilter.objects.filter(video=self.video).update(rotated_at=timezone.now() - timedelta(hours=2))
+        self.flush((None, '10.0.0.1'))
+        self.assertEqual(self.video.views, 2)
+        self.assertEqual(unique_viewers(self.video), 1)
+
+
+class ListCacheInvalidationTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def listed_ids(self):
+        return [item['id'] for item in self.client.get(reverse('video-list')).json()['results']]
+
+    def test_status_changes_made_by_tasks_drop_cached_pages(self):
+        ready = self.make_video(name='ready.mp4')
+        processing = self.make_video(name='processing.mp4', processing_status='processing')
+        self.assertEqual(self.listed_ids(), [ready.id])
+
+        # Tasks update querysets, which sends no post_save
+        tasks.set_processing_status(Video.objects.filter(pk=processing.pk), 'ready')
+        self.assertEqual(self.listed_ids(), [processing.id, ready.id])
+
+
+class VideoLikeViewTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = self.make_video()
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(self.uploader)}'
+
+    def test_removing_a_reaction_drops_cached_pages_once(self):
+        url = reverse('video-like', kwargs={'video_id': self.video.id})
+        self.client.post(url, {'reaction': 'like'})
+        with mock.patch('video.detail_cache.bump_video_versions') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user_reaction'], None)
+        bump.assert_called_once_with([self.video.id])
+
+
+class VideoDetailViewTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.video = self.make_video()
+        self.stranger = Users.objects.create(username='stranger', email='stranger@example.com', password='x')
+        # Far enough ahead to match any version of the video
+        self.revalidate = {'HTTP_IF_MODIFIED_SINCE': http_date(time.time() + 3600)}
+
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+    def url(self, video_id):
+        return reverse('video-detail', kwargs={'video_id': video_id})
+
+    def test_unchanged_video_is_not_sent_again(self):
+        first = self.client.get(self.url(self.video.id))
+        self.assertEqual(first.status_code, 200)
+        second = self.client.get(self.url(self.video.id), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_revalidation_never_hides_a_404(self):
+        Video.objects.filter(pk=self.video.pk).update(visibility='private')
+        cases = [
+            ('stranger', self.video.id, self.auth(self.stranger)),
+            ('anonymous', self.video.id, {}),
+            ('missing', self.video.id + 100, {}),
+        ]
+        for name, video_id, headers in cases:
+            with self.subTest(name):
+                for view in (self.url(video_id), reverse('video-stats', kwargs={'video_id': video_id})):
+                    self.assertEqual(self.client.get(view, **self.revalidate, **headers).status_code, 404)
+        owner = self.client.get(self.url(self.video.id), **self.revalidate, **self.auth(self.uploader))
+        self.assertEqual(owner.status_code, 304)
+
+    def test_revalidating_viewers_are_counted(self):
+        with mock.patch('video.view_buffer.record_view') as record_view:
+            response = self.client.get(self.url(self.video.id), **self.revalidate, **self.auth(self.stranger))
+        self.assertEqual(response.status_code, 304)
+        record_view.assert_called_once_with(self.video.id, self.stranger.id, '127.0.0.1')
+
+    def test_stale_copy_carries_its_own_validators(self):
+        stats_url = reverse('video-stats', kwargs={'video_id': self.video.id})
+        first = self.client.get(stats_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('video-like', kwargs={'video_id': self.video.id}), {'reaction': 'like'},
+                **self.auth(self.stranger),
+            )
+        # Another request is recomputing the new version, so the old copy is served
+        lock = f'video-stats:{self.video.id}:{detail_cache.video_version(self.video.id)}:lock'
+        cache.add(lock, 1)
+        stale = self.client.get(stats_url)
+        self.assertEqual(stale.data['likes'], 0)
+        self.assertEqual(stale['ETag'], first['ETag'])
+        self.assertEqual(stale['Last-Modified'], first['Last-Modified'])
+
+        cache.delete(lock)
+        fresh = self.client.get(stats_url, HTTP_IF_NONE_MATCH=stale['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.data['likes'], 1)
+        self.assertNotEqual(fresh['ETag'], stale['ETag'])
+
+    def test_versions_expire(self):
+        with mock.patch('video.detail_cache.cache') as shared_cache:
+            shared_cache.get.return_value = None
+            detail_cache.video_version(self.video.id)
+            detail_cache.bump_video_versions([self.video.id])
+        key = detail_cache.VERSION_KEY.format(video_id=self.video.id)
+        shared_cache.get_or_set.assert_called_once_with(key, mock.ANY, detail_cache.VERSION_TIMEOUT)
+        self.assertEqual(shared_cache.set.call_args.args[2], detail_cache.VERSION_TIMEOUT)
+
+
+class UploadSessionTests(MediaTestMixin, TestCase):
+    content = bytes(range(256)) * 40
+
+    def setUp(self):
+        super().setUp()
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(self.uploader)}'
+        response = self.client.post(reverse('upload-session-create'), {
+            'title': 'Upload', 'filename': 'clip.mp4', 'upload_length': len(self.content),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.session = UploadSession.objects.get(pk=response.data['id'])
+        self.url = reverse('upload-session', kwargs={'session_id': self.session.id})
+        self.finalize_url = reverse('upload-session-finalize', kwargs={'session_id': self.session.id})
+
+    def send(self, offset, data):
+        return self.client.patch(
+            self.url, data, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_chunks_resume_from_the_reported_offset(self):
+        self.assertEqual(self.send(0, self.content[:4000]).status_code, 204)
+        head = self.client.head(self.url)
+        self.assertEqual((head['Upload-Offset'], head['Upload-Length']), ('4000', str(len(self.content))))
+        self.assertEqual(self.send(4000, self.content[4000:]).status_code, 204)
+
+        with mock.patch('video.views.process_new_video') as process, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.finalize_url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.content).hexdigest())
+        video = Video.objects.get(pk=response.data['video']['id'])
+        with video.video_file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(uploads.session_path(self.session)))
+        process.assert_called_once_with(video)
+
+        # A retried finalize returns the same video
+        self.assertEqual(self.client.post(self.finalize_url).data['video']['id'], video.id)
+        self.assertEqual(self.send(len(self.content), b'x').status_code, 409)
+
+    def test_offset_mismatch_reports_the_current_offset(self):
+        self.send(0, self.content[:100])
+        response = self.send(50, self.content[50:200])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '100')
+        self.assertEqual(self.send(100, self.content[100:]).status_code, 204)
+
+    def test_chunk_past_the_declared_length(self):
+        self.assertEqual(self.send(0, self.content + b'x').status_code, 400)
+
+    def test_incomplete_upload_is_not_finalized(self):
+        self.send(0, self.content[:100])
+        response = self.client.post(self.finalize_url)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 100)
+
+    def test_checksum_mismatch_on_finalize(self):
+        self.send(0, self.content)
+        response = self.client.post(self.finalize_url, {'sha256': hashlib.sha256(b'other').hexdigest()})
+        self.assertEqual(response.status_code, 400)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'active')
+        self.assertFalse(Video.objects.filter(title='Upload').exists())
+
+        response = self.client.post(self.finalize_url, {'sha256': hashlib.sha256(self.content).hexdigest().upper()})
+        self.assertEqual(response.status_code, 201)
+
+    def test_hash_is_rebuilt_from_disk_after_a_cache_miss(self):
+        self.send(0, self.content[:3000])
+        # The next chunk reaches a worker without the running hash
+        uploads._hashers.clear()
+        with mock.patch('video.uploads.hashlib.sha256', wraps=hashlib.sha256) as sha256:
+            self.send(3000, self.content[3000:])
+        sha256.assert_called_once_with()
+        response = self.client.post(self.finalize_url)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.content).hexdigest())
+
+    def test_abandoned_sessions_expire(self):
+        self.send(0, self.content[:100])
+        path = uploads.session_path(self.session)
+        fresh = self.client.post(reverse('upload-session-create'), {
+            'title': 'Fresh', 'filename': 'fresh.mp4', 'upload_length': 10,
+        }).data['id']
+        UploadSession.objects.filter(pk=self.session.pk).update(updated_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(tasks.expire_upload_sessions_task(), 'Expired 1 upload sessions.')
+        self.assertFalse(os.path.exists(path))
+        self.assertNotIn(self.session.pk, uploads._hashers)
+        self.assertEqual(list(UploadSession.objects.values_list('pk', flat=True)), [uuid.UUID(str(fresh))])
+        self.assertEqual(self.client.head(self.url).status_code, 404)
+
+
+class BlobStorageTests(MediaTestMixin, TestCase):
+    content = b'video bytes'
+
+    def blob_path(self, ext='mp4'):
+        return os.path.join(self.media_root, blob_upload_path(hashlib.sha256(self.content).hexdigest(), ext))
+
+    def session_file(self):
+        path = os.path.join(self.media_root, 'uploads', 'session.mp4')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(self.content)
+        return path
+
+    def rolled_back(self, store):
+        try:
+            with transaction.atomic():
+                store()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+    def test_uploads_are_written_on_commit_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rolled_back(lambda: storage.store_uploaded_file(SimpleUploadedFile('a.mp4', self.content)))
+        self.assertFalse(os.path.exists(self.blob_path()))
+        self.assertFalse(MediaBlob.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            blob, created = storage.store_uploaded_file(SimpleUploadedFile('a.mp4', self.content))
+        self.assertTrue(created)
+        self.assertEqual(blob.file.path, self.blob_path())
+        with open(self.blob_path(), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_adopted_files_stay_with_the_session_after_a_rollback(self):
+        path = self.session_file()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rolled_back(lambda: storage.adopt_file(path, hashlib.sha256(self.content).hexdigest()))
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(self.blob_path()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            storage.adopt_file(path, hashlib.sha256(self.content).hexdigest())
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(self.blob_path()))
+
+    def test_adopting_known_content_drops_the_copy_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            storage.store_uploaded_file(SimpleUploadedFile('a.mp4', self.content))
+        path = self.session_file()
+        with self.captureOnCommitCallbacks(execute=True):
+            blob, created = storage.adopt_file(path, hashlib.sha256(self.content).hexdigest())
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(created)
+        self.assertEqual(blob.ref_count, 2)
+        self.assertFalse(os.path.exists(path))
+
+
+FFPROBE_STREAMS = {
+    'streams': [
+        {
+            'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080, 'pix_fmt': 'yuv420p',
+            'avg_frame_rate': '30000/1001', 'r_frame_rate': '30/1', 'duration': '12.345', 'bit_rate': '4500000',
+        },
+        {'codec_type': 'audio', 'codec_name': 'aac', 'channels': 2, 'sample_rate': '48000', 'bit_rate': '128000'},
+    ],
+    'format': {'format_name': 'mov,mp4,m4a,3gp,3g2,mj2', 'duration': '12.400000', 'bit_rate': '4700000'},
+}
+FFPROBE_KEYFRAMES = {'frames': [{'pts_time': '0.000'}, {'pts_time': '2.002'}, {'best_effort_timestamp_time': '4.004'}]}
+
+
+class ProbeMediaTests(SimpleTestCase):
+    def probe(self, streams, keyframes=FFPROBE_KEYFRAMES):
+        def fake_probe(path, **kwargs):
+            if 'skip_frame' in kwargs:
+                if isinstance(keyframes, Exception):
+                    raise keyframes
+                return keyframes
+            return streams
+
+        with mock.patch('video.probe.ffmpeg.probe', side_effect=fake_probe):
+            return probe.probe_media('/media/clip.mp4')
+
+    def test_fields(self):
+        self.assertEqual(self.probe(FFPROBE_STREAMS), {
+            'container': 'mov,mp4,m4a,3gp,3g2,mj2',
+            'duration': 12.345,
+            'bit_rate': 4700000,
+            'video_codec': 'h264',
+            'width': 1920,
+            'height': 1080,
+            'fps': 29.97,
+            'pixel_format': 'yuv420p',
+            'video_bit_rate': 4500000,
+            'audio_codec': 'aac',
+            'audio_channels': 2,
+            'audio_sample_rate': 48000,
+            'audio_bit_rate': 128000,
+            'keyframe_interval': 2.002,
+        })
+
+    def test_fallbacks(self):
+        video = {
+            'codec_type': 'video', 'codec_name': 'vp9', 'width': 'N/A',
+            'avg_frame_rate': '0/0', 'r_frame_rate': '25/1', 'bit_rate': 'N/A',
+        }
+        metadata = self.probe({'streams': [video], 'format': {'duration': '8.5'}}, keyframes={'frames': []})
+        self.assertEqual(metadata['duration'], 8.5)
+        self.assertEqual(metadata['fps'], 25.0)
+        self.assertEqual((metadata['width'], metadata['height'], metadata['video_bit_rate']), (None, None, None))
+        self.assertEqual((metadata['container'], metadata['bit_rate']), ('', None))
+        self.assertEqual((metadata['audio_codec'], metadata['audio_channels']), ('', None))
+        self.assertIsNone(metadata['keyframe_interval'])
+
+    def test_keyframe_scan_failure_is_not_fatal(self):
+        metadata = self.probe(FFPROBE_STREAMS, keyframes=ffmpeg.Error('ffprobe', b'', b'broken'))
+        self.assertIsNone(metadata['keyframe_interval'])
+        self.assertEqual(metadata['video_codec'], 'h264')
+
+    def test_no_video_stream(self):
+        audio_only = {'streams': [FFPROBE_STREAMS['streams'][1]], 'format': FFPROBE_STREAMS['format']}
+        with self.assertRaises(ValueError):
+            self.probe(audio_only)
+
+    def test_probe_duration_prefers_the_video_stream(self):
+        with mock.patch('video.probe.ffmpeg.probe', return_value=FFPROBE_STREAMS):
+            self.assertEqual(probe.probe_duration('/media/clip.mp4'), 12.345)
+        no_stream_duration = {'streams': [{'codec_type': 'video'}], 'format': {'duration': '3'}}
+        with mock.patch('video.probe.ffmpeg.probe', return_value=no_stream_duration):
+            self.assertEqual(probe.probe_duration('/media/clip.mp4'), 3.0)
+
+
+class ProbeVideoTaskTests(MediaTestMixin, TestCase):
+    def test_metadata_is_stored_and_duration_synced(self):
+        video = self.make_video(b'data')
+        with mock.patch('video.probe.probe_media', return_value={'container': 'mp4', 'duration': 12.5}):
+            self.assertEqual(tasks.probe_video_task(video.id), f'Successfully probed video ID {video.id}.')
+        video.refresh_from_db()
+        self.assertEqual(video.metadata.container, 'mp4')
+        self.assertEqual(video.duration, timedelta(seconds=12.5))
+
+    def test_unreadable_file(self):
+        video = self.make_video(b'data')
+        with mock.patch('video.probe.probe_media', side_effect=ValueError('No video stream found')):
+            self.assertIn('No video stream found', tasks.probe_video_task(video.id))
+        self.assertFalse(VideoMetadata.objects.filter(video=video).exists())
+
+
+class LoadedModel(SimpleNamespace):
+    def half(self):
+        return LoadedModel(name=self.name, device=self.device, precision='fp16')
+
+
+@override_settings(WHISPER_MODEL='base', WHISPER_DEVICE='cpu', WHISPER_PRECISION='auto', WHISPER_MODEL_CACHE_SIZE=2)
+class WhisperModelCacheTests(SimpleTestCase):
+    def setUp(self):
+        for name, value in (
+            ('_models', OrderedDict()),
+            ('_stats', {'hits': 0, 'misses': 0, 'loads': 0, 'evictions': 0, 'load_seconds': 0.0}),
+            ('_load_counts', {}),
+        ):
+            patcher = mock.patch.object(whisper_models, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            whisper_models.whisper, 'load_model',
+            side_effect=lambda name, device: LoadedModel(name=name, device=device, precision='fp32'),
+        )
+        self.load_model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_models_are_loaded_once_per_key(self):
+        first = whisper_models.get_model()
+        self.assertIs(whisper_models.get_model('base'), first)
+        self.assertEqual(self.load_model.call_count, 1)
+        stats = whisper_models.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['loads']), (1, 1, 1))
+        self.assertEqual(stats['cached'], [['base', 'cpu', 'fp32']])
+        self.assertEqual(stats['load_counts'], {'base/cpu/fp32': 1})
+
+    def test_least_recently_used_model_is_evicted(self):
+        whisper_models.get_model('tiny')
+        whisper_models.get_model('base')
+        whisper_models.get_model('tiny')  # base is now the oldest
+        whisper_models.get_model('small')
+        stats = whisper_models.cache_stats()
+        self.assertEqual(stats['cached'], [['tiny', 'cpu', 'fp32'], ['small', 'cpu', 'fp32']])
+        self.assertEqual(stats['evictions'], 1)
+
+        whisper_models.get_model('base')
+        self.assertEqual(whisper_models.cache_stats()['load_counts']['base/cpu/fp32'], 2)
+
+    def test_precision_follows_the_device(self):
+        gpu_model = whisper_models.get_model('base', device='cuda')
+        self.assertEqual((gpu_model.device, gpu_model.precision), ('cuda', 'fp16'))
+        self.assertEqual(whisper_models.transcribe_options(device='cuda'), {'fp16': True})
+        # fp16 is never used on CPU, whatever is asked for
+        self.assertEqual(whisper_models.get_model('base', precision='fp16').precision, 'fp32')
+        self.assertEqual(whisper_models.transcribe_options(precision='fp16'), {'fp16': False})
+
+    def test_failed_preload_is_logged_not_raised(self):
+        self.load_model.side_effect = RuntimeError('no such model')
+        with self.assertLogs('video.whisper_models', 'ERROR'):
+            whisper_models.warm(['missing'])
+        self.assertEqual(whisper_models.cache_stats()['cached'], [])
+
+
+class WaveformPeaksTests(SimpleTestCase):
+    def test_min_max_per_bucket_in_8_bits(self):
+        samples = np.array([0, 256, -512, 32767, -32768, 100], dtype=np.int16)
+        self.assertEqual(audio.compute_peaks(samples, 2).tolist(), [0, 1, -2, 127, -128, 0])
+
+    def test_last_bucket_is_padded_with_its_own_samples(self):
+        samples = np.array([1024, 2048, 4096], dtype=np.int16)
+        self.assertEqual(audio.compute_peaks(samples, 2).tolist(), [4, 8, 16, 16])
+        self.assertEqual(audio.compute_peaks(np.zeros(0, dtype=np.int16), 2).tolist(), [])
+
+    def test_blocks_match_a_single_pass(self):
+        samples = np.random.default_rng(0).integers(-32768, 32768, 1001, dtype=np.int16)
+        rows = np.concatenate([samples, samples[-1:].repeat(9)]).reshape(-1, 10)
+        expected = np.stack([rows.min(axis=1) >> 8, rows.max(axis=1) >> 8], axis=1).ravel().tolist()
+        with mock.patch.object(audio, 'PEAKS_BLOCK_BUCKETS', 3):
+            self.assertEqual(audio.compute_peaks(samples, 10).tolist(), expected)
+
+    def test_peaks_file_from_extracted_audio(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        wav_path = os.path.join(directory, 'audio.wav')
+        write_counting_wav(wav_path, 3)
+        samples = audio.map_samples(wav_path)
+        self.assertEqual(len(samples), 3 * SAMPLE_RATE)
+
+        peaks_path = os.path.join(directory, 'waveform', 'peaks.json')
+        self.assertEqual(audio.write_peaks(peaks_path, samples, SAMPLE_RATE), 3)
+        with open(peaks_path) as f:
+            peaks = json.load(f)
+        self.assertEqual(
+            {key: peaks[key] for key in ('version', 'channels', 'sample_rate', 'samples_per_pixel', 'bits', 'length')},
+            {'version': 2, 'channels': 1, 'sample_rate': SAMPLE_RATE, 'samples_per_pixel': SAMPLE_RATE,
+             'bits': 8, 'length': 3},
+        )
+        # Samples 0, 1 and 2 are all below one 8-bit step
+        self.assertEqual(peaks['data'], [0] * 6)
+
+
+CAPTION_SEGMENTS = [
+    {'start': 0.0, 'end': 1.5, 'text': 'Hello there.'},
+    {'start': 3661.0004, 'end': 3662.9996, 'text': 'An hour in.'},
+]
+
+
+class CaptionsTests(SimpleTestCase):
+    def test_vtt(self):
+        self.assertEqual(captions.render_vtt(CAPTION_SEGMENTS), (
+            'WEBVTT\n\n'
+            '00:00:00.000 --> 00:00:01.500\nHello there.\n\n'
+            '01:01:01.000 --> 01:01:03.000\nAn hour in.\n'
+        ))
+
+    def test_srt(self):
+        self.assertEqual(captions.render_srt(CAPTION_SEGMENTS), (
+            '1\n00:00:00,000 --> 00:00:01,500\nHello there.\n\n'
+            '2\n01:01:01,000 --> 01:01:03,000\nAn hour in.\n'
+        ))
+
+
+class CaptionsViewTests(MediaTestMixin, TestCase):
+    def test_rendered_once_per_transcript_version(self):
+        cache.clear()
+        video = self.make_video()
+        save_transcript(Video.objects.filter(pk=video.pk), WHISPER_RESULT, store_tokens=False)
+        transcript = Transcript.objects.get(video=video)
+        first = captions.render_captions(transcript.pk, transcript.version, 'srt')
+        self.assertEqual(first, '1\n00:00:00,000 --> 00:00:01,500\nHello there.\n')
+        with self.assertNumQueries(0):
+            self.assertEqual(captions.render_captions(transcript.pk, transcript.version, 'srt'), first)
+
+        save_transcript(Video.objects.filter(pk=video.pk), {**WHISPER_RESULT, 'segments': [
+            {'start': 2.0, 'end': 3.0, 'text': 'Bye.'},
+        ]}, store_tokens=False)
+        transcript.refresh_from_db()
+        self.assertIn('Bye.', captions.render_captions(transcript.pk, transcript.version, 'srt'))
+
+    def test_captions_endpoint_revalidates(self):
+        video = self.make_video()
+        save_transcript(Video.objects.filter(pk=video.pk), WHISPER_RESULT, store_tokens=False)
+        url = reverse('video-captions', kwargs={'video_id': video.id, 'caption_format': 'vtt'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/vtt; charset=utf-8')
+        self.assertIn(b'Hello there.', response.content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        missing = reverse('video-captions', kwargs={'video_id': video.id, 'caption_format': 'txt'})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_versioned_urls_are_immutable(self):
+        video = self.make_video()
+        save_transcript(Video.objects.filter(pk=video.pk), WHISPER_RESULT, store_tokens=False)
+        url = reverse('video-captions', kwargs={'video_id': video.id, 'caption_format': 'srt'})
+        version = Transcript.objects.get(video=video).version
+        self.assertEqual(self.client.get(url, {'v': version})['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.client.get(url, {'v': version - 1})['Cache-Control'], 'public, no-cache')
+
+    def test_private_captions_need_access(self):
+        video = self.make_video(visibility='private')
+        url = reverse('video-captions', kwargs={'video_id': video.id, 'caption_format': 'vtt'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        save_transcript(Video.objects.filter(pk=video.pk), WHISPER_RESULT, store_tokens=False)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get(url, {'token': stream_token(video.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_video_without_transcript(self):
+        video = self.make_video()
+        url = reverse('video-captions', kwargs={'video_id': video.id, 'caption_format': 'vtt'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class VideoListQueryCountTests(MediaTestMixin, TestCase):
+    """A page of videos costs the same queries however many videos it holds"""
+
+    def videos(self, count):
+        videos = [self.make_video(name=f'{self.created + i}.mp4') for i in range(count)]
+        self.created += count
+        for video in videos:
+            VideoLike.objects.create(user=self.uploader, video=video, reaction='like')
+            counters.increment('video', video.id, {'likes': 1})
+        return videos
+
+    def setUp(self):
+        super().setUp()
+        self.created = 0
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.uploader)}'}
+
+    def queries(self, headers):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('video-list'), **headers)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response.data['results']
+
+    def test_constant_queries(self):
+        self.videos(1)
+        single = {False: self.queries({})[0], True: self.queries(self.auth)[0]}
+        self.videos(19)
+        for signed_in, headers in ((False, {}), (True, self.auth)):
+            with self.subTest(signed_in=signed_in):
+                count, results = self.queries(headers)
+                self.assertEqual(count, single[signed_in])
+                self.assertEqual(len(results), 20)
+                self.assertEqual({video['likes'] for video in results}, {1})
+                self.assertEqual({video['user_reaction'] for video in results}, {'like' if signed_in else None})
+
+
+class ViewBufferTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer = LocalViewBuffer()
+        patcher = mock.patch.dict('video.view_buffer._buffers', {None: self.buffer})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.video = self.make_video()
+        self.other = self.make_video(name='other.mp4')
+
+    def test_buffer_follows_the_setting(self):
+        self.assertIs(get_buffer(), self.buffer)
+        with override_settings(VIDEO_VIEW_BUFFER_URL='redis://localhost:6379/15'):
+            self.assertIsInstance(get_buffer(), RedisViewBuffer)
+        self.assertIs(get_buffer(), self.buffer)
+
+    def test_repeat_views_are_dropped_when_recorded(self):
+        self.assertTrue(record_view(self.video.id, None, '10.0.0.1'))
+        self.assertFalse(record_view(self.video.id, None, '10.0.0.1'))
+        self.assertTrue(record_view(self.video.id, self.uploader.id, '10.0.0.1'))
+        self.assertTrue(record_view(self.other.id, None, '10.0.0.1'))
+        self.assertEqual(self.buffer.pending(), 3)
+
+    def test_addresses_are_validated_and_normalized(self):
+        self.assertTrue(record_view(self.video.id, None, ' 2001:DB8:0::1 '))
+        self.assertTrue(record_view(self.other.id, None, 'fe80::1%eth0'))
+        with self.assertLogs('video.view_buffer', 'WARNING'):
+            self.assertFalse(record_view(self.video.id, None, 'unknown, ' + 'x' * 100))
+        self.assertEqual(
+            self.buffer.pop(10), [(self.video.id, None, '2001:db8::1'), (self.other.id, None, 'fe80::1')]
+        )
+
+    def test_flush_counts_each_new_viewer_once(self):
+        VideoView.objects.create(video=self.video, user=None, ip_address='10.0.0.1')
+        deleted = self.make_video(name='deleted.mp4')
+        deleted_id = deleted.id
+        deleted.delete()
+        self.buffer.requeue([
+            (self.video.id, None, '10.0.0.1'),  # already stored
+            (self.video.id, None, '10.0.0.2'),
+            (self.video.id, None, '10.0.0.2'),  # twice in the batch
+            (self.video.id, self.uploader.id, '10.0.0.2'),
+            (self.other.id, None, '10.0.0.2'),
+            (deleted_id, None, '10.0.0.2'),
+        ])
+        self.assertEqual(flush_views(batch_size=4), 3)
+        self.video.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.video.views, self.other.views), (2, 1))
+        self.assertEqual(VideoView.objects.count(), 4)
+        self.assertEqual(self.buffer.pending(), 0)
+
+    def test_database_outage_requeues_the_batch(self):
+        events = [(self.video.id, None, '10.0.0.1'), (self.other.id, None, '10.0.0.1')]
+        self.buffer.requeue(events)
+        with mock.patch('video.view_buffer._store_views', side_effect=OperationalError('gone away')):
+            with self.assertRaises(OperationalError):
+                flush_views()
+        self.assertEqual(self.buffer.pop(10), events)
+
+    def test_bad_events_are_dead_lettered_not_retried(self):
+        bad = (self.video.id, None, '10.0.0.66')
+        events = [(self.video.id, None, '10.0.0.1'), bad, (self.other.id, None, '10.0.0.1')]
+        real_store = view_buffer._store_views
+
+        def store(batch):
+            if bad in batch:
+                raise DataError('Data too long for column ip_address')
+            return real_store(batch)
+
+        self.buffer.requeue(events)
+        with mock.patch('video.view_buffer._store_views', side_effect=store):
+            with self.assertLogs('video.view_buffer', 'ERROR'):
+                self.assertEqual(flush_views(), 2)
+        self.assertEqual(self.buffer.pending(), 0)
+        self.assertEqual(self.buffer._dead, [bad])
+        self.assertEqual(VideoView.objects.count(), 2)
+
+    def test_forwarded_for_garbage_falls_back_to_the_peer_address(self):
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.uploader)}'}
+        url = reverse('video-detail', kwargs={'video_id': self.video.id})
+        self.client.get(url, HTTP_X_FORWARDED_FOR='not-an-ip-' + 'x' * 60 + ', 10.0.0.9', **auth)
+        self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.7, 10.0.0.9', **auth)
+        self.assertEqual([address for _, _, address in self.buffer.pop(10)], ['127.0.0.1', '203.0.113.7'])
+
+
+class EngagementCounterTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = self.make_video()
+        self.other = self.make_video(name='other.mp4')
+
+    def totals(self, video):
+        video = counters.with_totals(Video.objects.all(), 'video').get(pk=video.pk)
+        return counters.total(video, 'likes'), counters.total(video, 'dislikes')
+
+    def test_repeated_increments_of_one_shard_add_up(self):
+        with mock.patch('video.counters.random.randrange', return_value=3):
+            for _ in range(5):
+                counters.increment('video', self.video.id, {'likes': 1, 'dislikes': 0})
+            counters.increment('video', self.video.id, {'likes': -1, 'dislikes': 2})
+        self.assertEqual(
+            list(EngagementCounter.objects.order_by('field').values_list('field', 'shard', 'value')),
+            [('dislikes', 3, 2), ('likes', 3, 4)],
+        )
+        self.assertEqual(self.totals(self.video), (4, 2))
+
+    def test_increments_spread_over_shards(self):
+        for _ in range(200):
+            counters.increment('video', self.video.id, {'likes': 1})
+        shards = EngagementCounter.objects.filter(object_id=self.video.id).count()
+        self.assertTrue(1 < shards <= counters.shard_count())
+        self.assertEqual(self.totals(self.video), (200, 0))
+        self.assertEqual(self.totals(self.other), (0, 0))
+
+    def test_totals_survive_compaction(self):
+        Video.objects.filter(pk=self.video.pk).update(likes=10)
+        for _ in range(30):
+            counters.increment('video', self.video.id, {'likes': 1})
+            counters.increment('video', self.other.id, {'likes': 2, 'dislikes': 1})
+        counters.increment('video', self.video.id, {'likes': -5})
+        counters.increment('comment', self.video.id, {'likes': 1})
+        before = self.totals(self.video), self.totals(self.other)
+        shards = EngagementCounter.objects.filter(kind='video').count()
+
+        self.assertEqual(counters.compact('video', Video, batch_size=1), shards)
+        self.assertFalse(EngagementCounter.objects.filter(kind='video').exists())
+        # Comment shards with the same id are not folded into the video
+        self.assertEqual(EngagementCounter.objects.filter(kind='comment').count(), 1)
+        self.assertEqual((self.totals(self.video), self.totals(self.other)), before)
+        self.video.refresh_from_db()
+        self.assertEqual((self.video.likes, self.video.dislikes), (35, 0))
+        self.assertEqual(counters.compact('video', Video), 0)
+
+    def test_upsert_dialects(self):
+        rows = [('video', 1, 'likes', 0, 1)]
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            self.assertTrue(counters._upsert_sql(rows).endswith('ON DUPLICATE KEY UPDATE value = value + VALUES(value)'))
+        for vendor in ('postgresql', 'sqlite'):
+            with self.subTest(vendor=vendor), mock.patch.object(connection, 'vendor', vendor):
+                self.assertIn('ON CONFLICT (kind, object_id, field, shard) DO UPDATE', counters._upsert_sql(rows))
+        with mock.patch.object(connection, 'vendor', 'oracle'):
+            self.assertIsNone(counters._upsert_sql(rows))
+
+    def test_portable_fallback(self):
+        with mock.patch('video.counters._upsert_sql', return_value=None), \
+                mock.patch('video.counters.random.randrange', return_value=0):
+            counters.increment('video', self.video.id, {'likes': 1})
+            counters.increment('video', self.video.id, {'likes': 1, 'dislikes': -1})
+        self.assertEqual(EngagementCounter.objects.count(), 2)
+        self.assertEqual(self.totals(self.video), (2, -1))
@@ -0,0 +1,130 @@
+import logging
+import re
+from collections import Counter
+
+import ffmpeg
+import numpy as np
+
+from . import audio, whisper_models
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = audio.SAMPLE_RATE
+# Whisper's seek offsets count mel frames (10ms each)
+FRAMES_PER_SECOND = 100
+# A segment in the next window starting this close to the end of the last
+# kept segment is treated as the same speech
+STITCH_TOLERANCE = 0.5
+
+
+def window_offsets(duration, window_seconds, overlap_seconds):
+    """
+    Start times of the overlapping windows covering ``duration`` seconds.
+
+    Consecutive windows share ``overlap_seconds``; a window that would only
+    repeat the overlap of the previous one is left out.
+    """
+    if overlap_seconds >= window_seconds:
+        raise ValueError('Overlap must be shorter than the window')
+    step = window_seconds - overlap_seconds
+    offsets = [0.0]
+    while offsets[-1] + window_seconds < duration:
+        offsets.append(offsets[-1] + step)
+    return offsets
+
+
+def read_window(path, offset, seconds):
+    """
+    ``seconds`` of audio from ``offset`` as float32 mono 16 kHz samples.
+
+    Audio already extracted by extract_audio_task is sliced from a memory map;
+    anything else is decoded through an ffmpeg pipe.
+    """
+    if audio.is_pcm_wav(path):
+        samples = audio.map_samples(path)
+        start = int(offset * SAMPLE_RATE)
+        return samples[start:start + int(seconds * SAMPLE_RATE)].astype(np.float32) / 32768.0
+
+    data, _ = (
+        ffmpeg
+        .input(path, ss=offset, t=seconds)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar=SAMPLE_RATE)
+        .global_args('-nostdin', '-loglevel', 'error')
+        .run(capture_stdout=True)
+    )
+    return np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2').astype(np.float32) / 32768.0
+
+
+def transcribe_window(path, offset, seconds, model_name=None):
+    """
+    Transcribe one window with this process's cached model and shift its
+    timestamps to the file's timeline. Returns ``{'offset', 'language',
+    'segments'}``.
+    """
+    model = whisper_models.get_model(model_name)
+    result = model.transcribe(
+        read_window(path, offset, seconds),
+        condition_on_previous_text=False,
+        **whisper_models.transcribe_options(model_name),
+    )
+    segments = []
+    for segment in result.get('segments', []):
+        segment = dict(segment)
+        segment['start'] += offset
+        segment['end'] += offset
+        segment['seek'] = segment.get('seek', 0) + int(offset * FRAMES_PER_SECOND)
+        for word in segment.get('words') or []:
+            word['start'] += offset
+            word['end'] += offset
+        segments.append(segment)
+    return {'offset': offset, 'language': result.get('language'), 'segments': segments}
+
+
+def _normalize(text):
+    return re.sub(r'[^\w\s]', '', text).lower().split()
+
+
+def stitch_windows(windows, overlap_seconds):
+    """
+    Merge per-window segments into one transcript.
+
+    ``windows`` is a list of ``(offset, segments)`` in order. Inside each
+    overlap, segments are taken from the earlier window up to the middle of the
+    overlap and from the later window after it; a segment repeating the last
+    kept one is dropped.
+    """
+    merged = []
+    for i, (offset, segments) in enumerate(windows):
+        if i + 1 < len(windows):
+            boundary = windows[i + 1][0] + overlap_seconds / 2
+        else:
+            boundary = float('inf')
+        for segment in segments:
+            if segment['start'] >= boundary:
+                continue
+            if merged:
+                previous = merged[-1]
+                if segment['start'] < previous['end'] - STITCH_TOLERANCE:
+                    continue
+                if _normalize(segment['text']) == _normalize(previous['text']):
+                    continue
+            merged.append(segment)
+
+    for index, segment in enumerate(merged):
+        segment['id'] = index
+    return merged
+
+
+def merge_windows(windows, overlap_seconds):
+    """
+    Combine the results of transcribe_window() into one result shaped like
+    ``model.transcribe()`` (text, segments, language).
+    """
+    windows = sorted(windows, key=lambda window: window['offset'])
+    segments = stitch_windows([(window['offset'], window['segments']) for window in windows], overlap_seconds)
+    languages = Counter(window['language'] for window in windows if window['language'])
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': languages.most_common(1)[0][0] if languages else None,
+    }
@@ -0,0 +1,92 @@
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Transcript, TranscriptSegment
+from .search import index_transcript
+
+
+def pack_tokens(segments):
+    """
+    Pack the token ids of Whisper segments into compressed bytes.
+
+    Layout: segment count, per-segment token counts, then all tokens, each as
+    little-endian uint32.
+    """
+    counts = [len(segment.get('tokens') or []) for segment in segments]
+    tokens = [token for segment in segments for token in segment.get('tokens') or []]
+    packed = np.array([len(counts)] + counts + tokens, dtype='<u4').tobytes()
+    return zlib.compress(packed, 6)
+
+
+def unpack_tokens(data):
+    """Inverse of pack_tokens: a list of token-id lists, one per segment"""
+    values = np.frombuffer(zlib.decompress(bytes(data)), dtype='<u4')
+    count = int(values[0])
+    counts = values[1:count + 1]
+    tokens = values[count + 1:]
+    if not count:
+        return []
+    return [part.tolist() for part in np.split(tokens, np.cumsum(counts)[:-1])]
+
+
+def save_transcript(videos, result, store_tokens=None):
+    """
+    Store a Whisper result as the transcript of every video in the queryset
+    ``videos``.
+
+    Only the text, language and segment timings are kept; token ids are packed
+    and stored when ``store_tokens`` (default TRANSCRIPT_STORE_TOKENS) is set.
+    Replacing a transcript bumps its version and reindexes it for search.
+    """
+    if store_tokens is None:
+        store_tokens = getattr(settings, 'TRANSCRIPT_STORE_TOKENS', False)
+    segments = result.get('segments') or []
+    fields = {
+        'language': result.get('language') or '',
+        'text': (result.get('text') or '').strip(),
+        'tokens': pack_tokens(segments) if store_tokens else None,
+    }
+
+    with transaction.atomic():
+        for video_id in videos.values_list('pk', flat=True):
+            transcript, created = Transcript.objects.select_for_update().get_or_create(
+                video_id=video_id, defaults=fields
+            )
+            if not created:
+                for name, value in fields.items():
+                    setattr(transcript, name, value)
+                transcript.version = F('version') + 1
+                transcript.save()
+                transcript.segments.all().delete()
+            TranscriptSegment.objects.bulk_create([
+                TranscriptSegment(
+                    transcript=transcript,
+                    index=index,
+                    start=segment['start'],
+                    end=segment['end'],
+                    text=segment['text'].strip(),
+                )
+                for index, segment in enumerate(segments)
+            ])
+            index_transcript(transcript)
+
+
+def copy_transcript(source, video):
+    """Give ``video`` a copy of the transcript of ``source``, if it has one"""
+    transcript = Transcript.objects.filter(video=source).first()
+    if transcript is None:
+        return
+    segments = list(transcript.segments.all())
+    transcript.pk = None
+    transcript.video = video
+    transcript.version = 1
+    transcript.save()
+    for segment in segments:
+        segment.pk = None
+        segment.transcript = transcript
+    TranscriptSegment.objects.bulk_create(segments)
+    index_transcript(transcript)
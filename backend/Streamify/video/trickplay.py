@@ -0,0 +1,68 @@
+import math
+import os
+
+import ffmpeg
+
+
+def format_timestamp(seconds):
+    """Format seconds as a WebVTT timestamp (HH:MM:SS.mmm)"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def tile_size(source_width, source_height, tile_width):
+    """Scale the source to ``tile_width`` keeping its aspect ratio (even height)"""
+    height = round(source_height * tile_width / source_width / 2) * 2
+    return tile_width, max(height, 2)
+
+
+def generate_sprites(source_path, output_dir, interval, tile_width, tile_height, columns, rows, image_format='jpg'):
+    """
+    Sample one frame every ``interval`` seconds and tile them into sprite sheets.
+
+    Sheets are written as ``sprite_001.<format>``, ``sprite_002.<format>``...
+    and their file names returned in order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pattern = os.path.join(output_dir, f'sprite_%03d.{image_format}')
+    (
+        ffmpeg
+        .input(source_path)
+        .video
+        .filter('fps', fps=f'1/{interval}')
+        .filter('scale', tile_width, tile_height)
+        .filter('tile', f'{columns}x{rows}')
+        .output(pattern, **{'q:v': 5, 'vsync': 'vfr'})
+        .run(quiet=True, overwrite_output=True)
+    )
+    return sorted(
+        name for name in os.listdir(output_dir)
+        if name.startswith('sprite_') and name.endswith(f'.{image_format}')
+    )
+
+
+def write_vtt(path, sprites, duration, interval, tile_width, tile_height, columns, rows):
+    """
+    Write a WebVTT thumbnail track mapping each interval to its sprite tile.
+
+    Cue payloads use the ``sprite.jpg#xywh=x,y,w,h`` media fragment convention,
+    relative to the VTT file.
+    """
+    per_sheet = columns * rows
+    frame_count = min(math.ceil(duration / interval), len(sprites) * per_sheet)
+    lines = ['WEBVTT', '']
+    for index in range(frame_count):
+        start = index * interval
+        end = min(start + interval, duration)
+        sheet, position = divmod(index, per_sheet)
+        x = (position % columns) * tile_width
+        y = (position // columns) * tile_height
+        lines.append(f"{format_timestamp(start)} --> {format_timestamp(end)}")
+        lines.append(f"{sprites[sheet]}#xywh={x},{y},{tile_width},{tile_height}")
+        lines.append('')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+    return path
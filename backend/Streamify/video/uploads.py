@@ -0,0 +1,116 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Bytes read from the request and written to disk per iteration
+CHUNK_COPY_SIZE = 1024 * 1024
+
+# Running SHA-256 states kept per process, keyed by session id
+MAX_CACHED_HASHERS = 128
+
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class OffsetMismatch(Exception):
+    """The client's Upload-Offset does not match the bytes received so far"""
+
+
+def session_path(session):
+    """Absolute path of the file an upload session writes to"""
+    return os.path.join(settings.MEDIA_ROOT, session.file_path)
+
+
+def create_session_file(session):
+    """Create the empty target file for a new upload session"""
+    path = session_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    os.chmod(path, settings.FILE_UPLOAD_PERMISSIONS)
+    _store_hasher(session.pk, 0, hashlib.sha256())
+
+
+def _store_hasher(session_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher)
+        _hashers.move_to_end(session_id)
+        while len(_hashers) > MAX_CACHED_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def _get_hasher(session):
+    """
+    Return the SHA-256 state for the bytes received so far.
+
+    Chunks normally arrive at the worker that already holds the running hash.
+    When they don't (another worker, a restart), the state is rebuilt once by
+    re-reading the received prefix from disk.
+    """
+    with _hashers_lock:
+        cached = _hashers.get(session.pk)
+    if cached and cached[0] == session.offset:
+        return cached[1].copy()
+
+    hasher = hashlib.sha256()
+    remaining = session.offset
+    with open(session_path(session), 'rb') as f:
+        while remaining > 0:
+            data = f.read(min(CHUNK_COPY_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+
+def append_chunk(session, offset, stream, length):
+    """
+    Write ``length`` bytes from ``stream`` at ``offset`` of the session's file.
+
+    The data goes straight to disk in small blocks while the running SHA-256 is
+    updated, so memory use does not depend on the chunk size. The caller must
+    hold a lock on the session row. Returns the new offset.
+    """
+    if offset != session.offset:
+        raise OffsetMismatch(f'Expected offset {session.offset}, got {offset}.')
+    if length < 0 or offset + length > session.upload_length:
+        raise ValueError('Chunk exceeds the declared upload length.')
+
+    hasher = _get_hasher(session)
+    written = 0
+    with open(session_path(session), 'r+b') as f:
+        f.seek(offset)
+        f.truncate()
+        while written < length and stream is not None:
+            try:
+                data = stream.read(min(CHUNK_COPY_SIZE, length - written))
+            except OSError:
+                # Client went away mid-chunk; keep what arrived so it can resume
+                break
+            if not data:
+                break
+            f.write(data)
+            hasher.update(data)
+            written += len(data)
+
+    new_offset = offset + written
+    _store_hasher(session.pk, new_offset, hasher)
+    return new_offset
+
+
+def session_sha256(session):
+    """Hex SHA-256 of a completed upload"""
+    return _get_hasher(session).hexdigest()
+
+
+def discard_session(session, remove_file=True):
+    """Forget the session's hash state and optionally delete its file"""
+    with _hashers_lock:
+        _hashers.pop(session.pk, None)
+    if remove_file:
+        path = session_path(session)
+        if os.path.exists(path):
+            os.remove(path)
@@ -5,12 +5,26 @@ urlpatterns = [
     # Video upload
     path('create/', views.VideoUploadView.as_view(), name='video-upload'),
     
+    # Resumable chunked upload
+    path('uploads/', views.UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('uploads/<uuid:session_id>/', views.UploadSessionView.as_view(), name='upload-session'),
+    path('uploads/<uuid:session_id>/finalize/', views.UploadSessionFinalizeView.as_view(), name='upload-session-finalize'),
+    
     # Video list and search
     path('', views.VideoListView.as_view(), name='video-list'),
     
     # Video detail
     path('<int:video_id>/', views.VideoDetailView.as_view(), name='video-detail'),
     
+    # Video streaming (supports HTTP Range requests)
+    path('<int:video_id>/stream/', views.VideoStreamView.as_view(), name='video-stream'),
+    
+    # Derived assets (HLS playlists and segments, trickplay sprites)
+    path('<int:video_id>/assets/<path:asset_path>', views.VideoAssetView.as_view(), name='video-asset'),
+    
+    # Captions rendered from the transcript (captions.vtt, captions.srt)
+    path('<int:video_id>/captions.<str:caption_format>', views.VideoCaptionsView.as_view(), name='video-captions'),
+    
     # Video delete
     path('<int:video_id>/delete/', views.VideoDeleteView.as_view(), name='video-delete'),
     
@@ -0,0 +1,318 @@
+import ipaddress
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .detail_cache import bump_video_versions
+from .models import Video, VideoView, VideoViewFilter, VideoViewSketch
+from .sketches import BloomFilter, HyperLogLog, RotatingBloomFilter
+
+logger = logging.getLogger(__name__)
+
+EVENTS_KEY = 'streamify:views:events'
+DEAD_EVENTS_KEY = 'streamify:views:dead'
+SEEN_KEY = 'streamify:views:seen:{video_id}:{user_id}:{ip_address}'
+FLUSH_BATCH_SIZE = 5000
+# Errors caused by the data of an event rather than by the database being unavailable
+BAD_EVENT_ERRORS = (DataError, IntegrityError, ValueError)
+
+
+class LocalViewBuffer:
+    """
+    In-process stand-in for the Redis buffer, for tests and single-process
+    development. Events recorded here are only visible to flushes in the same
+    process.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._seen = {}
+        self._dead = []
+        self._lock = threading.Lock()
+
+    def record(self, video_id, user_id, ip_address, ttl):
+        key = (video_id, user_id, ip_address)
+        now = time.monotonic()
+        with self._lock:
+            if self._seen.get(key, 0) > now:
+                return False
+            self._seen[key] = now + ttl
+            self._events.append(key)
+            return True
+
+    def pop(self, count):
+        with self._lock:
+            events, self._events = self._events[:count], self._events[count:]
+            now = time.monotonic()
+            self._seen = {key: expiry for key, expiry in self._seen.items() if expiry > now}
+            return events
+
+    def requeue(self, events):
+        with self._lock:
+            self._events[:0] = events
+
+    def dead_letter(self, events):
+        with self._lock:
+            self._dead.extend(events)
+
+    def pending(self):
+        return len(self._events)
+
+
+class RedisViewBuffer:
+    """
+    View events in a Redis list. A SET NX with a TTL per (video, user, ip)
+    drops repeat views before they reach the list.
+    """
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def record(self, video_id, user_id, ip_address, ttl):
+        seen = SEEN_KEY.format(video_id=video_id, user_id=user_id or '', ip_address=ip_address)
+        if not self.client.set(seen, 1, nx=True, ex=ttl):
+            return False
+        self.client.rpush(EVENTS_KEY, json.dumps([video_id, user_id, ip_address]))
+        return True
+
+    def pop(self, count):
+        # LRANGE + LTRIM in one MULTI so concurrent flushes never share events
+        pipeline = self.client.pipeline()
+        pipeline.lrange(EVENTS_KEY, 0, count - 1)
+        pipeline.ltrim(EVENTS_KEY, count, -1)
+        raw, _ = pipeline.execute()
+        return [tuple(json.loads(event)) for event in raw]
+
+    def requeue(self, events):
+        if events:
+            self.client.lpush(EVENTS_KEY, *[json.dumps(list(event)) for event in reversed(events)])
+
+    def dead_letter(self, events):
+        if events:
+            self.client.rpush(DEAD_EVENTS_KEY, *[json.dumps(list(event)) for event in events])
+
+    def pending(self):
+        return self.client.llen(EVENTS_KEY)
+
+
+_buffers = {}
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """The view buffer configured by VIDEO_VIEW_BUFFER_URL (local when unset)"""
+    url = getattr(settings, 'VIDEO_VIEW_BUFFER_URL', None) or None
+    with _buffer_lock:
+        if url not in _buffers:
+            _buffers[url] = RedisViewBuffer(url) if url else LocalViewBuffer()
+        return _buffers[url]
+
+
+def normalize_ip(value):
+    """``value`` as a canonical IPv4 or IPv6 address, or None if it is not one"""
+    try:
+        # Zone ids (fe80::1%eth0) are local to the client's host
+        return str(ipaddress.ip_address(value.strip().split('%')[0]))
+    except (AttributeError, ValueError):
+        return None
+
+
+def record_view(video_id, user_id, ip_address):
+    """
+    Buffer a view of a video. Repeat views by the same user and address
+    within VIDEO_VIEW_DEDUPE_SECONDS are dropped. Returns whether the view was
+    buffered; it reaches the database on the next flush_views().
+    """
+    ttl = getattr(settings, 'VIDEO_VIEW_DEDUPE_SECONDS', 24 * 3600)
+    address = normalize_ip(ip_address)
+    if address is None:
+        logger.warning(f'Not counting view of video {video_id} from invalid address {ip_address!r:.64}')
+        return False
+    try:
+        return get_buffer().record(video_id, user_id, address, ttl)
+    except Exception as e:
+        # Losing a view count is better than failing the page
+        logger.warning(f'Could not buffer view of video {video_id}: {e}')
+        return False
+
+
+def flush_views(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Move buffered views into the database.
+
+    With VIDEO_VIEW_TRACKING = 'exact' each batch is one query for the views
+    already recorded, one bulk INSERT of the new VideoView rows and one UPDATE
+    per video adding its new views. With 'sketch' no VideoView rows are kept:
+    recent viewers are remembered in a rotating Bloom filter and unique
+    viewers are estimated with daily HyperLogLog sketches.
+    A batch that fails because of its data is stored again one event at a
+    time and the events that still fail are set aside in a dead letter list,
+    so one bad event cannot stop view counting. Other errors put the batch
+    back for the next flush. Returns the number of views counted.
+    """
+    sketched = getattr(settings, 'VIDEO_VIEW_TRACKING', 'exact') == 'sketch'
+    store = _store_view_sketches if sketched else _store_views
+    buffer = get_buffer()
+    stored = 0
+    while True:
+        events = buffer.pop(batch_size)
+        if not events:
+            return stored
+        try:
+            stored += store(events)
+        except BAD_EVENT_ERRORS:
+            stored += _store_each(store, events, buffer)
+        except Exception:
+            buffer.requeue(events)
+            raise
+        if len(events) < batch_size:
+            return stored
+
+
+def _store_each(store, events, buffer):
+    stored = 0
+    for position, event in enumerate(events):
+        try:
+            stored += store([event])
+        except BAD_EVENT_ERRORS as e:
+            logger.error(f'Dropping view event {event!r:.200}: {e}')
+            buffer.dead_letter([event])
+        except Exception:
+            buffer.requeue(events[position:])
+            raise
+    return stored
+
+
+def _store_views(events):
+    events = list(dict.fromkeys(events))
+    with transaction.atomic():
+        # Locking the videos first serializes flushes touching them, so rows
+        # read below cannot be inserted meanwhile by another flush and
+        # silently skipped by ignore_conflicts while still being counted
+        live = set(
+            Video.objects.select_for_update().filter(pk__in={video_id for video_id, _, _ in events})
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        existing = set(
+            VideoView.objects.filter(
+                video_id__in=live,
+                ip_address__in={ip_address for _, _, ip_address in events},
+            ).values_list('video_id', 'user_id', 'ip_address')
+        )
+        new = [event for event in events if event[0] in live and event not in existing]
+        if not new:
+            return 0
+        deltas = Counter(video_id for video_id, _, _ in new)
+        VideoView.objects.bulk_create(
+            [VideoView(video_id=video_id, user_id=user_id, ip_address=ip_address)
+             for video_id, user_id, ip_address in new],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        for video_id, delta in deltas.items():
+            Video.objects.filter(pk=video_id).update(views=F('views') + delta)
+    bump_video_versions(deltas)
+    return len(new)
+
+
+def _viewer(user_id, ip_address):
+    return f'{user_id or ""}:{ip_address}'
+
+
+def _load_filter(row, now, capacity):
+    """The Bloom filters of a VideoViewFilter row, rotated if its period is over"""
+    if row is None:
+        return RotatingBloomFilter(BloomFilter(capacity), BloomFilter(capacity)), True
+    recent = RotatingBloomFilter(
+        BloomFilter.from_bytes(row.current, capacity),
+        BloomFilter.from_bytes(row.previous, capacity),
+    )
+    period = timedelta(seconds=getattr(settings, 'VIDEO_VIEW_DEDUPE_SECONDS', 24 * 3600))
+    if now - row.rotated_at >= period:
+        recent.rotate(capacity)
+        return recent, True
+    return recent, False
+
+
+def _store_view_sketches(events):
+    now = timezone.now()
+    today = now.date()
+    capacity = getattr(settings, 'VIDEO_VIEW_FILTER_CAPACITY', 10000)
+    by_video = {}
+    for video_id, user_id, ip_address in events:
+        by_video.setdefault(video_id, []).append(_viewer(user_id, ip_address))
+
+    with transaction.atomic():
+        video_ids = list(Video.objects.filter(pk__in=by_video).values_list('pk', flat=True))
+        filters = VideoViewFilter.objects.select_for_update().in_bulk(video_ids, field_name='video_id')
+        sketches = {
+            sketch.video_id: sketch
+            for sketch in VideoViewSketch.objects.select_for_update().filter(video_id__in=video_ids, day=today)
+        }
+
+        deltas = {}
+        new_filters, changed_filters, new_sketches, changed_sketches = [], [], [], []
+        for video_id in video_ids:
+            row = filters.get(video_id)
+            recent, rotated = _load_filter(row, now, capacity)
+            sketch = sketches.get(video_id)
+            viewers = HyperLogLog.from_bytes(sketch.viewers if sketch else None)
+            for viewer in by_video[video_id]:
+                viewers.add(viewer)
+                if viewer not in recent:
+                    recent.add(viewer)
+                    deltas[video_id] = deltas.get(video_id, 0) + 1
+
+            if row is None:
+                row = VideoViewFilter(video_id=video_id)
+                new_filters.append(row)
+            else:
+                changed_filters.append(row)
+            row.current = recent.current.to_bytes()
+            row.previous = recent.previous.to_bytes()
+            if rotated:
+                row.rotated_at = now
+
+            if sketch is None:
+                new_sketches.append(VideoViewSketch(video_id=video_id, day=today, viewers=viewers.to_bytes()))
+            else:
+                sketch.viewers = viewers.to_bytes()
+                changed_sketches.append(sketch)
+
+        VideoViewFilter.objects.bulk_create(new_filters)
+        VideoViewFilter.objects.bulk_update(changed_filters, ['current', 'previous', 'rotated_at'])
+        VideoViewSketch.objects.bulk_create(new_sketches)
+        VideoViewSketch.objects.bulk_update(changed_sketches, ['viewers'])
+        for video_id, delta in deltas.items():
+            Video.objects.filter(pk=video_id).update(views=F('views') + delta)
+    # Unique viewer estimates move even when no view is counted
+    bump_video_versions(video_ids)
+    return sum(deltas.values())
+
+
+def unique_viewers(video, since=None):
+    """
+    Distinct viewers of ``video``, optionally only from the date ``since``
+    on. Estimated from the daily sketches in 'sketch' tracking mode; in
+    'exact' mode every counted view is a distinct viewer.
+    """
+    if getattr(settings, 'VIDEO_VIEW_TRACKING', 'exact') != 'sketch':
+        if since is None:
+            return video.views
+        return VideoView.objects.filter(video=video, watched_at__date__gte=since).count()
+    sketches = VideoViewSketch.objects.filter(video=video)
+    if since is not None:
+        sketches = sketches.filter(day__gte=since)
+    viewers = HyperLogLog()
+    for data in sketches.values_list('viewers', flat=True).iterator():
+        viewers.merge(HyperLogLog.from_bytes(data))
+    return viewers.count()
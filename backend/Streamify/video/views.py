@@ -4,49 +4,75 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.views import APIView
-from django.db.models import Q, F
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from .models import Video, VideoLike, VideoView
+from .models import Video, VideoLike, UploadSession, Transcript, video_asset_dir
 from .serializers import (
     VideoSerializer, VideoUploadSerializer, VideoLikeSerializer, 
-    VideoListSerializer
+    VideoListSerializer, UploadSessionSerializer, VideoTranscriptSerializer, request_user
 )
-from .tasks import transcribe_video_task
+from . import captions, counters, detail_cache, list_cache, storage, uploads, view_buffer
+from .tasks import start_video_processing
+from . import streaming
+from .streaming import serve_file
+from .search import ranked, search_videos
+from Streamify.conditional import respond_conditionally, weak_etag
+from Streamify.pagination import KeysetPagination, RankedPagination
 from accounts.models import Users
 import os
+import shutil
 from datetime import timedelta
-from django.http import JsonResponse
-import ffmpeg
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
-import ffmpeg
 
-def extract_video_duration(video_file_path):
-    """Extract video duration using ffmpeg"""
-    try:
-        probe = ffmpeg.probe(video_file_path)
-        
-        # Find the video stream
-        video_stream = None
-        for stream in probe['streams']:
-            if stream['codec_type'] == 'video':
-                video_stream = stream
-                break
-        
-        if video_stream and 'duration' in video_stream:
-            duration = float(video_stream['duration'])
-            return timedelta(seconds=duration)
-        
-        # Fallback: try to get duration from format
-        if 'format' in probe and 'duration' in probe['format']:
-            duration = float(probe['format']['duration'])
-            return timedelta(seconds=duration)
-            
-        return None
-    except Exception as e:
-        print(f"Error extracting video duration: {e}")
+def process_new_video(video_instance):
+    """Queue processing for a freshly uploaded video (probing happens in the background)"""
+    # Duplicate uploads reuse the work already done for the same content
+    if storage.reuse_existing_processing(video_instance):
+        return
+    
+    # Trigger the background tasks
+    start_video_processing(video_instance.id)
+
+def can_view(request, visibility, uploader_username):
+    """Private videos are only visible to their uploader"""
+    if visibility == 'private':
+        return request.user.is_authenticated and uploader_username == request.user.username
+    return True
+
+def can_view_video(request, video):
+    return can_view(request, video.visibility, video.uploader.username)
+
+def can_view_video_id(request, video_id, **filters):
+    """Whether a video matching ``filters`` exists and the viewer may see it, in one small query"""
+    row = Video.objects.filter(id=video_id, **filters).values_list('visibility', 'uploader__username').first()
+    return row is not None and can_view(request, *row)
+
+def can_stream_video(request, video):
+    """Media files are also served to holders of a valid stream token"""
+    return can_view_video(request, video) or streaming.has_stream_token(request, video.id)
+
+def viewer_reaction(request, video_id):
+    """The signed-in viewer's reaction to a video, or None"""
+    user = request_user(request)
+    if user is None:
         return None
+    return VideoLike.objects.filter(user=user, video_id=video_id).values_list('reaction', flat=True).first()
+
+def cache_scope(request):
+    """Cached payloads hold absolute URLs, so they are kept per scheme and host"""
+    return f'{request.scheme}://{request.get_host()}'
+
+def stale_validators(response, etag, version):
+    """Describe a stale copy by its own version, so it is revalidated rather than kept"""
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(detail_cache.version_time(version))
 
 @method_decorator(csrf_exempt, name='dispatch')
 class VideoUploadView(generics.CreateAPIView):
@@ -55,7 +81,7 @@ class VideoUploadView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def perform_create(self, serializer):
-        """Set the uploader to the authenticated user and extract video metadata"""
+        """Set the uploader to the authenticated user and queue video processing"""
         try:
             # Get the Users model instance from the authenticated user
             if hasattr(self.request.user, 'users_instance'):
@@ -65,26 +91,20 @@ class VideoUploadView(generics.CreateAPIView):
                 # Fallback: try to find by username
                 user = Users.objects.get(username=self.request.user.username)
             
-            # Save the video first
-            video_instance = serializer.save(
-                uploader=user,
-                file_size=serializer.validated_data['video_file'].size,
-                processing_status='processing'  # Set status to processing, will be ready after transcription
-            )
-            
-            # Extract video duration
-            if video_instance.video_file:
-                video_path = video_instance.video_file.path
-                duration = extract_video_duration(video_path)
-                if duration:
-                    video_instance.duration = duration
-                    video_instance.save()
+            with transaction.atomic():
+                # Store the file by content hash; identical uploads share one blob
+                blob, _ = storage.store_uploaded_file(serializer.validated_data['video_file'])
+                
+                # Save the video first
+                video_instance = serializer.save(
+                    uploader=user,
+                    blob=blob,
+                    video_file=blob.file.name,
+                    file_size=blob.size,
+                    processing_status='processing'  # Set status to processing, will be ready after transcription
+                )
             
-            # Trigger the background task
-            try:
-                transcribe_video_task.delay(video_instance.id)
-            except Exception as task_error:
-                print(f"Background task failed: {task_error}")
+            process_new_video(video_instance)
                     
         except Users.DoesNotExist:
             from rest_framework.exceptions import ValidationError
@@ -106,10 +126,196 @@ class VideoUploadView(generics.CreateAPIView):
             'video': response_serializer.data
         }, status=status.HTTP_201_CREATED)
 
+class UploadSessionMixin:
+    """Shared helpers for the resumable upload endpoints"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_uploader(self):
+        if hasattr(self.request.user, 'users_instance'):
+            return self.request.user.users_instance
+        return get_object_or_404(Users, username=self.request.user.username)
+    
+    def get_session(self, session_id, lock=False):
+        queryset = UploadSession.objects.filter(uploader=self.get_uploader())
+        if lock:
+            queryset = queryset.select_for_update()
+        return get_object_or_404(queryset, id=session_id)
+    
+    def offset_headers(self, response, session):
+        response['Upload-Offset'] = session.offset
+        response['Upload-Length'] = session.upload_length
+        response['Cache-Control'] = 'no-store'
+        return response
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadSessionCreateView(UploadSessionMixin, APIView):
+    """Start a resumable upload (tus-style) and return its upload URL"""
+    
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        
+        session = UploadSession(uploader=self.get_uploader(), **serializer.validated_data)
+        # Chunks are staged under uploads/ and moved into content-addressed
+        # storage on finalize, once the hash is known
+        ext = os.path.splitext(session.filename)[1].lower()
+        session.file_path = os.path.join('uploads', f'{session.id}{ext}')
+        session.save()
+        uploads.create_session_file(session)
+        
+        data = UploadSessionSerializer(session, context={'request': request}).data
+        response = Response(data, status=status.HTTP_201_CREATED)
+        response['Location'] = data['upload_url']
+        return self.offset_headers(response, session)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadSessionView(UploadSessionMixin, APIView):
+    """Query (HEAD), append to (PATCH) or abort (DELETE) a resumable upload"""
+    
+    def head(self, request, session_id):
+        session = self.get_session(session_id)
+        return self.offset_headers(Response(status=status.HTTP_200_OK), session)
+    
+    def get(self, request, session_id):
+        session = self.get_session(session_id)
+        data = UploadSessionSerializer(session, context={'request': request}).data
+        return self.offset_headers(Response(data), session)
+    
+    def patch(self, request, session_id):
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type not in ('application/offset+octet-stream', 'application/octet-stream'):
+            return Response({
+                'error': 'Chunks must be sent as application/offset+octet-stream.'
+            }, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response({
+                'error': 'Upload-Offset and Content-Length headers are required.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            session = self.get_session(session_id, lock=True)
+            if session.status != 'active':
+                return Response({
+                    'error': 'This upload has already been finalized.'
+                }, status=status.HTTP_409_CONFLICT)
+            
+            try:
+                session.offset = uploads.append_chunk(session, offset, request.stream, length)
+            except uploads.OffsetMismatch as e:
+                return self.offset_headers(Response({
+                    'error': str(e)
+                }, status=status.HTTP_409_CONFLICT), session)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            session.save(update_fields=['offset', 'updated_at'])
+        
+        return self.offset_headers(Response(status=status.HTTP_204_NO_CONTENT), session)
+    
+    def delete(self, request, session_id):
+        with transaction.atomic():
+            session = self.get_session(session_id, lock=True)
+            if session.status != 'active':
+                return Response({
+                    'error': 'This upload has already been finalized.'
+                }, status=status.HTTP_409_CONFLICT)
+            uploads.discard_session(session)
+            session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadSessionFinalizeView(UploadSessionMixin, APIView):
+    """
+    Turn a fully received upload into a Video and queue its processing. An
+    optional ``sha256`` in the body is checked against the received bytes.
+    """
+    
+    def post(self, request, session_id):
+        with transaction.atomic():
+            session = self.get_session(session_id, lock=True)
+            
+            if session.status == 'completed' and session.video_id:
+                # Retried finalize: return the video created the first time
+                video_instance = session.video
+            elif session.offset < session.upload_length:
+                return self.offset_headers(Response({
+                    'error': 'Upload is incomplete.',
+                    'offset': session.offset,
+                    'upload_length': session.upload_length
+                }, status=status.HTTP_409_CONFLICT), session)
+            else:
+                session.sha256 = uploads.session_sha256(session)
+                # Optional end-to-end check against the client's own hash
+                expected = str(request.data.get('sha256') or '').lower()
+                if expected and expected != session.sha256:
+                    return Response({
+                        'error': 'Checksum mismatch: the uploaded file is corrupt.',
+                        'sha256': session.sha256
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                blob, _ = storage.adopt_file(uploads.session_path(session), session.sha256)
+                
+                video_instance = Video(
+                    title=session.title,
+                    description=session.description,
+                    visibility=session.visibility,
+                    uploader=session.uploader,
+                    blob=blob,
+                    file_size=blob.size,
+                    processing_status='processing'
+                )
+                video_instance.video_file.name = blob.file.name
+                video_instance.save()
+                
+                session.status = 'completed'
+                session.video = video_instance
+                session.save(update_fields=['sha256', 'status', 'video', 'updated_at'])
+                uploads.discard_session(session, remove_file=False)
+                
+                transaction.on_commit(lambda: process_new_video(video_instance))
+        
+        response_serializer = VideoSerializer(video_instance, context={'request': request})
+        return Response({
+            'message': 'Video uploaded successfully! It will appear on the homepage after transcription completes.',
+            'video': response_serializer.data,
+            'sha256': session.sha256
+        }, status=status.HTTP_201_CREATED)
+
 class VideoListView(generics.ListAPIView):
     serializer_class = VideoListSerializer
     permission_classes = [permissions.AllowAny]
     
+    @property
+    def paginator(self):
+        """Search results are ranked by relevance, everything else by recency"""
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('search'):
+                self._paginator = RankedPagination()
+            else:
+                self._paginator = KeysetPagination()
+        return self._paginator
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Pages are the same for everyone apart from user_reaction, so the
+        shared payload is cached and the viewer's reactions laid over it.
+        The ETag covers both, so revalidating renders nothing.
+        """
+        entry = list_cache.cached_page(request, lambda: super(VideoListView, self).list(request, *args, **kwargs).data)
+        reactions = list_cache.user_reactions(entry['data'], request)
+        etag = weak_etag('videos', entry['digest'], sorted(reactions.items()))
+        return respond_conditionally(
+            request, etag, entry['modified'],
+            lambda: Response(list_cache.overlay_user_reactions(entry['data'], reactions)),
+        )
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['shared'] = True
+        return context
+    
     def get_queryset(self):
         # Filter by uploader first
         uploader = self.request.query_params.get('uploader', None)
@@ -127,81 +333,185 @@ class VideoListView(generics.ListAPIView):
                 processing_status='ready'
             ).select_related('uploader')
         
-        # Search functionality
+        # Search functionality: ranked by relevance instead of recency
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | Q(description__icontains=search)
-            )
+            return counters.with_totals(ranked(queryset, search_videos(search, queryset)), 'video')
         
-        return queryset.order_by('-created_at')
+        return counters.with_totals(queryset.order_by('-created_at'), 'video')
 
 class VideoDetailView(APIView):
     permission_classes = [permissions.AllowAny]
     
     def get(self, request, video_id):
         try:
-            video = get_object_or_404(
-                Video.objects.select_related('uploader'),
-                id=video_id,
-                processing_status='ready'
-            )
-            
-            # Check if video is private and user has permission
-            if video.visibility == 'private':
-                if not request.user.is_authenticated or video.uploader.username != request.user.username:
-                    return Response({
-                        'error': 'Video not found or you do not have permission to view it.'
-                    }, status=status.HTTP_404_NOT_FOUND)
+            # The transcript lives in its own tables and is only sent on request
+            variant = 'transcript' if 'transcript' in request.query_params.get('include', '').split(',') else 'video'
+            # Checked before the validators so a 304 is never sent for a video
+            # the viewer may not see, and revalidating viewers are still counted
+            if not can_view_video_id(request, video_id, processing_status='ready'):
+                return Response({
+                    'error': 'Video not found or you do not have permission to view it.'
+                }, status=status.HTTP_404_NOT_FOUND)
             
             # Track view (only for authenticated users)
             if request.user.is_authenticated:
-                self._track_view(request, video)
+                self._track_view(request, video_id)
+            
+            scope = cache_scope(request)
+            version = detail_cache.video_version(video_id)
+            # Every change to the video or the viewer's reaction bumps the
+            # version, so an unchanged poll is answered from these alone
+            user = request_user(request)
+            etag = weak_etag('video', video_id, version, variant, scope, user.id if user else '')
+            
+            def render():
+                cached, served = detail_cache.get_or_compute(
+                    'detail',
+                    f'video-detail:{video_id}:{version}:{variant}:{scope}',
+                    f'video-detail:{video_id}:stale:{variant}:{scope}',
+                    lambda: self._render(request, video_id, variant),
+                    settings.VIDEO_DETAIL_CACHE_TIMEOUT,
+                    version,
+                )
+                response = Response({**cached['data'], 'user_reaction': viewer_reaction(request, video_id)})
+                if served != version:
+                    stale_validators(
+                        response, weak_etag('video', video_id, served, variant, scope, user.id if user else ''), served,
+                    )
+                return response
             
-            serializer = VideoSerializer(video, context={'request': request})
-            return Response(serializer.data)
+            return respond_conditionally(request, etag, detail_cache.version_time(version), render)
             
         except Exception as e:
             return Response({
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    def _track_view(self, request, video):
-        """Track video view"""
-        ip_address = self._get_client_ip(request)
-        user = None
+    def _render(self, request, video_id, variant):
+        """The part of the response that is the same for every viewer"""
+        video = get_object_or_404(
+            counters.with_totals(Video.objects.select_related('uploader', 'metadata'), 'video')
+            .annotate(transcript_version=F('transcript__version')),
+            id=video_id,
+            processing_status='ready'
+        )
+        serializer_class = VideoTranscriptSerializer if variant == 'transcript' else VideoSerializer
+        serializer = serializer_class(video, context={'request': request, 'shared': True})
+        return {'data': serializer.data}
+    
+    def _track_view(self, request, video_id):
+        """Buffer the view; flush_video_views_task writes it and bumps the count"""
+        user = request_user(request)
+        view_buffer.record_view(video_id, user.id if user else None, self._get_client_ip(request))
+    
+    def _get_client_ip(self, request):
+        """Client IP address; a malformed X-Forwarded-For falls back to the peer address"""
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            ip = view_buffer.normalize_ip(x_forwarded_for.split(',')[0])
+            if ip:
+                return ip
+        return request.META.get('REMOTE_ADDR')
+
+class VideoStreamView(APIView):
+    """Serve the video file with HTTP range support for seeking"""
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, video_id):
+        video = get_object_or_404(
+            Video.objects.select_related('uploader'),
+            id=video_id,
+            processing_status='ready'
+        )
         
-        if request.user.is_authenticated:
-            try:
-                user = Users.objects.get(username=request.user.username)
-            except Users.DoesNotExist:
-                pass
+        if not can_stream_video(request, video):
+            raise Http404('Video not found or you do not have permission to view it.')
+        
+        if not video.video_file or not os.path.exists(video.video_file.path):
+            raise Http404('Video file not found.')
+        
+        response = serve_file(request, video.video_file.path)
+        if video.visibility == 'private':
+            response['Cache-Control'] = 'private'
+        return response
+
+class VideoAssetView(APIView):
+    """Serve files derived from a video (HLS segments, trickplay sprites)"""
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, video_id, asset_path):
+        video = get_object_or_404(
+            Video.objects.select_related('uploader'),
+            id=video_id,
+            processing_status='ready'
+        )
+        
+        if not can_stream_video(request, video):
+            raise Http404('Video not found or you do not have permission to view it.')
         
-        # Check if view already exists
-        view_exists = VideoView.objects.filter(
-            video=video,
-            ip_address=ip_address,
-            user=user
-        ).exists()
+        # Resolve the path inside the video's asset directory only
+        asset_root = os.path.realpath(os.path.join(settings.MEDIA_ROOT, video_asset_dir(video)))
+        path = os.path.realpath(os.path.join(asset_root, asset_path))
+        if os.path.commonpath([asset_root, path]) != asset_root or not os.path.isfile(path):
+            raise Http404('Asset not found.')
         
-        if not view_exists:
-            VideoView.objects.create(
-                video=video,
-                ip_address=ip_address,
-                user=user
+        # Segment and sprite URIs are relative and would lose the token otherwise
+        if path.endswith('.m3u8') and streaming.has_stream_token(request, video.id):
+            response = HttpResponse(
+                streaming.tokenized_playlist(path, request.GET['token']),
+                content_type='application/vnd.apple.mpegurl',
             )
-            # Increment view count
-            video.views = F('views') + 1
-            video.save(update_fields=['views'])
+        elif path.endswith('.vtt') and streaming.has_stream_token(request, video.id):
+            response = HttpResponse(
+                streaming.tokenized_thumbnail_track(path, request.GET['token']),
+                content_type='text/vtt',
+            )
+        else:
+            response = serve_file(request, path)
+        if video.visibility == 'private':
+            response['Cache-Control'] = 'private'
+        return response
+
+class VideoCaptionsView(APIView):
+    """Serve a video's transcript as WebVTT or SRT captions"""
+    permission_classes = [permissions.AllowAny]
     
-    def _get_client_ip(self, request):
-        """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
+    def get(self, request, video_id, caption_format):
+        if caption_format not in captions.CAPTION_FORMATS:
+            raise Http404('Unsupported caption format.')
+        
+        video = get_object_or_404(
+            Video.objects.select_related('uploader'),
+            id=video_id,
+            processing_status='ready'
+        )
+        if not can_stream_video(request, video):
+            raise Http404('Video not found or you do not have permission to view it.')
+        
+        transcript = Transcript.objects.filter(video=video).values('pk', 'version', 'updated_at').first()
+        if transcript is None:
+            raise Http404('This video has no transcript.')
+        
+        # Validators come from the transcript row, so revalidation never renders
+        etag = captions.caption_etag(transcript['pk'], transcript['version'], caption_format)
+        last_modified = int(transcript['updated_at'].timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(
+                captions.render_captions(transcript['pk'], transcript['version'], caption_format),
+                content_type=captions.CAPTION_FORMATS[caption_format],
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        
+        # URLs carrying the current version (?v=) never change and can be cached for good
+        scope = 'private' if video.visibility == 'private' else 'public'
+        if request.query_params.get('v') == str(transcript['version']):
+            response['Cache-Control'] = f'{scope}, max-age=31536000, immutable'
         else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+            response['Cache-Control'] = f'{scope}, no-cache'
+        return response
 
 class VideoLikeView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -216,7 +526,9 @@ class VideoLikeView(APIView):
             }, status=status.HTTP_401_UNAUTHORIZED)
         
         try:
-            video = get_object_or_404(Video, id=video_id)
+            # Current totals come with the video, so the response needs no
+            # second read after the counters are bumped
+            video = get_object_or_404(counters.with_totals(Video.objects.all(), 'video'), id=video_id)
             
             # Get the authenticated user
             if hasattr(request.user, 'users_instance'):
@@ -231,64 +543,39 @@ class VideoLikeView(APIView):
                     'error': 'Invalid reaction. Must be "like" or "dislike".'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Check if user already has a reaction
-            existing_like = VideoLike.objects.filter(user=user, video=video).first()
-            
-            if existing_like:
-                if existing_like.reaction == reaction:
-                    # User clicked the same reaction - remove it (toggle off)
-                    existing_like.delete()
-                    if reaction == 'like':
-                        video.likes = F('likes') - 1
-                    else:
-                        video.dislikes = F('dislikes') - 1
-                    video.save(update_fields=['likes', 'dislikes'])
-                    video.refresh_from_db()
-                    
-                    return Response({
-                        'message': f'{reaction.capitalize()} removed!',
-                        'likes': video.likes,
-                        'dislikes': video.dislikes,
-                        'user_reaction': None
-                    })
-                else:
-                    # User switched from like to dislike or vice versa
-                    old_reaction = existing_like.reaction
-                    existing_like.reaction = reaction
-                    existing_like.save()
-                    
-                    # Update counters
-                    if old_reaction == 'like':
-                        video.likes = F('likes') - 1
-                        video.dislikes = F('dislikes') + 1
+            with transaction.atomic():
+                # Check if user already has a reaction
+                existing_like = VideoLike.objects.filter(user=user, video=video).first()
+                
+                if existing_like:
+                    if existing_like.reaction == reaction:
+                        # User clicked the same reaction - remove it (toggle off)
+                        existing_like.delete()
+                        deltas = {f'{reaction}s': -1}
+                        message = f'{reaction.capitalize()} removed!'
+                        user_reaction = None
                     else:
-                        video.dislikes = F('dislikes') - 1
-                        video.likes = F('likes') + 1
-                    video.save(update_fields=['likes', 'dislikes'])
-                    video.refresh_from_db()
-                    
-                    return Response({
-                        'message': f'Changed to {reaction}!',
-                        'likes': video.likes,
-                        'dislikes': video.dislikes,
-                        'user_reaction': reaction
-                    })
-            else:
-                # New reaction
-                VideoLike.objects.create(user=user, video=video, reaction=reaction)
-                if reaction == 'like':
-                    video.likes = F('likes') + 1
+                        # User switched from like to dislike or vice versa
+                        old_reaction = existing_like.reaction
+                        existing_like.reaction = reaction
+                        existing_like.save(update_fields=['reaction'])
+                        deltas = {f'{old_reaction}s': -1, f'{reaction}s': 1}
+                        message = f'Changed to {reaction}!'
+                        user_reaction = reaction
                 else:
-                    video.dislikes = F('dislikes') + 1
-                video.save(update_fields=['likes', 'dislikes'])
-                video.refresh_from_db()
-                
-                return Response({
-                    'message': f'Video {reaction}d!',
-                    'likes': video.likes,
-                    'dislikes': video.dislikes,
-                    'user_reaction': reaction
-                })
+                    # New reaction
+                    VideoLike.objects.create(user=user, video=video, reaction=reaction)
+                    deltas = {f'{reaction}s': 1}
+                    message = f'Video {reaction}d!'
+                    user_reaction = reaction
+                counters.increment('video', video.id, deltas)
+                transaction.on_commit(lambda: detail_cache.bump_video_versions([video.id]))
+            
+            return Response({
+                'message': message,
+                **self._counts(video, deltas),
+                'user_reaction': user_reaction
+            })
             
         except Exception as e:
             return Response({
@@ -297,28 +584,22 @@ class VideoLikeView(APIView):
     
     def delete(self, request, video_id):
         try:
-            video = get_object_or_404(Video, id=video_id)
+            video = get_object_or_404(counters.with_totals(Video.objects.all(), 'video'), id=video_id)
             user = get_object_or_404(Users, username=request.user.username)
             
-            video_like = VideoLike.objects.filter(user=user, video=video).first()
+            with transaction.atomic():
+                video_like = VideoLike.objects.filter(user=user, video=video).first()
+                if video_like:
+                    reaction = video_like.reaction
+                    video_like.delete()
+                    deltas = {f'{reaction}s': -1}
+                    counters.increment('video', video.id, deltas)
+                    transaction.on_commit(lambda: detail_cache.bump_video_versions([video.id]))
+            
             if video_like:
-                reaction = video_like.reaction
-                video_like.delete()
-                
-                # Update counters
-                if reaction == 'like':
-                    video.likes = F('likes') - 1
-                else:
-                    video.dislikes = F('dislikes') - 1
-                video.save(update_fields=['likes', 'dislikes'])
-                
-                # Refresh video from database
-                video.refresh_from_db()
-                
                 return Response({
                     'message': 'Reaction removed successfully!',
-                    'likes': video.likes,
-                    'dislikes': video.dislikes,
+                    **self._counts(video, deltas),
                     'user_reaction': None
                 })
             
@@ -330,6 +611,13 @@ class VideoLikeView(APIView):
             return Response({
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def _counts(self, video, deltas):
+        """Likes and dislikes after applying ``deltas`` to the totals read with the video"""
+        return {
+            field: max(0, counters.total(video, field) + deltas.get(field, 0))
+            for field in ('likes', 'dislikes')
+        }
 
 class VideoDeleteView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -360,14 +648,20 @@ class VideoDeleteView(APIView):
             # Store video info for response
             video_title = video.title
             
-            # Delete the video files from disk
+            # Delete the video files from disk. Content-addressed files are shared
+            # and released by reference count when the row is deleted.
             try:
-                if video.video_file and video.video_file.path:
-                    if os.path.exists(video.video_file.path):
-                        os.remove(video.video_file.path)
+                if not video.blob_id:
+                    if video.video_file and video.video_file.path:
+                        if os.path.exists(video.video_file.path):
+                            os.remove(video.video_file.path)
+                    
+                    shutil.rmtree(os.path.join(settings.MEDIA_ROOT, video_asset_dir(video)), ignore_errors=True)
                 
+                # Thumbnails can be shared with duplicates of the same upload
                 if video.thumbnail and video.thumbnail.path:
-                    if os.path.exists(video.thumbnail.path):
+                    shared = Video.objects.filter(thumbnail=video.thumbnail.name).exclude(pk=video.pk).exists()
+                    if not shared and os.path.exists(video.thumbnail.path):
                         os.remove(video.thumbnail.path)
             except Exception as file_error:
                 print(f"Error deleting files: {file_error}")
@@ -389,37 +683,53 @@ class VideoDeleteView(APIView):
 class UserVideosView(generics.ListAPIView):
     serializer_class = VideoListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         user = get_object_or_404(Users, username=self.request.user.username)
-        return Video.objects.filter(uploader=user).order_by('-created_at')
+        videos = Video.objects.filter(uploader=user).select_related('uploader').order_by('-created_at')
+        return counters.with_totals(videos, 'video')
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def video_stats(request, video_id):
     """Get video statistics"""
     try:
-        video = get_object_or_404(Video, id=video_id)
+        if not can_view_video_id(request, video_id):
+            return Response({
+                'error': 'Video not found or you do not have permission to view it.'
+            }, status=status.HTTP_404_NOT_FOUND)
         
-        # Get user's reaction if authenticated
-        user_reaction = None
-        if request.user.is_authenticated:
-            try:
-                user = Users.objects.get(username=request.user.username)
-                video_like = VideoLike.objects.filter(user=user, video=video).first()
-                if video_like:
-                    user_reaction = video_like.reaction
-            except Users.DoesNotExist:
-                pass
+        version = detail_cache.video_version(video_id)
+        user = request_user(request)
+        etag = weak_etag('stats', video_id, version, user.id if user else '')
         
-        return Response({
-            'views': video.views,
-            'likes': video.likes,
-            'dislikes': video.dislikes,
-            'user_reaction': user_reaction
-        })
+        def render():
+            stats, served = detail_cache.get_or_compute(
+                'stats',
+                f'video-stats:{video_id}:{version}',
+                f'video-stats:{video_id}:stale',
+                lambda: compute_video_stats(video_id),
+                settings.VIDEO_DETAIL_CACHE_TIMEOUT,
+                version,
+            )
+            response = Response({**stats, 'user_reaction': viewer_reaction(request, video_id)})
+            if served != version:
+                stale_validators(response, weak_etag('stats', video_id, served, user.id if user else ''), served)
+            return response
+        
+        return respond_conditionally(request, etag, detail_cache.version_time(version), render)
         
     except Exception as e:
         return Response({
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def compute_video_stats(video_id):
+    video = get_object_or_404(counters.with_totals(Video.objects.all(), 'video'), id=video_id)
+    return {
+        'views': video.views,
+        'unique_viewers': view_buffer.unique_viewers(video),
+        'likes': counters.total(video, 'likes'),
+        'dislikes': counters.total(video, 'dislikes'),
+    }
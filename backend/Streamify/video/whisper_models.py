@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+import whisper
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_models = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'loads': 0, 'evictions': 0, 'load_seconds': 0.0}
+_load_counts = {}
+
+
+def resolve_device(device=None):
+    device = device or getattr(settings, 'WHISPER_DEVICE', 'auto')
+    if device == 'auto':
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return device
+
+
+def resolve_precision(device, precision=None):
+    """fp16 only makes sense on GPU; Whisper falls back to fp32 on CPU anyway"""
+    precision = precision or getattr(settings, 'WHISPER_PRECISION', 'auto')
+    if precision == 'auto' or device == 'cpu':
+        return 'fp16' if device != 'cpu' else 'fp32'
+    return precision
+
+
+def _key(name=None, device=None, precision=None):
+    name = name or getattr(settings, 'WHISPER_MODEL', 'base')
+    device = resolve_device(device)
+    return name, device, resolve_precision(device, precision)
+
+
+def get_model(name=None, device=None, precision=None):
+    """
+    Return a loaded Whisper model, keeping it for later tasks in this process.
+
+    Models are cached by (name, device, precision) with an LRU limit of
+    WHISPER_MODEL_CACHE_SIZE.
+    """
+    key = _key(name, device, precision)
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            _stats['hits'] += 1
+            return model
+        _stats['misses'] += 1
+
+        # Loading under the lock keeps concurrent threads from loading twice
+        started = time.monotonic()
+        model = whisper.load_model(key[0], device=key[1])
+        if key[2] == 'fp16':
+            model = model.half()
+        elapsed = time.monotonic() - started
+
+        _models[key] = model
+        _stats['loads'] += 1
+        _stats['load_seconds'] += elapsed
+        _load_counts[key] = _load_counts.get(key, 0) + 1
+        logger.info(f"Whisper model {key} loaded in {elapsed:.1f}s.")
+
+        limit = max(getattr(settings, 'WHISPER_MODEL_CACHE_SIZE', 1), 1)
+        while len(_models) > limit:
+            evicted, _ = _models.popitem(last=False)
+            _stats['evictions'] += 1
+            logger.info(f"Whisper model {evicted} evicted from cache.")
+        return model
+
+
+def transcribe_options(name=None, device=None, precision=None):
+    """Keyword arguments for model.transcribe() matching the cached model"""
+    return {'fp16': _key(name, device, precision)[2] == 'fp16'}
+
+
+def warm(names=None):
+    """Load the configured models so the first task doesn't pay for it"""
+    for name in names or getattr(settings, 'WHISPER_PRELOAD_MODELS', []):
+        try:
+            get_model(name)
+        except Exception as e:
+            logger.error(f"Could not preload Whisper model {name}: {e}", exc_info=True)
+
+
+def cache_stats():
+    """Hit/miss and load statistics for this process"""
+    with _lock:
+        return dict(
+            _stats,
+            cached=[list(key) for key in _models],
+            load_counts={'/'.join(key): count for key, count in _load_counts.items()},
+        )
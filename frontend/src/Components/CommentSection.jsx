@@ -1,6 +1,7 @@
 import React from 'react';
 import { MessageCircle, Send, Heart } from 'lucide-react';
 import UserAvatar from './UserAvatar';
+import LoadMore from './LoadMore';
 
 const CommentSection = ({ 
   video,
@@ -9,6 +10,9 @@ const CommentSection = ({
   setNewComment,
   currentUser,
   loadingComments,
+  hasMoreComments,
+  loadingMoreComments,
+  onLoadMoreComments,
   onPostComment,
   onCommentLike,
   formatTimeAgo,
@@ -129,6 +133,12 @@ const CommentSection = ({
               </div>
             </div>
           ))}
+          <LoadMore
+            hasMore={hasMoreComments}
+            loading={loadingMoreComments}
+            onLoadMore={onLoadMoreComments}
+            label="Show more comments"
+          />
         </div>
       )}
     </div>
@@ -0,0 +1,41 @@
+import React, { useEffect, useRef } from 'react';
+
+// Loads the next page when it scrolls into view; the button is the fallback
+const LoadMore = ({ hasMore, loading, onLoadMore, label = 'Load more' }) => {
+  const sentinelRef = useRef(null);
+
+  useEffect(() => {
+    if (!hasMore || loading || !sentinelRef.current || !('IntersectionObserver' in window)) return;
+
+    const observer = new IntersectionObserver(
+      (entries) => {
+        if (entries[0].isIntersecting) {
+          onLoadMore();
+        }
+      },
+      { rootMargin: '400px' }
+    );
+    observer.observe(sentinelRef.current);
+
+    return () => observer.disconnect();
+  }, [hasMore, loading, onLoadMore]);
+
+  if (!hasMore) return null;
+
+  return (
+    <div ref={sentinelRef} className="flex justify-center py-6">
+      {loading ? (
+        <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600"></div>
+      ) : (
+        <button
+          onClick={onLoadMore}
+          className="px-6 py-2 bg-gray-100 dark:bg-[#2a2a2a] text-gray-900 dark:text-white rounded-lg hover:bg-gray-200 dark:hover:bg-[#3a3a3a] transition-colors"
+        >
+          {label}
+        </button>
+      )}
+    </div>
+  );
+};
+
+export default LoadMore;
@@ -1,10 +1,12 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Play, ThumbsUp, Clock, MoreVertical, MessageCircle } from 'lucide-react';
 import api from '../api';
 import LikeButton from '../Components/LikeButton';
 import UserAvatar from '../Components/UserAvatar';
+import LoadMore from '../Components/LoadMore';
 import { formatDuration, formatViews, formatTimeAgo } from '../utils/videoUtils';
+import { appendPage, pageResults } from '../utils/pagination';
 
 const VideoCard = ({ video, onClick }) => {
   return (
@@ -94,6 +96,8 @@ const Home = () => {
   const [videos, setVideos] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -109,7 +113,8 @@ const Home = () => {
     try {
       setLoading(true);
       const response = await api.get('videos/');
-      setVideos(response.data.results || response.data);
+      setVideos(pageResults(response.data));
+      setNextPage(response.data.next || null);
       setError(null);
     } catch (err) {
       console.error('Error fetching videos:', err);
@@ -119,6 +124,20 @@ const Home = () => {
     }
   };
 
+  const loadMoreVideos = useCallback(async () => {
+    if (!nextPage || loadingMore) return;
+    try {
+      setLoadingMore(true);
+      const response = await api.get(nextPage);
+      setVideos(prev => appendPage(prev, pageResults(response.data)));
+      setNextPage(response.data.next || null);
+    } catch (err) {
+      console.error('Error fetching more videos:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [nextPage, loadingMore]);
+
   const handleVideoClick = (video) => {
     // Navigate to video detail page (we'll create this later)
     navigate(`/watch/${video.id}`);
@@ -201,6 +220,8 @@ const Home = () => {
             ))}
           </div>
         )}
+
+        <LoadMore hasMore={!!nextPage} loading={loadingMore} onLoadMore={loadMoreVideos} />
       </div>
     </div>
   );
@@ -1,10 +1,12 @@
 import { Calendar, Eye, Settings, ThumbsUp, Video, Trash2 } from 'lucide-react';
-import { useEffect, useState } from 'react';
+import { useCallback, useEffect, useState } from 'react';
 import { useNavigate, useParams } from 'react-router-dom';
 import UserAvatar from '../Components/UserAvatar';
 import ConfirmationModal from '../Components/ConfirmationModal';
+import LoadMore from '../Components/LoadMore';
 import api, { deleteVideo } from '../api';
 import { formatTimeAgo, formatViews } from '../utils/videoUtils';
+import { appendPage, pageResults } from '../utils/pagination';
 import { showSuccessToast, showErrorToast } from '../utils/toast';
 
 const Profile = ({ onUserUpdate, currentUser: propCurrentUser }) => {
@@ -12,6 +14,8 @@ const Profile = ({ onUserUpdate, currentUser: propCurrentUser }) => {
   const navigate = useNavigate();
   const [user, setUser] = useState(null);
   const [videos, setVideos] = useState([]);
+  const [nextVideos, setNextVideos] = useState(null);
+  const [loadingMoreVideos, setLoadingMoreVideos] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [currentUser, setCurrentUser] = useState(propCurrentUser || null);
@@ -96,18 +100,8 @@ const Profile = ({ onUserUpdate, currentUser: propCurrentUser }) => {
       if (!userToUse?.username) return;
       
       const response = await api.get(`videos/?uploader=${userToUse.username}`);
-      const userVideos = response.data.results || response.data;
-      setVideos(userVideos);
-      
-      // Calculate stats
-      const totalViews = userVideos.reduce((sum, video) => sum + video.views, 0);
-      const totalLikes = userVideos.reduce((sum, video) => sum + video.likes, 0);
-      setStats({
-        totalViews,
-        totalVideos: userVideos.length,
-        totalLikes
-      });
-      
+      setVideos(pageResults(response.data));
+      setNextVideos(response.data.next || null);
       setLoading(false);
     } catch (err) {
       setError('Failed to load videos');
@@ -115,6 +109,29 @@ const Profile = ({ onUserUpdate, currentUser: propCurrentUser }) => {
     }
   };
 
+  const loadMoreVideos = useCallback(async () => {
+    if (!nextVideos || loadingMoreVideos) return;
+    try {
+      setLoadingMoreVideos(true);
+      const response = await api.get(nextVideos);
+      setVideos(prev => appendPage(prev, pageResults(response.data)));
+      setNextVideos(response.data.next || null);
+    } catch (err) {
+      console.error('Error fetching more videos:', err);
+    } finally {
+      setLoadingMoreVideos(false);
+    }
+  }, [nextVideos, loadingMoreVideos]);
+
+  // Stats cover the videos loaded so far
+  useEffect(() => {
+    setStats({
+      totalViews: videos.reduce((sum, video) => sum + video.views, 0),
+      totalVideos: videos.length,
+      totalLikes: videos.reduce((sum, video) => sum + video.likes, 0)
+    });
+  }, [videos]);
+
   const handleVideoClick = (videoId) => {
     navigate(`/watch/${videoId}`);
   };
@@ -137,15 +154,9 @@ const Profile = ({ onUserUpdate, currentUser: propCurrentUser }) => {
       
       await deleteVideo(videoId);
       
-      // Remove the video from the local state
+      // Remove the video from the local state (stats follow)
       setVideos(prevVideos => prevVideos.filter(video => video.id !== videoId));
       
-      // Update stats
-      setStats(prevStats => ({
-        ...prevStats,
-        totalVideos: prevStats.totalVideos - 1
-      }));
-      
       // Close modal
       setDeleteModal({ isOpen: false, videoId: null, videoTitle: '' });
       
@@ -436,6 +447,7 @@ const Profile = ({ onUserUpdate, currentUser: propCurrentUser }) => {
                 ))}
               </div>
             )}
+            <LoadMore hasMore={!!nextVideos} loading={loadingMoreVideos} onLoadMore={loadMoreVideos} />
           </div>
         )}
 
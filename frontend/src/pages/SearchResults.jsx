@@ -1,17 +1,22 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { useSearchParams, Link } from 'react-router-dom';
 import api from '../api'; // Assuming you have an api utility
+import LoadMore from '../Components/LoadMore';
+import { appendPage, pageResults } from '../utils/pagination';
 
 const SearchResults = () => {
     const [results, setResults] = useState([]);
+    const [nextPage, setNextPage] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [searchParams] = useSearchParams();
     const query = searchParams.get('q');
 
     useEffect(() => {
         if (query) {
-            api.get(`/search/?q=${query}`)
+            api.get('/search/', { params: { q: query } })
                 .then(response => {
-                    setResults(response.data);
+                    setResults(pageResults(response.data));
+                    setNextPage(response.data.next || null);
                 })
                 .catch(error => {
                     console.error('Error fetching search results:', error);
@@ -19,6 +24,20 @@ const SearchResults = () => {
         }
     }, [query]);
 
+    const loadMore = useCallback(() => {
+        if (!nextPage || loadingMore) return;
+        setLoadingMore(true);
+        api.get(nextPage)
+            .then(response => {
+                setResults(prev => appendPage(prev, pageResults(response.data)));
+                setNextPage(response.data.next || null);
+            })
+            .catch(error => {
+                console.error('Error fetching more search results:', error);
+            })
+            .finally(() => setLoadingMore(false));
+    }, [nextPage, loadingMore]);
+
     const highlightMatch = (text, query) => {
         if (!query) return text;
         const parts = text.split(new RegExp(`(${query})`, 'gi'));
@@ -46,22 +65,15 @@ const SearchResults = () => {
                                 <Link to={`/watch/${video.id}`}>{video.title}</Link>
                             </h2>
                             <p className="text-gray-500">by {video.uploader.username}</p>
-                            {video.transcript && (
+                            {video.matches && video.matches.length > 0 && (
                                 <div className="mt-2">
-                                    <p>...</p>
-                                    {video.transcript.segments.map((segment, index) => {
-                                        if (segment.text.toLowerCase().includes(query.toLowerCase())) {
-                                            return (
-                                                <Link key={index} to={`/watch/${video.id}#t=${segment.start}`}>
-                                                    <p className="text-sm text-gray-600 hover:bg-gray-200 p-2 rounded">
-                                                        {highlightMatch(segment.text, query)}
-                                                    </p>
-                                                </Link>
-                                            );
-                                        }
-                                        return null;
-                                    })}
-                                    <p>...</p>
+                                    {video.matches.map((match, index) => (
+                                        <Link key={index} to={`/watch/${video.id}#t=${match.start}`}>
+                                            <p className="text-sm text-gray-600 hover:bg-gray-200 p-2 rounded">
+                                                {highlightMatch(match.text, query)}
+                                            </p>
+                                        </Link>
+                                    ))}
                                 </div>
                             )}
                         </div>
@@ -69,6 +81,7 @@ const SearchResults = () => {
                 ) : (
                     <p>No results found.</p>
                 )}
+                <LoadMore hasMore={!!nextPage} loading={loadingMore} onLoadMore={loadMore} />
             </div>
         </div>
     );
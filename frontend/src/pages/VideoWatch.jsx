@@ -3,6 +3,7 @@ import { useParams, useNavigate } from 'react-router-dom';
 import { ArrowLeft } from 'lucide-react';
 import { showLoginPromptToast, showInfoToast } from '../utils/toast.jsx';
 import { formatViews, formatTimeAgo } from '../utils/videoUtils';
+import { appendPage, pageResults } from '../utils/pagination';
 import api from '../api';
 import VideoPlayer from '../Components/VideoPlayer';
 import VideoInfo from '../Components/VideoInfo';
@@ -18,6 +19,8 @@ const VideoWatch = () => {
   const [comments, setComments] = useState([]);
   const [newComment, setNewComment] = useState('');
   const [loadingComments, setLoadingComments] = useState(false);
+  const [nextComments, setNextComments] = useState(null);
+  const [loadingMoreComments, setLoadingMoreComments] = useState(false);
   const [userReaction, setUserReaction] = useState(null);
   const [currentUser, setCurrentUser] = useState(null);
   const [relatedVideos, setRelatedVideos] = useState([]);
@@ -114,7 +117,8 @@ const VideoWatch = () => {
     try {
       setLoadingComments(true);
       const response = await api.get(`comments/video/${id}/`);
-      setComments(response.data);
+      setComments(pageResults(response.data));
+      setNextComments(response.data.next || null);
     } catch (err) {
       console.error('Error fetching comments:', err);
     } finally {
@@ -122,6 +126,20 @@ const VideoWatch = () => {
     }
   };
 
+  const loadMoreComments = React.useCallback(async () => {
+    if (!nextComments || loadingMoreComments) return;
+    try {
+      setLoadingMoreComments(true);
+      const response = await api.get(nextComments);
+      setComments(prev => appendPage(prev, pageResults(response.data)));
+      setNextComments(response.data.next || null);
+    } catch (err) {
+      console.error('Error fetching more comments:', err);
+    } finally {
+      setLoadingMoreComments(false);
+    }
+  }, [nextComments, loadingMoreComments]);
+
   const fetchRelatedVideos = async () => {
     try {
       setLoadingRelatedVideos(true);
@@ -280,6 +298,9 @@ const VideoWatch = () => {
               setNewComment={setNewComment}
               currentUser={currentUser}
               loadingComments={loadingComments}
+              hasMoreComments={!!nextComments}
+              loadingMoreComments={loadingMoreComments}
+              onLoadMoreComments={loadMoreComments}
               onPostComment={handlePostComment}
               onCommentLike={handleCommentLike}
               formatTimeAgo={formatTimeAgo}
@@ -0,0 +1,9 @@
+// Helpers for the cursor-paginated list endpoints ({ next, previous, results })
+
+export const pageResults = (data) => (Array.isArray(data) ? data : data?.results || []);
+
+// Append a page, skipping rows already shown (e.g. a comment posted meanwhile)
+export const appendPage = (items, page) => {
+  const seen = new Set(items.map((item) => item.id));
+  return [...items, ...page.filter((item) => !seen.has(item.id))];
+};